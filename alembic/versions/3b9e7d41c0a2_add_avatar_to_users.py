@@ -0,0 +1,26 @@
+"""'add_avatar_to_users'
+
+Revision ID: 3b9e7d41c0a2
+Revises: 5f2c8e1a9d47
+Create Date: 2026-10-18 14:03:27.540912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b9e7d41c0a2'
+down_revision: Union[str, None] = '5f2c8e1a9d47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('avatar', sa.String(length=255), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'avatar')
@@ -0,0 +1,35 @@
+"""'add_birth_month_day_to_contacts'
+
+Revision ID: 5f2c8e1a9d47
+Revises: acb3864fcea3
+Create Date: 2026-10-18 10:12:40.118224
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f2c8e1a9d47'
+down_revision: Union[str, None] = 'acb3864fcea3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('birth_month_day', sa.Integer(), nullable=True))
+    contacts = sa.table('contacts', sa.column('birth_date', sa.Date()), sa.column('birth_month_day', sa.Integer()))
+    op.execute(
+        contacts.update()
+        .where(contacts.c.birth_date.isnot(None))
+        .values(birth_month_day=sa.cast(sa.extract('month', contacts.c.birth_date), sa.Integer) * 100
+                + sa.cast(sa.extract('day', contacts.c.birth_date), sa.Integer))
+    )
+    op.create_index('ix_contacts_user_id_birth_month_day', 'contacts', ['user_id', 'birth_month_day'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_birth_month_day', table_name='contacts')
+    op.drop_column('contacts', 'birth_month_day')
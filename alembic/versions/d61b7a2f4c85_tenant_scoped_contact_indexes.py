@@ -0,0 +1,53 @@
+"""'tenant_scoped_contact_indexes'
+
+Revision ID: d61b7a2f4c85
+Revises: 8c4a1f6d2e93
+Create Date: 2026-10-18 18:40:12.904316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd61b7a2f4c85'
+down_revision: Union[str, None] = '8c4a1f6d2e93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Every contact query filters by user_id first. The single-column indexes
+# cannot serve that and are not used by any query; ix_contacts_id
+# duplicates the primary key.
+DROPPED = [
+    ('ix_contacts_email', ['email'], True),
+    ('ix_contacts_first_name', ['first_name'], False),
+    ('ix_contacts_id', ['id'], False),
+    ('ix_contacts_last_name', ['last_name'], False),
+    ('ix_contacts_phone_number', ['phone_number'], False),
+]
+CREATED = [
+    ('ix_contacts_user_id_id', ['user_id', 'id'], False),
+    ('ix_contacts_user_id_last_name_first_name', ['user_id', 'last_name', 'first_name'], False),
+    ('uq_contacts_user_id_email', ['user_id', 'email'], True),
+]
+
+
+def upgrade() -> None:
+    # On PostgreSQL the indexes are built without locking the table for
+    # writes, which requires running outside a transaction.
+    with op.get_context().autocommit_block():
+        for name, columns, unique in CREATED:
+            op.create_index(name, 'contacts', columns, unique=unique, postgresql_concurrently=True)
+        for name, _, _ in DROPPED:
+            op.drop_index(name, table_name='contacts', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    # Fails if two users have stored a contact with the same email.
+    with op.get_context().autocommit_block():
+        for name, columns, unique in DROPPED:
+            op.create_index(name, 'contacts', columns, unique=unique, postgresql_concurrently=True)
+        for name, _, _ in CREATED:
+            op.drop_index(name, table_name='contacts', postgresql_concurrently=True)
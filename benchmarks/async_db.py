@@ -0,0 +1,137 @@
+"""
+Concurrent-request throughput of GET /api/contacts/ with blocking vs async sessions.
+
+Usage:
+    python -m benchmarks.async_db --url sqlite:///./bench.db --requests 2000 --concurrency 50
+
+The same seeded database is served once through the blocking ``Session``
+(``SQLALCHEMY_ASYNC=false``) and once through ``AsyncSession`` on
+asyncpg/aiosqlite (``SQLALCHEMY_ASYNC=true``); authentication and rate limiting
+are overridden so only the database path is measured.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import httpx
+
+from database.db import create_session_factory, get_db, get_read_db
+from database.models import Base, Contact, User
+from main import app
+from routes import contacts as contacts_routes
+from services.auth import auth_service
+
+
+def seed(url: str, contacts: int) -> User:
+    session_factory = create_session_factory(url)
+    engine = session_factory.kw["bind"]
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with session_factory() as db:
+        user = User(username="bench", email="bench@example.com", password="x", confirmed=True)
+        db.add(user)
+        db.flush()
+        db.bulk_insert_mappings(Contact, [
+            {
+                "first_name": f"Name{i}",
+                "last_name": f"Lastname{i}",
+                "email": f"contact{i}@example.com",
+                "phone_number": f"{i:09d}",
+                "birth_date": date(1970, 1, 1) + timedelta(days=i % 15000),
+                "user_id": user.id,
+            }
+            for i in range(contacts)
+        ])
+        db.commit()
+        db.refresh(user)
+        db.expunge(user)
+    engine.dispose()
+    return user
+
+
+def override_db(url: str, use_async: bool):
+    engine_kwargs = {}
+    if url.startswith("sqlite") and not use_async:
+        engine_kwargs["connect_args"] = {"check_same_thread": False}
+    session_factory = create_session_factory(url, use_async, **engine_kwargs)
+
+    if use_async:
+        async def _get_db():
+            async with session_factory() as db:
+                yield db
+    else:
+        def _get_db():
+            db = session_factory()
+            try:
+                yield db
+            finally:
+                db.close()
+
+    return session_factory, _get_db
+
+
+async def run(requests: int, concurrency: int, limit: int) -> dict:
+    latencies = []
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            while not queue.empty():
+                queue.get_nowait()
+                start = time.perf_counter()
+                response = await client.get("/api/contacts/", params={"skip": 0, "limit": limit})
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "seconds": round(elapsed, 3),
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="sqlite:///./bench.db")
+    parser.add_argument("--contacts", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    user = seed(args.url, args.contacts)
+    app.dependency_overrides[auth_service.get_current_user] = lambda: user
+    app.dependency_overrides[contacts_routes.rate_limit] = lambda: None
+
+    results = {}
+    for mode, use_async in (("sync", False), ("async", True)):
+        session_factory, app.dependency_overrides[get_db] = override_db(args.url, use_async)
+        app.dependency_overrides[get_read_db] = app.dependency_overrides[get_db]
+        results[mode] = asyncio.run(run(args.requests, args.concurrency, args.limit))
+        engine = session_factory.kw["bind"]
+        if use_async:
+            asyncio.run(engine.dispose())
+        else:
+            engine.dispose()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
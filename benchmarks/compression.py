@@ -0,0 +1,91 @@
+"""
+CPU time vs bytes saved by services.compression on contact data from benchmarks.datagen.
+
+Usage:
+    python -m benchmarks.compression --contacts 20000 --repeat 5
+
+The payloads are built from the seeded generator's contacts:
+
+- ``page_50`` and ``page_1000``: GET /api/contacts/ bodies, compressed in one pass;
+- ``export_ndjson``: a whole NDJSON export in chunks of EXPORT_BATCH_SIZE contacts,
+  compressed as the middleware does for streaming responses, flushing after
+  every chunk.
+
+Each available coding is measured at a few levels, the default one included.
+The report gives the compression ratio and the CPU milliseconds per payload
+and per MB of input.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from itertools import islice
+from typing import Dict, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.datagen import DataGenerator
+from database.models import Contact
+from services import contacts_io, serialization
+from services.compression import AVAILABLE_ENCODINGS, DEFAULT_LEVELS, ENCODERS
+
+LEVELS = {"gzip": (1, 6, 9), "br": (1, 4, 6), "zstd": (1, 3, 9)}
+
+
+def make_payloads(contacts: int, seed: int) -> Dict[str, List[bytes]]:
+    # Whole address books of the generated users until there are enough contacts.
+    rows = [Contact(**row) for row in islice(DataGenerator(seed).contacts(contacts, 100), contacts)]
+
+    def page(size: int) -> List[bytes]:
+        return [serialization.dump(serialization.contact_list_adapter, rows[:size])]
+
+    async def export() -> List[bytes]:
+        async def batches():
+            for start in range(0, len(rows), contacts_io.EXPORT_BATCH_SIZE):
+                yield rows[start:start + contacts_io.EXPORT_BATCH_SIZE]
+
+        return [chunk async for chunk in contacts_io.export_contacts(batches(), "ndjson")]
+
+    return {"page_50": page(50), "page_1000": page(1000), "export_ndjson": asyncio.run(export())}
+
+
+def measure(encoding: str, level: int, chunks: List[bytes], repeat: int) -> dict:
+    size = sum(map(len, chunks))
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.process_time()
+        encoder = ENCODERS[encoding](level)
+        if len(chunks) == 1:
+            compressed = len(encoder.finish(chunks[0]))
+        else:
+            compressed = sum(len(encoder.compress(chunk)) for chunk in chunks) + len(encoder.finish())
+        best = min(best, time.process_time() - started)
+    return {
+        "ratio": round(size / compressed, 2),
+        "bytes": compressed,
+        "cpu_ms": round(best * 1000, 3),
+        "cpu_ms_per_mb": round(best * 1000 / (size / 1e6), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--contacts", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = {}
+    for name, chunks in make_payloads(args.contacts, args.seed).items():
+        results[name] = {"identity_bytes": sum(map(len, chunks)), "chunks": len(chunks)}
+        for encoding in AVAILABLE_ENCODINGS:
+            for level in LEVELS[encoding]:
+                label = f"{encoding}-{level}" + (" (default)" if level == DEFAULT_LEVELS[encoding] else "")
+                results[name][label] = measure(encoding, level, chunks, args.repeat)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
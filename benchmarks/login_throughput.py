@@ -0,0 +1,100 @@
+"""
+Login throughput and contact-read latency while a burst of logins is running.
+
+Usage:
+    python -m benchmarks.login_throughput --logins 40 --readers 10
+
+Runs the same burst twice: once verifying bcrypt inline on the event loop
+(the old behaviour) and once on Auth.hash_executor. Contact reads are issued
+concurrently by ``--readers`` clients for the duration of the burst.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import httpx
+
+from benchmarks.async_db import override_db, seed
+from database.db import create_session_factory, get_db, get_read_db
+from main import app
+from routes import contacts as contacts_routes
+from services.auth import auth_service
+
+
+def percentile(samples: list, fraction: float) -> float:
+    samples = sorted(samples)
+    return round(samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1000, 2)
+
+
+async def burst(logins: int, readers: int, email: str, password: str) -> dict:
+    read_latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        done = asyncio.Event()
+
+        async def login():
+            response = await client.post("/api/auth/login", data={"username": email, "password": password})
+            response.raise_for_status()
+
+        async def reader():
+            while not done.is_set():
+                start = time.perf_counter()
+                response = await client.get("/api/contacts/", params={"limit": 20})
+                read_latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+
+        reader_tasks = [asyncio.create_task(reader()) for _ in range(readers)]
+        started = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(logins)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await asyncio.gather(*reader_tasks)
+
+    return {
+        "logins": logins,
+        "login_per_s": round(logins / elapsed, 1),
+        "reads": len(read_latencies),
+        "read_p50_ms": percentile(read_latencies, 0.50),
+        "read_p99_ms": percentile(read_latencies, 0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="sqlite:///./bench.db")
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--readers", type=int, default=10)
+    args = parser.parse_args()
+
+    password = "benchmark"
+    user = seed(args.url, 1000)
+    session_factory = create_session_factory(args.url)
+    with session_factory() as db:
+        db.execute(user.__table__.update().values(password=auth_service.get_password_hash(password)))
+        db.commit()
+    session_factory.kw["bind"].dispose()
+
+    _, app.dependency_overrides[get_db] = override_db(args.url, use_async=False)
+    app.dependency_overrides[get_read_db] = app.dependency_overrides[get_db]
+    app.dependency_overrides[auth_service.get_current_user] = lambda: user
+    app.dependency_overrides[contacts_routes.rate_limit] = lambda: None
+
+    async def verify_inline(plain_password, hashed_password):
+        return auth_service.pwd_context.verify_and_update(plain_password, hashed_password)
+
+    results = {}
+    pooled = auth_service.verify_and_update_password
+    for mode, verify in (("inline", verify_inline), ("pooled", pooled)):
+        auth_service.verify_and_update_password = verify
+        results[mode] = asyncio.run(burst(args.logins, args.readers, user.email, password))
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
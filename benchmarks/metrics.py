@@ -0,0 +1,70 @@
+"""
+Per-request overhead of services.metrics.MetricsMiddleware.
+
+Usage:
+    python -m benchmarks.metrics --requests 200000
+
+A minimal ASGI app answering every request is called directly, without a
+server or HTTP client, with and without the middleware in front of it. The
+difference between the two timings is the cost the instrumentation adds to
+each request: the in-flight gauge, the clock reads, the latency histogram
+and the status counter.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.metrics import MetricsMiddleware
+
+
+class Route:
+    path = "/api/contacts/{contact_id}"
+
+
+async def endpoint(scope, receive, send):
+    scope["route"] = Route
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def receive():
+    return {"type": "http.request", "body": b""}
+
+
+async def send(message):
+    pass
+
+
+async def measure(app, requests: int) -> float:
+    scope = {"type": "http", "method": "GET", "path": "/api/contacts/1"}
+    started = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - started) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    async def run():
+        bare = min([await measure(endpoint, args.requests) for _ in range(args.repeat)])
+        instrumented = min([await measure(MetricsMiddleware(endpoint), args.requests) for _ in range(args.repeat)])
+        return {
+            "bare_us": round(bare * 1e6, 3),
+            "instrumented_us": round(instrumented * 1e6, 3),
+            "overhead_us": round((instrumented - bare) * 1e6, 3),
+        }
+
+    print(json.dumps(asyncio.run(run()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Request throughput of a rate-limited route with fastapi-limiter vs services.rate_limit.
+
+Usage:
+    python -m benchmarks.rate_limit --requests 5000 --concurrency 50 --redis-url redis://localhost:6379/0
+
+GET /api/users/me/ is served with a real bearer token (the user is resolved
+from services.cache.user_cache, so no database is involved) and the route's
+limiter charged to:
+
+- ``fastapi_limiter``: the previous dependency, one EVALSHA per request;
+- ``local``: TokenBucketLimiter without Redis;
+- ``local_redis_sync``: TokenBucketLimiter synchronizing with Redis every second.
+
+Without ``--redis-url`` Redis is simulated by an in-memory stub answering
+after ``--rtt-ms``, which isolates the cost of the round trips. Limits are
+set high enough that no request is rejected.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import httpx
+import redis.asyncio as redis
+from fastapi_limiter import FastAPILimiter
+from fastapi_limiter.depends import RateLimiter
+
+from database.models import User
+from main import app
+from routes import users as users_routes
+from services.auth import auth_service
+from services.cache import user_cache
+from services.rate_limit import TokenBucketLimiter
+
+LIMIT = 10 ** 9
+
+
+class SimulatedRedis:
+    """Answers the limiter scripts after a fixed round-trip time."""
+
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+
+    async def script_load(self, script):
+        await asyncio.sleep(self.rtt)
+        return "sha"
+
+    async def evalsha(self, sha, numkeys, *args):
+        await asyncio.sleep(self.rtt)
+        return 0
+
+    async def eval(self, script, numkeys, *args):
+        await asyncio.sleep(self.rtt)
+        return [str(LIMIT)] * numkeys
+
+
+async def run(mode: str, requests: int, concurrency: int, redis_client, headers: dict) -> dict:
+    limiter = TokenBucketLimiter(times=LIMIT, seconds=60, sync_interval=1)
+    users_routes.rate_limit.limiter = limiter
+    if mode == "fastapi_limiter":
+        await FastAPILimiter.init(redis_client)
+        app.dependency_overrides[users_routes.rate_limit] = RateLimiter(times=LIMIT, seconds=60)
+    else:
+        app.dependency_overrides.pop(users_routes.rate_limit, None)
+        if mode == "local_redis_sync":
+            limiter.init(redis_client)
+
+    latencies = []
+    remaining = iter(range(requests))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            for _ in remaining:
+                start = time.perf_counter()
+                response = await client.get("/api/users/me/", headers=headers)
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    await limiter.close()
+    latencies.sort()
+    return {
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--redis-url")
+    parser.add_argument("--rtt-ms", type=float, default=0.5)
+    args = parser.parse_args()
+
+    user = User(id=1, username="bench", email="bench@example.com", created_at=datetime(2024, 1, 1), confirmed=True)
+    token = asyncio.run(auth_service.create_access_token(data={"sub": user.email}, expires_delta=3600))
+    headers = {"Authorization": f"Bearer {token}"}
+
+    results = {}
+    for mode in ("fastapi_limiter", "local", "local_redis_sync"):
+        async def measure():
+            await user_cache.set(user)
+            if args.redis_url:
+                redis_client = redis.from_url(args.redis_url)
+            else:
+                redis_client = SimulatedRedis(args.rtt_ms / 1000)
+            return await run(mode, args.requests, args.concurrency, redis_client, headers)
+        results[mode] = asyncio.run(measure())
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
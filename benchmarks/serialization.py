@@ -0,0 +1,80 @@
+"""
+Micro-benchmark of serializing a page of contacts to a JSON response body.
+
+Usage:
+    python -m benchmarks.serialization --contacts 1000 --repeat 50
+
+Compares FastAPI's default path for a route returning ORM rows
+(``response_model`` validation and serialization, then ``json.dumps``) with
+the FAST_JSON path of services.serialization (one TypeAdapter pass straight
+to bytes), and the rendering of an already cached page: decoded and encoded
+again with json or orjson, or sent as the cached bytes.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import timeit
+from datetime import date, timedelta
+from typing import List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi import Response
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from database.models import Contact
+from schemas import ContactResponse
+from services import serialization
+
+
+def make_contacts(count: int) -> List[Contact]:
+    return [
+        Contact(id=i, first_name=f"Name{i}", last_name=f"Lastname{i}", email=f"contact{i}@example.com",
+                phone_number=f"{i:09d}", birth_date=date(1970, 1, 1) + timedelta(days=i), extra_data="Extra data")
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--contacts", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    contacts = make_contacts(args.contacts)
+    field = create_response_field(name="Response_get_contacts", type_=List[ContactResponse], mode="serialization")
+    cached = serialization.dump(serialization.contact_list_adapter, contacts)
+
+    loop = asyncio.new_event_loop()
+
+    def fastapi_default():
+        content = loop.run_until_complete(serialize_response(field=field, response_content=contacts))
+        return JSONResponse(content).body
+
+    def fast_json():
+        adapter = serialization.contact_list_adapter
+        return adapter.dump_json(adapter.validate_python(contacts, from_attributes=True))
+
+    cases = {
+        "orm_fastapi_default": fastapi_default,
+        "orm_fast_json": fast_json,
+        "cached_json": lambda: JSONResponse(json.loads(cached)).body,
+        "cached_orjson": lambda: ORJSONResponse(json.loads(cached)).body,
+        "cached_bytes": lambda: Response(cached, media_type="application/json").body,
+    }
+    assert json.loads(fastapi_default()) == json.loads(fast_json())
+
+    results = {}
+    for name, case in cases.items():
+        seconds = min(timeit.repeat(case, number=args.repeat, repeat=3)) / args.repeat
+        results[name] = {"ms_per_page": round(seconds * 1000, 3)}
+    loop.close()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Latency and memory of a large page of GET /api/contacts/ with and without a sparse fieldset.
+
+Usage:
+    python -m benchmarks.sparse_fields --url sqlite:///./bench.db --contacts 5000 --limit 1000 --requests 50
+
+The same page is requested in full and with
+``?fields=first_name,last_name,phone_number``, which selects three columns
+(plus ``id``) as plain rows instead of loading Contact entities. Latencies
+are measured first; the peak of Python allocations while serving one
+request is then taken with tracemalloc, which slows the code it traces and
+so is kept out of the timings. Authentication and rate limiting are
+overridden, and the contact cache is off, so every request hits the
+database.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import httpx
+
+from benchmarks.async_db import override_db, seed
+from database.db import get_db, get_read_db
+from main import app
+from routes import contacts as contacts_routes
+from services.auth import auth_service
+
+CASES = {"full": {}, "sparse": {"fields": "first_name,last_name,phone_number"}}
+
+
+async def run(requests: int, limit: int) -> dict:
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, params in CASES.items():
+            params = {"limit": limit, **params}
+            # Warm up the statement cache and the adapters.
+            response = await client.get("/api/contacts/", params=params)
+            response.raise_for_status()
+
+            latencies = []
+            for _ in range(requests):
+                started = time.perf_counter()
+                response = await client.get("/api/contacts/", params=params)
+                latencies.append(time.perf_counter() - started)
+            latencies.sort()
+
+            tracemalloc.start()
+            await client.get("/api/contacts/", params=params)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            results[name] = {
+                "rows": len(response.json()),
+                "body_bytes": len(response.content),
+                "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+                "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+                "peak_kib": round(peak / 1024, 1),
+            }
+    full, sparse = results["full"], results["sparse"]
+    results["reduction"] = {key: f"{(1 - sparse[key] / full[key]) * 100:.1f}%"
+                            for key in ("body_bytes", "p50_ms", "peak_kib")}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="sqlite:///./bench.db")
+    parser.add_argument("--contacts", type=int, default=5000)
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    user = seed(args.url, args.contacts)
+    app.dependency_overrides[auth_service.get_current_user] = lambda: user
+    app.dependency_overrides[contacts_routes.rate_limit] = lambda: None
+    session_factory, app.dependency_overrides[get_db] = override_db(args.url, False)
+    app.dependency_overrides[get_read_db] = app.dependency_overrides[get_db]
+
+    results = asyncio.run(run(args.requests, args.limit))
+    session_factory.kw["bind"].dispose()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
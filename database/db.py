@@ -1,25 +1,408 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import asyncio
+import logging
+import time
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from fastapi import Request
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
 import os
 from dotenv import load_dotenv
 load_dotenv()
 
+logger = logging.getLogger(__name__)
 
 SQLALCHEMY_DATABASE_URL = os.getenv("SQLALCHEMY_DATABASE_URL")
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+SQLALCHEMY_ASYNC = os.getenv("SQLALCHEMY_ASYNC", "false").lower() in ("1", "true", "yes")
+SQLALCHEMY_REPLICA_URLS = [url.strip() for url in os.getenv("SQLALCHEMY_REPLICA_URLS", "").split(",") if url.strip()]
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_url(url: str) -> str:
+    """
+    Translate a synchronous database URL into its asyncio driver equivalent.
+
+    Args:
+        url (str): Database URL, e.g. ``postgresql://...`` or ``sqlite:///./app.db``.
+
+    Returns:
+        str: The URL using asyncpg (PostgreSQL) or aiosqlite (SQLite).
+    """
+
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for '{backend}' databases")
+    return str(parsed.set(drivername=ASYNC_DRIVERS[backend]))
+
+
+def create_session_factory(url: str, use_async: bool = False, **engine_kwargs) -> sessionmaker:
+    """
+    Build a session factory bound to a new engine.
+
+    Args:
+        url (str): Synchronous-style database URL.
+        use_async (bool): Build an ``AsyncEngine``/``AsyncSession`` pair instead of a blocking one.
+        **engine_kwargs: Extra keyword arguments passed to the engine constructor.
+
+    Returns:
+        sessionmaker: The configured session factory.
+    """
+
+    if use_async:
+        async_engine = create_async_engine(os.getenv("SQLALCHEMY_ASYNC_DATABASE_URL") or async_database_url(url),
+                                           **engine_kwargs)
+        # Objects must stay readable after commit: an expired attribute would
+        # trigger implicit IO outside of an awaitable context.
+        return sessionmaker(async_engine, class_=AsyncSession, autocommit=False, autoflush=False,
+                            expire_on_commit=False)
+    return sessionmaker(autocommit=False, autoflush=False, bind=create_engine(url, **engine_kwargs))
+
+
+SessionLocal = create_session_factory(SQLALCHEMY_DATABASE_URL, SQLALCHEMY_ASYNC)
+engine = SessionLocal.kw["bind"]
+
+
+async def maybe_await(value):
+    """
+    Await the result of a session call when it comes from an ``AsyncSession``.
+
+    Repository functions are written once for both session flavours:
+    ``await maybe_await(db.execute(stmt))`` awaits the coroutine returned by
+    an ``AsyncSession`` and passes a plain ``Session`` result straight through.
+
+    Args:
+        value: Return value of a session method.
+
+    Returns:
+        The resolved value.
+    """
+
+    if asyncio.iscoroutine(value):
+        return await value
+    return value
+
+
+class ReplicaRouter:
+    """
+    Sends reads to healthy replicas and everything else to the primary.
+
+    Read-your-writes: after a client's write, its reads go to the primary
+    for sticky_seconds, long enough for the replicas to catch up. Clients
+    are told apart by the ID of the authenticated user, so a write made with
+    one token is seen through every other token and device of the same user.
+    The record is kept per process, so with several workers the load balancer should keep a client
+    on one worker, or sticky_seconds should cover the replication lag.
+
+    A replica that fails a health check, or fails while serving a request,
+    gets no reads for retry_seconds. When no replica is healthy, reads go to
+    the primary.
+
+    Attributes:
+        primary (sessionmaker): Session factory of the primary.
+        replicas (List[sessionmaker]): Session factories of the replicas.
+        sticky_seconds (float): How long a client reads from the primary after a write.
+        retry_seconds (float): How long a failed replica is left out.
+        health_interval (float): Seconds between two health checks.
+        stats (dict): Reads served by the replicas and by the primary, and why.
+    """
+
+    def __init__(self, primary: sessionmaker, replicas: List[sessionmaker], sticky_seconds: float = 5,
+                 retry_seconds: float = 30, health_interval: float = 10):
+        self.primary = primary
+        self.replicas = replicas
+        self.sticky_seconds = sticky_seconds
+        self.retry_seconds = retry_seconds
+        self.health_interval = health_interval
+        self._down_until = [0.0] * len(replicas)
+        self._sticky_until: Dict[Hashable, float] = {}
+        self._next = 0
+        self._task = None
+        self.stats = {"replica": 0, "primary": 0, "sticky": 0, "fallback": 0, "failures": 0}
+
+    def mark_write(self, key: Optional[Hashable]) -> None:
+        """
+        Send the client's reads to the primary for the next sticky_seconds.
+
+        Args:
+            key (Optional[Hashable]): Identifies the client; anonymous writes are not tracked.
+        """
+
+        if not self.replicas or key is None:
+            return
+        now = time.monotonic()
+        if len(self._sticky_until) >= 10000:
+            self._sticky_until = {k: until for k, until in self._sticky_until.items() if until > now}
+        self._sticky_until[key] = now + self.sticky_seconds
+
+    def mark_down(self, index: int) -> None:
+        self._down_until[index] = time.monotonic() + self.retry_seconds
+        self.stats["failures"] += 1
+
+    def reader(self, key: Optional[Hashable] = None) -> Tuple[Optional[int], sessionmaker]:
+        """
+        Choose the session factory of a read.
+
+        Args:
+            key (Optional[Hashable]): Identifies the client.
+
+        Returns:
+            Tuple[Optional[int], sessionmaker]: Index of the replica (None for the primary) and its session factory.
+        """
+
+        if not self.replicas:
+            self.stats["primary"] += 1
+            return None, self.primary
+        now = time.monotonic()
+        if key is not None and self._sticky_until.get(key, 0) > now:
+            self.stats["sticky"] += 1
+            return None, self.primary
+        for _ in range(len(self.replicas)):
+            index = self._next
+            self._next = (self._next + 1) % len(self.replicas)
+            if self._down_until[index] <= now:
+                self.stats["replica"] += 1
+                return index, self.replicas[index]
+        self.stats["fallback"] += 1
+        return None, self.primary
+
+    async def check(self) -> None:
+        """
+        Probe every replica with ``SELECT 1`` and update which ones serve reads.
+        """
+
+        for index, session_factory in enumerate(self.replicas):
+            replica_engine = session_factory.kw["bind"]
+            try:
+                if isinstance(replica_engine, AsyncEngine):
+                    async with replica_engine.connect() as connection:
+                        await connection.execute(text("SELECT 1"))
+                else:
+                    await asyncio.to_thread(self._probe, replica_engine)
+            except (DBAPIError, OSError) as err:
+                logger.warning("Replica %s is unavailable: %s", index, err)
+                self.mark_down(index)
+            else:
+                self._down_until[index] = 0.0
+
+    def init(self) -> None:
+        """
+        Start the periodic health checks.
+        """
+
+        if self.replicas and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    @staticmethod
+    def _probe(replica_engine) -> None:
+        with replica_engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+
+    async def _run(self) -> None:
+        while True:
+            await self.check()
+            await asyncio.sleep(self.health_interval)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-def get_db():
+replica_router = ReplicaRouter(
+    SessionLocal,
+    [create_session_factory(url, SQLALCHEMY_ASYNC) for url in SQLALCHEMY_REPLICA_URLS],
+    sticky_seconds=float(os.getenv("REPLICA_STICKY_SECONDS", 5)),
+    retry_seconds=float(os.getenv("REPLICA_RETRY_SECONDS", 30)),
+    health_interval=float(os.getenv("REPLICA_HEALTH_INTERVAL", 10)),
+)
+replica_engines = [session_factory.kw["bind"] for session_factory in replica_router.replicas]
+
+
+# Read-your-writes follows what a session committed, not the HTTP method: a
+# POST that only reads, such as /api/contacts/batch-get, must not pin its
+# user to the primary.
+@event.listens_for(Session, "after_flush")
+def _flushed(session: Session, flush_context) -> None:
+    session.info["pending_writes"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _executed(orm_execute_state) -> None:
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["pending_writes"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _committed(session: Session) -> None:
+    if session.info.pop("pending_writes", False):
+        session.info["committed_writes"] = True
+
+
+@event.listens_for(Session, "after_rollback")
+def _rolled_back(session: Session) -> None:
+    session.info.pop("pending_writes", None)
+
+
+def committed_writes(db) -> bool:
+    """
+    Tell whether a session has committed an INSERT, UPDATE or DELETE.
+
+    Args:
+        db: Session, blocking or async.
+
+    Returns:
+        bool: True once a transaction holding a write was committed.
     """
-    Get the database session.
 
-    Yields:
-        sqlalchemy.orm.session: A SQLAlchemy session
+    return getattr(db, "sync_session", db).info.get("committed_writes", False)
+
+
+def _user_key(request: Request) -> Optional[int]:
+    # Recorded by services.auth.Auth.get_current_user once the token is verified.
+    return getattr(request.state, "user_id", None)
+
+
+class ReplicaSession(Session):
+    """
+    Read session whose database is chosen on its first statement.
+
+    FastAPI creates the session of get_read_db before get_current_user has
+    identified the user, and whether a replica may serve the request depends
+    on that user's recent writes. The choice is therefore deferred to the
+    first get_bind() call and kept for the rest of the session.
+
+    Attributes:
+        router (ReplicaRouter): Chooses the database.
+        request (Request): The request the session serves.
+        replica_index (Optional[int]): Replica serving the session, None for the primary.
+    """
+
+    def __init__(self, router: ReplicaRouter, request: Request, **kwargs):
+        super().__init__(**kwargs)
+        self.router = router
+        self.request = request
+        self.replica_index = None
+        self._routed_bind = None
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._routed_bind is None:
+            self.replica_index, session_factory = self.router.reader(_user_key(self.request))
+            bind = session_factory.kw["bind"]
+            self._routed_bind = bind.sync_engine if isinstance(bind, AsyncEngine) else bind
+        return self._routed_bind
+
+
+def served_by_replica(db) -> bool:
     """
-    
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
\ No newline at end of file
+    Tell whether a session reads from a replica, which may lag behind the primary.
+
+    Args:
+        db: Session from get_db or get_read_db, blocking or async.
+
+    Returns:
+        bool: True when a replica serves the session.
+    """
+
+    session = getattr(db, "sync_session", db)
+    if not isinstance(session, ReplicaSession):
+        return False
+    session.get_bind()
+    return session.replica_index is not None
+
+
+def _mark_down_on_failure(db, err: DBAPIError) -> None:
+    session = getattr(db, "sync_session", db)
+    if session.replica_index is not None and (err.connection_invalidated or isinstance(err, OperationalError)):
+        session.router.mark_down(session.replica_index)
+
+
+if SQLALCHEMY_ASYNC:
+    async def get_db(request: Request):
+        """
+        Get a session on the primary database.
+
+        A request that commits a write marks its user as having written, see
+        ReplicaRouter.
+
+        Args:
+            request (Request): The incoming request.
+
+        Yields:
+            sqlalchemy.ext.asyncio.AsyncSession: A SQLAlchemy async session
+        """
+
+        async with SessionLocal() as db:
+            try:
+                yield db
+            finally:
+                if committed_writes(db):
+                    replica_router.mark_write(_user_key(request))
+
+    async def get_read_db(request: Request):
+        """
+        Get a session for reads, on a replica when one can serve the user.
+
+        Args:
+            request (Request): The incoming request.
+
+        Yields:
+            sqlalchemy.ext.asyncio.AsyncSession: A SQLAlchemy async session
+        """
+
+        async with AsyncSession(sync_session_class=ReplicaSession, router=replica_router, request=request,
+                                autoflush=False, expire_on_commit=False) as db:
+            try:
+                yield db
+            except DBAPIError as err:
+                _mark_down_on_failure(db, err)
+                raise
+else:
+    def get_db(request: Request):
+        """
+        Get a session on the primary database.
+
+        A request that commits a write marks its user as having written, see
+        ReplicaRouter.
+
+        Args:
+            request (Request): The incoming request.
+
+        Yields:
+            sqlalchemy.orm.session: A SQLAlchemy session
+        """
+
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+            if committed_writes(db):
+                replica_router.mark_write(_user_key(request))
+
+    def get_read_db(request: Request):
+        """
+        Get a session for reads, on a replica when one can serve the user.
+
+        Args:
+            request (Request): The incoming request.
+
+        Yields:
+            sqlalchemy.orm.session: A SQLAlchemy session
+        """
+
+        db = ReplicaSession(replica_router, request, autoflush=False)
+        try:
+            yield db
+        except DBAPIError as err:
+            _mark_down_on_failure(db, err)
+            raise
+        finally:
+            db.close()
@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, String, Date, func, Boolean
+from datetime import date
+
+from sqlalchemy import Column, Integer, String, Date, func, Boolean, Index, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql.sqltypes import DateTime
 from sqlalchemy.orm import relationship
@@ -14,28 +16,61 @@ class Contact(Base):
          id (int): Primary key for the contact.
          name (str): Name of the contact.
          lastname (str): Last name of the contact.
-         email (str): Email address of the contact.
+         email (str): Email address of the contact, unique within the user's contacts.
          phone_number (str): Phone number of the contact.
          birthday (str): Birthday of the contact.
+         birth_month_day (int): Birthday as ``month * 100 + day`` (e.g. 1231), kept in sync with birth_date.
          user_id (int): Foreign key referencing the associated user.
          user (relationship): Relationship attribute representing the association with the User model.
     """
 
     __tablename__ = "contacts"
 
-    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    first_name = Column(String(50), index=True)
-    last_name = Column(String(50), index=True)
-    email = Column(String(50), unique=True, index=True)
-    phone_number = Column(String(50), index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    first_name = Column(String(50))
+    last_name = Column(String(50))
+    email = Column(String(50))
+    phone_number = Column(String(50))
     birth_date = Column(Date())
+    birth_month_day = Column(Integer, nullable=True)
     extra_data = Column(String(150), nullable=True)
     user_id = Column('user_id', ForeignKey('users.id', ondelete='CASCADE'), default=None)
     user = relationship('User', backref="notes")
 
+    # Every query is scoped to one user, so every index starts with user_id.
+    __table_args__ = (
+        Index('ix_contacts_user_id_id', 'user_id', 'id'),
+        Index('ix_contacts_user_id_last_name_first_name', 'user_id', 'last_name', 'first_name'),
+        Index('uq_contacts_user_id_email', 'user_id', 'email', unique=True),
+        Index('ix_contacts_user_id_birth_month_day', 'user_id', 'birth_month_day'),
+    )
+
     def __repr__(self) -> str:
         return f"Contact({self.first_name} {self.last_name}, email: {self.email}, number: {self.phone_number}, birthdate: {self.birth_date}, extra data: {self.extra_data})"
 
+
+def birthday_key(birth_date: date | None) -> int | None:
+    """
+    Index key for a birthday that ignores the year.
+
+    Args:
+        birth_date (date | None): The date of birth.
+
+    Returns:
+        int | None: ``month * 100 + day``, or None when the date is unknown.
+    """
+
+    if birth_date is None:
+        return None
+    return birth_date.month * 100 + birth_date.day
+
+
+@event.listens_for(Contact, "before_insert")
+@event.listens_for(Contact, "before_update")
+def _sync_birth_month_day(mapper, connection, target: Contact) -> None:
+    target.birth_month_day = birthday_key(target.birth_date)
+
+
 class User(Base):
     """
     SQLAlchemy model representing a user.
@@ -46,8 +81,8 @@ class User(Base):
         email (str): Email address of the user (unique).
         password (str): Password of the user.
         created_at (DateTime): Timestamp indicating when the user was created.
-        avatar (str): Filepath to the user's avatar (nullable).
-        refresh_token (str): Refresh token for the user (nullable).
+        avatar (str): URL of the user's avatar (nullable).
+        refresh_token (str): Legacy refresh token column, no longer written; see RefreshToken (nullable).
         confirmed (bool): Flag indicating whether the user is confirmed.
     """
     
@@ -58,5 +93,36 @@ class User(Base):
     email = Column(String(250), nullable=False, unique=True)
     password = Column(String(255), nullable=False)
     created_at = Column('crated_at', DateTime, default=func.now())
+    avatar = Column(String(255), nullable=True)
     refresh_token = Column(String(255), nullable=True)
-    confirmed = Column(Boolean, default=False)
\ No newline at end of file
+    confirmed = Column(Boolean, default=False)
+
+class RefreshToken(Base):
+    """
+    SQLAlchemy model representing an issued refresh token.
+
+    Every login starts a token family, one per device session. Each refresh
+    marks the presented token used and issues its successor in the same
+    family, so presenting a used token means it was stolen and replayed.
+
+    Attributes:
+        id (str): The token's ``jti`` claim.
+        family_id (str): Session the token belongs to, the ``fam`` claim.
+        user_id (int): Foreign key referencing the owner.
+        device (str): User agent of the login that started the family (nullable).
+        created_at (DateTime): When the token was issued.
+        expires_at (DateTime): When the token stops being accepted.
+        used_at (DateTime): When the token was exchanged for its successor (nullable).
+        revoked (bool): Set on every token of a family that was logged out or replayed.
+    """
+
+    __tablename__ = "refresh_tokens"
+
+    id = Column(String(36), primary_key=True)
+    family_id = Column(String(36), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    device = Column(String(255), nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    used_at = Column(DateTime, nullable=True)
+    revoked = Column(Boolean, nullable=False, default=False)
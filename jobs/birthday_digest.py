@@ -0,0 +1,208 @@
+"""
+Daily birthday-reminder digest.
+
+Usage:
+    python -m jobs.birthday_digest --days 7 --chunk-size 500
+
+Meant to run once a day, e.g. from cron::
+
+    0 7 * * * cd /app && python -m jobs.birthday_digest
+
+It runs as a module from the project root, which makes the application
+packages importable.
+
+Confirmed users are read in ID order, one chunk at a time. Each chunk takes
+two queries whatever its size: one for the users and one for all of their
+upcoming birthdays. Every user with at least one upcoming birthday gets one
+digest email through services.email.mail_dispatcher.
+
+Progress is saved to ``--state-file`` once a chunk's emails have been handed
+to the SMTP server. An interrupted run started again on the same day resumes
+after the last finished chunk, and a finished run sends nothing more that day.
+"""
+import argparse
+import asyncio
+import calendar
+import json
+import logging
+import os
+import time
+from datetime import date
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy.orm import Session
+
+from database.db import SessionLocal, maybe_await
+from database.models import Contact
+from repository import contacts as repository_contacts
+from repository import users as repository_users
+from services.email import mail_dispatcher, send_birthday_digest
+
+logger = logging.getLogger(__name__)
+
+
+class DigestState:
+    """
+    Progress of one day's digest run, kept in a JSON file.
+
+    Attributes:
+        path (str): File the state is saved to.
+        run_date (date): Day the digest is computed for.
+        last_user_id (int): ID of the last user of the last finished chunk.
+        users (int): Users processed so far.
+        emails (int): Digests sent so far.
+        done (bool): Whether every user has been processed.
+    """
+
+    def __init__(self, path: str, run_date: date):
+        self.path = path
+        self.run_date = run_date
+        self.last_user_id = 0
+        self.users = 0
+        self.emails = 0
+        self.done = False
+
+    @classmethod
+    def load(cls, path: str, run_date: date) -> "DigestState":
+        """
+        Restore the progress of an earlier run on the same day.
+
+        Args:
+            path (str): File the state is saved to.
+            run_date (date): Day the digest is computed for.
+
+        Returns:
+            DigestState: The saved progress, or a fresh state when none exists for run_date.
+        """
+
+        state = cls(path, run_date)
+        if os.path.exists(path):
+            with open(path) as file:
+                saved = json.load(file)
+            if saved.get("run_date") == run_date.isoformat():
+                state.last_user_id = saved["last_user_id"]
+                state.users = saved["users"]
+                state.emails = saved["emails"]
+                state.done = saved["done"]
+        return state
+
+    def save(self) -> None:
+        """
+        Write the state atomically, so a crash never leaves a partial file.
+        """
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"run_date": self.run_date.isoformat(), "last_user_id": self.last_user_id,
+                       "users": self.users, "emails": self.emails, "done": self.done}, file)
+        os.replace(tmp_path, self.path)
+
+
+def days_until(birth_date: date, today: date) -> int:
+    """
+    Number of days from today to the next birthday.
+
+    A 29 February birthday falls on 28 February in non-leap years.
+
+    Args:
+        birth_date (date): The date of birth.
+        today (date): The current day.
+
+    Returns:
+        int: 0 when the birthday is today.
+    """
+
+    for year in (today.year, today.year + 1):
+        day = birth_date.day
+        if birth_date.month == 2 and day == 29 and not calendar.isleap(year):
+            day = 28
+        upcoming = date(year, birth_date.month, day)
+        if upcoming >= today:
+            return (upcoming - today).days
+
+
+def digest_entry(contact: Contact, today: date) -> dict:
+    return {
+        "name": f"{contact.first_name} {contact.last_name}",
+        "date": contact.birth_date.strftime("%d %B"),
+        "in_days": days_until(contact.birth_date, today),
+    }
+
+
+async def run_digest(db: Session, state: DigestState, days: int = 7, chunk_size: int = 500,
+                     send: Callable[..., Awaitable] = send_birthday_digest,
+                     flush: Optional[Callable[[], Awaitable]] = None) -> dict:
+    """
+    Send the digests of every user not processed yet, checkpointing after each chunk.
+
+    Args:
+        db (Session): SQLAlchemy database session.
+        state (DigestState): Progress to resume from and update.
+        days (int): Number of days after the run date to include.
+        chunk_size (int): Users read and processed together.
+        send (Callable[..., Awaitable]): Sends one digest, see services.email.send_birthday_digest.
+        flush (Optional[Callable[[], Awaitable]]): Waits until queued emails are delivered, called before each checkpoint.
+
+    Returns:
+        dict: Users, emails and chunks processed by this call, with its duration and throughput.
+    """
+
+    started = time.monotonic()
+    report = {"users": 0, "emails": 0, "chunks": 0}
+    while not state.done:
+        users = await repository_users.get_confirmed_users(state.last_user_id, chunk_size, db)
+        if users:
+            birthdays = await repository_contacts.get_upcoming_birthdays_for_users(
+                [user.id for user in users], db, days, state.run_date)
+            emails = 0
+            for user in users:
+                contacts = birthdays.get(user.id)
+                if contacts:
+                    await send(user.email, user.username, [digest_entry(c, state.run_date) for c in contacts], days)
+                    emails += 1
+            if flush is not None:
+                await flush()
+            state.last_user_id = users[-1].id
+            state.users += len(users)
+            state.emails += emails
+            report["users"] += len(users)
+            report["emails"] += emails
+            report["chunks"] += 1
+        state.done = len(users) < chunk_size
+        state.save()
+        elapsed = time.monotonic() - started
+        logger.info("Birthday digest: %d users, %d emails, %.1f users/s", state.users, state.emails,
+                    report["users"] / elapsed if elapsed else 0)
+
+    elapsed = time.monotonic() - started
+    report["seconds"] = round(elapsed, 3)
+    report["users_per_second"] = round(report["users"] / elapsed, 1) if elapsed else 0.0
+    report["emails_per_second"] = round(report["emails"] / elapsed, 1) if elapsed else 0.0
+    return report
+
+
+async def run(args) -> dict:
+    state = DigestState.load(args.state_file, date.today())
+    db = SessionLocal()
+    mail_dispatcher.start()
+    try:
+        return await run_digest(db, state, args.days, args.chunk_size, flush=mail_dispatcher.queue.join)
+    finally:
+        await mail_dispatcher.stop()
+        await maybe_await(db.close())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--state-file", default=os.getenv("BIRTHDAY_DIGEST_STATE", ".birthday_digest_state.json"))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    report = asyncio.run(run(args))
+    print(json.dumps({**report, "mail": mail_dispatcher.metrics()}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,21 @@
 import os
-from fastapi import FastAPI, Depends
-from fastapi_limiter import FastAPILimiter
-from fastapi_limiter.depends import RateLimiter
+from fastapi import FastAPI, Depends, Response
 from fastapi.middleware.cors import CORSMiddleware
 import redis.asyncio as redis
+from database.db import engine, replica_engines, replica_router
 from routes import contacts, auth, users
+from services.cache import contact_cache, user_cache
+from services.compression import CompressionMiddleware
+from services.serialization import default_response_class
+from services.rate_limit import ClientRateLimit, RateLimitHeadersMiddleware, rate_limiter
+from services.email import mail_dispatcher
+from services.metrics import CONTENT_TYPE, MetricsMiddleware, instrument_engine, render
+from services.query_stats import QueryMonitorMiddleware, query_monitor
 from dotenv import load_dotenv
 
 load_dotenv()
 
-app = FastAPI()
+app = FastAPI(default_response_class=default_response_class)
 
 origins = ["*"]
 
@@ -19,20 +25,46 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "RateLimit-Limit", "RateLimit-Remaining", "RateLimit-Reset",
+                    "RateLimit-Policy", "Retry-After", "Server-Timing"],
 )
+app.add_middleware(RateLimitHeadersMiddleware)
+app.add_middleware(QueryMonitorMiddleware)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+instrument_engine(engine)
+query_monitor.instrument(engine)
+for index, replica_engine in enumerate(replica_engines):
+    instrument_engine(replica_engine, f"replica{index}")
+    query_monitor.instrument(replica_engine)
 
 app.include_router(contacts.router, prefix='/api')
 app.include_router(auth.router, prefix='/api')
 app.include_router(users.router, prefix='/api')
 
 
-rate_limit = RateLimiter(times=10, seconds=60)
+rate_limit = ClientRateLimit()
 
 @app.on_event("startup")
 async def startup():
     r = await redis.Redis(host=os.getenv("REDIS_HOST"), port=os.getenv("REDIS_PORT"), db=os.getenv("REDIS_DB"), encoding="utf-8", decode_responses=True)
-    await FastAPILimiter.init(r)
+    rate_limiter.init(r)
+    user_cache.init(r)
+    contact_cache.init(r)
+    mail_dispatcher.start()
+    replica_router.init()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await rate_limiter.close()
+    await mail_dispatcher.stop()
+    await replica_router.close()
 
 @app.get("/", dependencies=[Depends(rate_limit)])
 def read_root():
     return {"message": "Hello World"}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(render(), media_type=CONTENT_TYPE)
@@ -1,8 +1,18 @@
-from typing import List
+import asyncio
+import base64
+import calendar
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Union
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from database.models import Contact, User
+from sqlalchemy import and_, bindparam, case, delete, insert, or_, select, update
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.db import maybe_await
+from database.models import Contact, User, birthday_key
 from schemas import ContactModel
+from services.cache import contact_cache
 from datetime import date, timedelta
 
 async def create_contact(body: ContactModel, user: User, db: Session) -> Contact:
@@ -29,30 +39,186 @@ async def create_contact(body: ContactModel, user: User, db: Session) -> Contact
         user_id=user.id
     )
     db.add(contact)
-    db.commit()
-    db.refresh(contact)
-    db.close()
+    await maybe_await(db.commit())
+    await maybe_await(db.refresh(contact))
+    await maybe_await(db.close())
+    await contact_cache.bump(user.id)
     return contact
 
-async def get_contacts(skip: int, limit: int, user: User, db: Session) -> List[Contact]:
+async def create_contacts_bulk(bodies: List[ContactModel], user: User, db: Session) -> List[Optional[str]]:
+    """
+    Create many contacts with a single multi-row INSERT
+
+    If the batch violates a constraint it is rolled back and retried row by
+    row, so one bad row only fails itself.
+
+    Args:
+        bodies (List[ContactModel]): Data for the new contacts.
+        user (User): The authenticated user.
+        db (Session): SQLAlchemy database session.
+
+    Returns:
+        List[Optional[str]]: One entry per body, None if it was inserted or the error message.
+    """
+
+    rows = [_contact_row(body, user) for body in bodies]
+    try:
+        await maybe_await(db.execute(insert(Contact).values(rows)))
+        await maybe_await(db.commit())
+        await contact_cache.bump(user.id)
+        return [None] * len(rows)
+    except IntegrityError:
+        await maybe_await(db.rollback())
+
+    errors = []
+    for row in rows:
+        try:
+            await maybe_await(db.execute(insert(Contact).values(row)))
+            await maybe_await(db.commit())
+            errors.append(None)
+        except IntegrityError as err:
+            await maybe_await(db.rollback())
+            errors.append(str(err.orig))
+    await contact_cache.bump(user.id)
+    return errors
+
+
+def _contact_row(body: ContactModel, user: User) -> dict:
+    return {
+        "first_name": body.first_name,
+        "last_name": body.last_name,
+        "email": body.email,
+        "phone_number": body.phone_number,
+        "birth_date": body.birth_date,
+        "birth_month_day": birthday_key(body.birth_date),
+        "extra_data": body.extra_data,
+        "user_id": user.id,
+    }
+
+
+def encode_cursor(contact_id: int) -> str:
+    """
+    Encode an opaque pagination cursor
+
+    Args:
+        contact_id (int): ID of the last contact on the current page
+
+    Returns:
+        str: URL-safe cursor pointing past that contact
+    """
+
+    raw = json.dumps({"id": contact_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    """
+    Decode a pagination cursor created by encode_cursor
+
+    Args:
+        cursor (str): The opaque cursor
+
+    Raises:
+        ValueError: The cursor is malformed
+
+    Returns:
+        int: ID of the last contact already returned
+    """
+
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        contact_id = json.loads(raw)["id"]
+    except (ValueError, TypeError, KeyError) as err:
+        raise ValueError("Invalid cursor") from err
+    if not isinstance(contact_id, int):
+        raise ValueError("Invalid cursor")
+    return contact_id
+
+
+def _select(fields: Optional[Sequence[str]]):
+    if fields is None:
+        return select(Contact)
+    return select(*(getattr(Contact, field) for field in fields))
+
+
+def _all(result, fields: Optional[Sequence[str]]) -> Union[List[Contact], List[dict]]:
+    if fields is None:
+        return result.scalars().all()
+    return [dict(row) for row in result.mappings()]
+
+
+async def get_contacts(skip: int, limit: int, user: User, db: Session, after: Optional[int] = None,
+                       fields: Optional[Sequence[str]] = None) -> Union[List[Contact], List[dict]]:
     """
     Get all contacts
 
+    Contacts are ordered by ID. When ``after`` is given the page starts right
+    after that contact (keyset pagination on ``(user_id, id)``) and ``skip``
+    is ignored, so deep pages cost the same as the first one.
+
     Args:
         skip (int): Number of records to skip
         limit (int): Maximum number of records to retrieve
         user (User): The authenticated user
         db (Session): SQLAlchemy database session
+        after (Optional[int]): ID of the last contact of the previous page
+        fields (Optional[Sequence[str]]): Columns to select; plain dicts are returned instead of entities
 
     Returns:
-        List[Contact]: The list of contacts
+        Union[List[Contact], List[dict]]: The list of contacts
     """
 
-    contacts = db.query(Contact).filter(Contact.user_id == user.id).offset(skip).limit(limit).all()
-    db.close()
+    query = _select(fields).where(Contact.user_id == user.id)
+    if after is not None:
+        query = query.where(Contact.id > after)
+    else:
+        query = query.offset(skip)
+    result = await maybe_await(db.execute(query.order_by(Contact.id).limit(limit)))
+    contacts = _all(result, fields)
+    await maybe_await(db.close())
     return contacts
 
-async def get_contact(contact_id: int, user: User, db: Session) -> Contact:
+async def stream_contacts(user: User, db: Session, batch_size: int = 1000) -> AsyncIterator[List[Contact]]:
+    """
+    Stream all contacts of a user with a server-side cursor
+
+    Rows are fetched ``batch_size`` at a time, so memory use does not grow
+    with the size of the contact book. With a blocking Session the cursor
+    lives on one dedicated worker thread to keep the event loop free. The
+    session is closed when the stream ends.
+
+    Args:
+        user (User): The authenticated user
+        db (Session): SQLAlchemy database session
+        batch_size (int): Number of contacts per yielded batch
+
+    Yields:
+        List[Contact]: The next batch of contacts, ordered by ID
+    """
+
+    query = select(Contact).where(Contact.user_id == user.id).order_by(Contact.id) \
+        .execution_options(stream_results=True, yield_per=batch_size)
+    if isinstance(db, AsyncSession):
+        try:
+            result = await db.stream_scalars(query)
+            async for batch in result.partitions(batch_size):
+                yield batch
+        finally:
+            await db.close()
+        return
+
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        try:
+            result = await loop.run_in_executor(executor, lambda: db.execute(query).scalars())
+            while batch := await loop.run_in_executor(executor, result.fetchmany, batch_size):
+                yield batch
+        finally:
+            await loop.run_in_executor(executor, db.close)
+
+
+async def get_contact(contact_id: int, user: User, db: Session,
+                      fields: Optional[Sequence[str]] = None) -> Union[Contact, dict, None]:
     """
     Get contact by ID
 
@@ -60,14 +226,41 @@ async def get_contact(contact_id: int, user: User, db: Session) -> Contact:
         contact_id (int): ID of the contact to retrieve
         user (User): The authenticated user
         db (Session): SQLAlchemy database session
+        fields (Optional[Sequence[str]]): Columns to select; a plain dict is returned instead of an entity
 
     Returns:
-        Contact: The requested contact
+        Union[Contact, dict, None]: The requested contact
     """
 
-    contact = db.query(Contact).filter(and_(Contact.id == contact_id,Contact.user_id == user.id)).first()
-    db.close()
-    return contact
+    result = await maybe_await(db.execute(_select(fields).where(and_(Contact.id == contact_id, Contact.user_id == user.id))))
+    contact = result.scalars().first() if fields is None else result.mappings().first()
+    await maybe_await(db.close())
+    return contact if fields is None or contact is None else dict(contact)
+
+
+async def get_contacts_by_ids(contact_ids: Sequence[int], user: User, db: Session,
+                              fields: Optional[Sequence[str]] = None) -> Union[List[Contact], List[dict]]:
+    """
+    Get the contacts with the given IDs in one query
+
+    IDs of other users' contacts and unknown IDs are left out of the result.
+
+    Args:
+        contact_ids (Sequence[int]): IDs of the contacts to retrieve
+        user (User): The authenticated user
+        db (Session): SQLAlchemy database session
+        fields (Optional[Sequence[str]]): Columns to select, ``id`` included; plain dicts are returned instead of entities
+
+    Returns:
+        Union[List[Contact], List[dict]]: The contacts found, in the order of contact_ids
+    """
+
+    query = _select(fields).where(and_(Contact.user_id == user.id, Contact.id.in_(set(contact_ids))))
+    result = await maybe_await(db.execute(query))
+    contacts = _all(result, fields)
+    await maybe_await(db.close())
+    by_id = {(contact.id if fields is None else contact["id"]): contact for contact in contacts}
+    return [by_id[contact_id] for contact_id in dict.fromkeys(contact_ids) if contact_id in by_id]
 
 async def update_contact(contact_id: int, body: ContactModel, user: User, db: Session) -> Contact:
     """
@@ -83,7 +276,8 @@ async def update_contact(contact_id: int, body: ContactModel, user: User, db: Se
         Contact: The updated contact
     """
 
-    contact = db.query(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).first()
+    result = await maybe_await(db.execute(select(Contact).where(and_(Contact.id == contact_id, Contact.user_id == user.id))))
+    contact = result.scalars().first()
     if contact:
         contact.first_name = body.first_name
         contact.last_name = body.last_name
@@ -92,43 +286,355 @@ async def update_contact(contact_id: int, body: ContactModel, user: User, db: Se
         contact.birth_date = body.birth_date
         contact.extra_data = body.extra_data
 
-        db.commit()
+        await maybe_await(db.commit())
+        await contact_cache.bump(user.id)
     return contact
 
 
-async def delete_contact(contact_id: int, user: User, db: Session) -> Contact:
+def _dialect(db: Session):
+    return getattr(db, "sync_session", db).get_bind().dialect
+
+
+def _returning(db: Session) -> bool:
+    # SQLAlchemy 1.4 only compiles UPDATE/DELETE ... RETURNING for dialects with full RETURNING support
+    # (PostgreSQL); SQLite and MySQL take the fallback.
+    return _dialect(db).full_returning
+
+
+async def patch_contact(contact_id: int, fields: dict, user: User, db: Session) -> Optional[Row]:
+    """
+    Update some fields of a contact
+
+    Only the given columns are written, with one ``UPDATE ... RETURNING``
+    statement where the dialect supports it. Elsewhere the row is read back
+    with a Core SELECT in the same transaction; no entity is loaded either way.
+
+    Args:
+        contact_id (int): ID of the contact to update
+        fields (dict): New values by ContactModel field name
+        user (User): The authenticated user
+        db (Session): SQLAlchemy database session
+
+    Raises:
+        IntegrityError: The new email is already used by another contact of the user
+
+    Returns:
+        Optional[Row]: The updated contact, or None if the user has no such contact
+    """
+
+    table = Contact.__table__
+    owned = and_(table.c.id == contact_id, table.c.user_id == user.id)
+    if not fields:
+        result = await maybe_await(db.execute(select(table).where(owned)))
+        contact = result.first()
+        await maybe_await(db.close())
+        return contact
+
+    values = dict(fields)
+    if "birth_date" in values:
+        values["birth_month_day"] = birthday_key(values["birth_date"])
+    statement = update(table).where(owned).values(values)
+    try:
+        if _returning(db):
+            result = await maybe_await(db.execute(statement.returning(*table.c)))
+            contact = result.first()
+        else:
+            result = await maybe_await(db.execute(statement))
+            contact = None
+            if result.rowcount:
+                result = await maybe_await(db.execute(select(table).where(owned)))
+                contact = result.first()
+    except IntegrityError:
+        await maybe_await(db.rollback())
+        raise
+    if contact is None:
+        await maybe_await(db.rollback())
+        return None
+    await maybe_await(db.commit())
+    await contact_cache.bump(user.id)
+    return contact
+
+
+async def delete_contact(contact_id: int, user: User, db: Session) -> Optional[Row]:
     """
     Delete contact
 
+    One ``DELETE ... RETURNING`` statement where the dialect supports it;
+    elsewhere a Core SELECT of the row, then the DELETE.
+
     Args:
         contact_id (int): ID of the contact to delete
         user (User): The authenticated user
         db (Session): SQLAlchemy database session
 
     Returns:
-        Contact: The deleted contact
+        Optional[Row]: The deleted contact, or None if the user has no such contact
     """
 
-    contact = db.query(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).first()
-    if contact:
-        db.delete(contact)
-        db.commit()
+    table = Contact.__table__
+    owned = and_(table.c.id == contact_id, table.c.user_id == user.id)
+    if _returning(db):
+        result = await maybe_await(db.execute(delete(table).where(owned).returning(*table.c)))
+        contact = result.first()
+    else:
+        result = await maybe_await(db.execute(select(table).where(owned)))
+        contact = result.first()
+        if contact is not None:
+            await maybe_await(db.execute(delete(table).where(owned)))
+    if contact is None:
+        await maybe_await(db.rollback())
+        return None
+    await maybe_await(db.commit())
+    await contact_cache.bump(user.id)
     return contact
 
-async def get_upcoming_birthdays(user: User, db: Session):
+
+NOT_APPLIED = "Not applied: the batch was rolled back."
+
+
+class _ConcurrentChange(Exception):
+    """
+    A contact of the batch was deleted between its lookup and its write.
+    """
+
+
+class _BatchPlan:
+    """
+    Replays a batch of operations in order against the affected contacts held in memory.
+
+    Every operation is checked as if the previous ones had been applied, so
+    missing contacts and email conflicts get the answer the same requests
+    would get one by one. The successful operations are then merged into at
+    most one DELETE, one UPDATE and one INSERT.
+    """
+
+    def __init__(self, rows):
+        self.emails = {contact_id: email for contact_id, email in rows}
+        self.owners = {email: contact_id for contact_id, email in rows}
+        self.deletes: List[int] = []
+        self.updates: Dict[int, dict] = {}
+        self.creates: List[tuple] = []
+
+    def apply(self, index: int, operation, user: User) -> dict:
+        if operation.op == "create":
+            if operation.data.email in self.owners:
+                return {"op": "create", "status": 409, "detail": "A contact with this email already exists."}
+            # Contacts to create have no ID yet; they hold their email under a key no contact can have.
+            self.owners[operation.data.email] = -1 - index
+            self.creates.append((index, _contact_row(operation.data, user)))
+            return {"op": "create", "status": 201}
+
+        if operation.id not in self.emails:
+            return {"op": operation.op, "status": 404, "id": operation.id, "detail": "Contact not found."}
+        if operation.op == "update":
+            owner = self.owners.get(operation.data.email)
+            if owner is not None and owner != operation.id:
+                return {"op": "update", "status": 409, "id": operation.id,
+                        "detail": "A contact with this email already exists."}
+            del self.owners[self.emails[operation.id]]
+            self.owners[operation.data.email] = operation.id
+            self.emails[operation.id] = operation.data.email
+            row = _contact_row(operation.data, user)
+            del row["user_id"]
+            # Only the last update of a contact is written, at the place of its first one.
+            self.updates[operation.id] = row
+            return {"op": "update", "status": 200, "id": operation.id}
+
+        del self.owners[self.emails.pop(operation.id)]
+        self.updates.pop(operation.id, None)
+        self.deletes.append(operation.id)
+        return {"op": "delete", "status": 200, "id": operation.id}
+
+
+async def _apply_operation(operation, user: User, db: Session) -> Optional[int]:
+    # Returns the ID of the contact written, or None when it no longer exists.
+    table = Contact.__table__
+    if operation.op == "create":
+        result = await maybe_await(db.execute(insert(table).values(_contact_row(operation.data, user))))
+        return result.inserted_primary_key[0]
+    owned = and_(table.c.id == operation.id, table.c.user_id == user.id)
+    if operation.op == "update":
+        row = _contact_row(operation.data, user)
+        del row["user_id"]
+        result = await maybe_await(db.execute(update(table).where(owned).values(row)))
+    else:
+        result = await maybe_await(db.execute(delete(table).where(owned)))
+    return operation.id if result.rowcount else None
+
+
+async def apply_batch(operations: Sequence, user: User, db: Session, atomic: bool = True) -> dict:
+    """
+    Apply an ordered batch of contact creations, updates and deletions in one transaction
+
+    The contacts the batch refers to, by ID or by email, are read with one
+    query and the operations are checked in order against them. The
+    successful ones are then written with at most one statement per kind of
+    operation: deletions, then updates (an executemany), then creations
+    (one multi-row INSERT, whose IDs are read back by email). In atomic mode
+    nothing is written if any operation fails; in best-effort mode the
+    failed ones are skipped.
+
+    If a concurrent request makes the grouped statements violate a
+    constraint, or deletes a contact they write, the batch is rolled back
+    and replayed operation by operation: in atomic mode within one transaction, up to the first
+    failure, and in best-effort mode with one commit per operation.
+
+    Args:
+        operations (Sequence): CreateOperation, UpdateOperation and DeleteOperation items.
+        user (User): The authenticated user.
+        db (Session): SQLAlchemy database session.
+        atomic (bool): All or nothing; otherwise best effort.
+
+    Returns:
+        dict: ``committed`` and one result per operation with an HTTP status code.
+    """
+
+    table = Contact.__table__
+    ids = {operation.id for operation in operations if operation.op != "create"}
+    emails = {operation.data.email for operation in operations if operation.op != "delete"}
+    result = await maybe_await(db.execute(select(table.c.id, table.c.email).where(
+        and_(table.c.user_id == user.id, or_(table.c.id.in_(ids), table.c.email.in_(emails))))))
+    plan = _BatchPlan(result.all())
+    results = [plan.apply(index, operation, user) for index, operation in enumerate(operations)]
+    failed = any(result["status"] >= 400 for result in results)
+
+    if atomic and failed:
+        await maybe_await(db.rollback())
+        return {"committed": False, "results": _not_applied(results)}
+
+    try:
+        if plan.deletes:
+            deleted = await maybe_await(db.execute(delete(table).where(
+                and_(table.c.user_id == user.id, table.c.id.in_(plan.deletes)))))
+            if deleted.rowcount != len(plan.deletes):
+                raise _ConcurrentChange
+        if plan.updates:
+            updated = await maybe_await(db.execute(
+                update(table).where(and_(table.c.user_id == user.id, table.c.id == bindparam("contact_id"))),
+                [{"contact_id": contact_id, **row} for contact_id, row in plan.updates.items()]))
+            # Drivers without a reliable executemany rowcount leave it to the replay's per-row check.
+            if _dialect(db).supports_sane_multi_rowcount and updated.rowcount != len(plan.updates):
+                raise _ConcurrentChange
+        if plan.creates:
+            rows = [row for _, row in plan.creates]
+            await maybe_await(db.execute(insert(table).values(rows)))
+            created = await maybe_await(db.execute(select(table.c.email, table.c.id).where(
+                and_(table.c.user_id == user.id, table.c.email.in_([row["email"] for row in rows])))))
+            created_ids = dict(created.all())
+            for index, row in plan.creates:
+                results[index]["id"] = created_ids[row["email"]]
+        await maybe_await(db.commit())
+    except (IntegrityError, _ConcurrentChange):
+        await maybe_await(db.rollback())
+        results = await _replay_batch(operations, results, user, db, atomic)
+    await contact_cache.bump(user.id)
+    return {"committed": not atomic or not any(result["status"] >= 400 for result in results), "results": results}
+
+
+async def _replay_batch(operations: Sequence, results: List[dict], user: User, db: Session,
+                        atomic: bool) -> List[dict]:
+    for index, operation in enumerate(operations):
+        if results[index]["status"] >= 400:
+            continue
+        try:
+            contact_id = await _apply_operation(operation, user, db)
+        except IntegrityError as err:
+            await maybe_await(db.rollback())
+            results[index] = {"op": operation.op, "status": 409, "id": getattr(operation, "id", None),
+                              "detail": str(err.orig)}
+        else:
+            if contact_id is not None:
+                results[index]["id"] = contact_id
+                if not atomic:
+                    await maybe_await(db.commit())
+                continue
+            results[index] = {"op": operation.op, "status": 404, "id": operation.id, "detail": "Contact not found."}
+        if atomic:
+            await maybe_await(db.rollback())
+            return _not_applied(results)
+    if atomic:
+        await maybe_await(db.commit())
+    return results
+
+
+def _not_applied(results: List[dict]) -> List[dict]:
+    return [result if result["status"] >= 400 else
+            {**result, "status": 424, "id": None if result["op"] == "create" else result["id"], "detail": NOT_APPLIED}
+            for result in results]
+
+def birthday_window(today: date, days: int):
+    """
+    Build the filter on Contact.birth_month_day for birthdays in the next ``days`` days
+
+    The window wraps from December into January, and a 29 February birthday
+    counts as 28 February in non-leap years.
+
+    Args:
+        today (date): First day of the window
+        days (int): Number of days after today to include
+
+    Returns:
+        Tuple[ColumnElement, int]: The filter and the month-day key the window starts at
+    """
+
+    start = birthday_key(today)
+    if days >= 365:
+        return Contact.birth_month_day.isnot(None), start
+    last_day = today + timedelta(days=days)
+    end = birthday_key(last_day)
+    if last_day.month == 2 and last_day.day == 28 and not calendar.isleap(last_day.year):
+        end = birthday_key(date(2000, 2, 29))
+    if start <= end:
+        return Contact.birth_month_day.between(start, end), start
+    return or_(Contact.birth_month_day >= start, Contact.birth_month_day <= end), start
+
+
+async def get_upcoming_birthdays(user: User, db: Session, days: int = 7, fields: Optional[Sequence[str]] = None):
     """
     Get upcoming birthdays
 
+    Uses the indexed month-day key, so the lookup is a range scan on
+    ``(user_id, birth_month_day)`` whatever the year of birth.
+
     Args:
         user (User): The authenticated user
         db (Session): SQLAlchemy database session
+        days (int): Number of days after today to include. Defaults to 7.
+        fields (Optional[Sequence[str]]): Columns to select; plain dicts are returned instead of entities
 
     Returns:
-        List[Contact]: The list of upcoming birthdays
+        Union[List[Contact], List[dict]]: The list of upcoming birthdays, soonest first
     """
-    today = date.today()
-    seven_days_later = today + timedelta(days=7)
-    contacts = db.query(Contact).filter(and_(Contact.birth_date >= today, Contact.birth_date <= seven_days_later, Contact.user_id == user.id)).all()
-    db.close()
+
+    window, start = birthday_window(date.today(), days)
+    query = _select(fields).where(and_(Contact.user_id == user.id, window)).order_by(
+        case((Contact.birth_month_day >= start, 0), else_=1), Contact.birth_month_day, Contact.id)
+    result = await maybe_await(db.execute(query))
+    contacts = _all(result, fields)
+    await maybe_await(db.close())
     return contacts
 
+
+async def get_upcoming_birthdays_for_users(user_ids: List[int], db: Session, days: int = 7,
+                                           today: Optional[date] = None) -> Dict[int, List[Contact]]:
+    """
+    Get upcoming birthdays of many users with a single query
+
+    Args:
+        user_ids (List[int]): IDs of the users
+        db (Session): SQLAlchemy database session
+        days (int): Number of days after today to include. Defaults to 7.
+        today (Optional[date]): First day of the window. Defaults to the current date.
+
+    Returns:
+        Dict[int, List[Contact]]: Upcoming birthdays per user ID, soonest first; users without any are left out
+    """
+
+    window, start = birthday_window(today or date.today(), days)
+    query = select(Contact).where(and_(Contact.user_id.in_(user_ids), window)).order_by(
+        Contact.user_id, case((Contact.birth_month_day >= start, 0), else_=1), Contact.birth_month_day, Contact.id)
+    result = await maybe_await(db.execute(query))
+    birthdays = {}
+    for contact in result.scalars().all():
+        birthdays.setdefault(contact.user_id, []).append(contact)
+    return birthdays
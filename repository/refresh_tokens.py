@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta
+from typing import List, Optional
+from uuid import uuid4
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+
+from database.db import maybe_await
+from database.models import RefreshToken
+
+
+def _active(now: datetime):
+    return RefreshToken.used_at.is_(None), RefreshToken.revoked.is_(False), RefreshToken.expires_at > now
+
+
+async def create_refresh_token(user_id: int, device: Optional[str], ttl: timedelta, db: Session) -> RefreshToken:
+    """
+    Start a new token family for a login
+
+    Args:
+        user_id (int): ID of the user
+        device (Optional[str]): User agent of the login
+        ttl (timedelta): Lifetime of the token
+        db (Session): SQLAlchemy database session
+
+    Returns:
+        RefreshToken: The first token of the family
+    """
+
+    now = datetime.utcnow()
+    token = RefreshToken(id=str(uuid4()), family_id=str(uuid4()), user_id=user_id, device=device and device[:255],
+                         created_at=now, expires_at=now + ttl)
+    db.add(token)
+    await maybe_await(db.commit())
+    return token
+
+
+async def rotate_refresh_token(token_id: str, ttl: timedelta, db: Session) -> Optional[RefreshToken]:
+    """
+    Exchange an active token for its successor in the same family
+
+    The token is marked used with a conditional UPDATE, so of two concurrent
+    requests presenting the same token only one gets a successor.
+
+    Args:
+        token_id (str): The presented token's ``jti``
+        ttl (timedelta): Lifetime of the new token
+        db (Session): SQLAlchemy database session
+
+    Returns:
+        Optional[RefreshToken]: The new token, or None when the presented one is unknown, used, revoked or expired
+    """
+
+    now = datetime.utcnow()
+    result = await maybe_await(db.execute(
+        update(RefreshToken).where(RefreshToken.id == token_id, *_active(now)).values(used_at=now)
+        .execution_options(synchronize_session=False)))
+    if result.rowcount != 1:
+        await maybe_await(db.rollback())
+        return None
+    result = await maybe_await(db.execute(select(RefreshToken).where(RefreshToken.id == token_id)))
+    used = result.scalars().first()
+    token = RefreshToken(id=str(uuid4()), family_id=used.family_id, user_id=used.user_id, device=used.device,
+                         created_at=now, expires_at=now + ttl)
+    db.add(token)
+    await maybe_await(db.commit())
+    return token
+
+
+async def revoke_family(family_id: str, db: Session, user_id: Optional[int] = None) -> bool:
+    """
+    Revoke every token of a session
+
+    Args:
+        family_id (str): The session
+        db (Session): SQLAlchemy database session
+        user_id (Optional[int]): Only revoke the session if it belongs to this user
+
+    Returns:
+        bool: Whether a session was revoked
+    """
+
+    query = update(RefreshToken).where(RefreshToken.family_id == family_id, RefreshToken.revoked.is_(False))
+    if user_id is not None:
+        query = query.where(RefreshToken.user_id == user_id)
+    result = await maybe_await(db.execute(query.values(revoked=True).execution_options(synchronize_session=False)))
+    await maybe_await(db.commit())
+    return result.rowcount > 0
+
+
+async def get_sessions(user_id: int, db: Session) -> List[RefreshToken]:
+    """
+    Get the active sessions of a user
+
+    Args:
+        user_id (int): ID of the user
+        db (Session): SQLAlchemy database session
+
+    Returns:
+        List[RefreshToken]: The current token of every active session, most recently refreshed first
+    """
+
+    query = select(RefreshToken).where(RefreshToken.user_id == user_id, *_active(datetime.utcnow())) \
+        .order_by(RefreshToken.created_at.desc())
+    result = await maybe_await(db.execute(query))
+    return result.scalars().all()
+
+
+async def purge_expired(user_id: int, db: Session) -> None:
+    """
+    Delete a user's expired tokens
+
+    Not committed on its own; the deletion is committed with the next write,
+    e.g. the token issued at login.
+
+    Args:
+        user_id (int): ID of the user
+        db (Session): SQLAlchemy database session
+    """
+
+    await maybe_await(db.execute(
+        delete(RefreshToken).where(RefreshToken.user_id == user_id, RefreshToken.expires_at <= datetime.utcnow())
+        .execution_options(synchronize_session=False)))
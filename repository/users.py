@@ -1,5 +1,10 @@
+from typing import List
+
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from database.db import maybe_await
 from database.models import User
+from services.cache import user_cache
 from schemas import UserModel
 
 async def get_user_by_email(email: str, db: Session) -> User:
@@ -14,7 +19,25 @@ async def get_user_by_email(email: str, db: Session) -> User:
         Type[User]: User object or None
     """
 
-    return db.query(User).filter(User.email == email).first()
+    result = await maybe_await(db.execute(select(User).where(User.email == email)))
+    return result.scalars().first()
+
+async def get_confirmed_users(after_id: int, limit: int, db: Session) -> List[User]:
+    """
+    Get a chunk of confirmed users ordered by ID
+
+    Args:
+        after_id (int): Only users with a greater ID are returned
+        limit (int): Maximum number of users
+        db (Session): SQLAlchemy database session
+
+    Returns:
+        List[User]: The users
+    """
+
+    query = select(User).where(User.id > after_id, User.confirmed.is_(True)).order_by(User.id).limit(limit)
+    result = await maybe_await(db.execute(query))
+    return result.scalars().all()
 
 async def create_user(body: UserModel, db: Session) -> User:
     """
@@ -30,22 +53,22 @@ async def create_user(body: UserModel, db: Session) -> User:
 
     new_user = User(**body.dict())
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await maybe_await(db.commit())
+    await maybe_await(db.refresh(new_user))
     return new_user
 
-async def update_token(user: User, token: str | None, db: Session) -> None:
+async def update_password(user: User, password_hash: str, db: Session) -> None:
     """
-    Update refresh token
+    Update password hash
 
     Args:
         user (User): User object
-        token (str | None): Refresh token
+        password_hash (str): The new password hash
         db (Session): SQLAlchemy database session
     """
 
-    user.refresh_token = token
-    db.commit()
+    user.password = password_hash
+    await maybe_await(db.commit())
 
 async def confirm_email(email: str, db: Session) -> None:
     """
@@ -58,7 +81,8 @@ async def confirm_email(email: str, db: Session) -> None:
 
     user = await get_user_by_email(email, db)
     user.confirmed = True
-    db.commit()
+    await maybe_await(db.commit())
+    await user_cache.invalidate(email)
 
 async def update_avatar(email, url: str, db: Session) -> User:
     """
@@ -74,5 +98,6 @@ async def update_avatar(email, url: str, db: Session) -> User:
     """
     user = await get_user_by_email(email, db)
     user.avatar = url
-    db.commit()
+    await maybe_await(db.commit())
+    await user_cache.invalidate(email)
     return user
\ No newline at end of file
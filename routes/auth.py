@@ -1,9 +1,13 @@
+from typing import List
+
 from fastapi import APIRouter, HTTPException, Depends, status, Security, BackgroundTasks, Request
 from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
 from sqlalchemy.orm import Session
 
 from database.db import get_db
-from schemas import UserModel, UserResponse, TokenModel
+from database.models import User
+from schemas import SessionResponse, UserModel, UserResponse, TokenModel
+from repository import refresh_tokens as repository_tokens
 from repository import users as repository_users
 from services.auth import auth_service
 from services.email import send_email
@@ -25,6 +29,7 @@ async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Re
 
     Raises:
         HTTPException: Account already exists
+        HTTPException: Too many password checks in progress
 
     Returns:
         dict: Response containing the new user and a confirmation message.
@@ -34,7 +39,7 @@ async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Re
     if exist_user:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account already exists")
     
-    body.password = auth_service.get_password_hash(body.password)
+    body.password = await auth_service.hash_password(body.password)
     new_user = await repository_users.create_user(body, db)
     background_tasks.add_task(send_email, new_user.email, new_user.username, request.base_url)
 
@@ -42,12 +47,15 @@ async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Re
 
 
 @router.post("/login", response_model=TokenModel)
-async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(request: Request, body: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     """
     User login
 
+    Starts a new session: the refresh token opens a token family of its own,
+    so logging in on one device leaves the other devices signed in.
 
     Args:
+        request (Request): The incoming request, whose User-Agent names the session.
         body (OAuth2PasswordRequestForm, optional): Form containing user credentials.
         db (Session, optional): SQLAlchemy database session.
 
@@ -55,6 +63,7 @@ async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depen
         HTTPException: Invalid email
         HTTPException: Email not confirmed
         HTTPException: Invalid password
+        HTTPException: Too many password checks in progress
 
     Returns: 
         dict: Response containing access and refresh tokens
@@ -65,13 +74,18 @@ async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depen
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email")
     if not user.confirmed:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Email not confirmed")
-    if not auth_service.verify_password(body.password, user.password):
+    valid, new_hash = await auth_service.verify_and_update_password(body.password, user.password)
+    if not valid:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password")
+    if new_hash is not None:
+        await repository_users.update_password(user, new_hash, db)
     
+    await repository_tokens.purge_expired(user.id, db)
+    stored = await repository_tokens.create_refresh_token(user.id, request.headers.get("user-agent"),
+                                                          auth_service.REFRESH_TOKEN_TTL, db)
     access_token = await auth_service.create_access_token(data={"sub": user.email})
-    refresh_token = await auth_service.create_refresh_token(data={"sub": user.email})
-
-    await repository_users.update_token(user, refresh_token, db)
+    refresh_token = await auth_service.create_refresh_token(data={"sub": user.email, "jti": stored.id,
+                                                                  "fam": stored.family_id})
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 
@@ -81,6 +95,11 @@ async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(sec
     """
     Refresh access token
 
+    The refresh token is single use: it is exchanged for a new one in the
+    same session. Presenting an already used token revokes the whole
+    session, since either the client or an attacker holds a stolen copy.
+    The users table is not touched.
+
     Args:
         credentials (HTTPAuthorizationCredentials, optional): Credentials containing the refresh token.(security).
         db (Session, optional): SQLAlchemy database session.
@@ -92,20 +111,85 @@ async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(sec
         dict: Response containing a new access token and refresh token.
     """
 
-    token = credentials.credentials
-    email = await auth_service.decode_refresh_token(token)
-    user = await repository_users.get_user_by_email(email, db)
-
-    if user.refresh_token != token:
-        await repository_users.update_token(user, None, db)
+    claims = await auth_service.decode_refresh_token_claims(credentials.credentials)
+    if "jti" not in claims:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
 
-    access_token = await auth_service.create_access_token(data={"sub": email})
-    refresh_token = await auth_service.create_refresh_token(data={"sub": email})
+    stored = await repository_tokens.rotate_refresh_token(claims["jti"], auth_service.REFRESH_TOKEN_TTL, db)
+    if stored is None:
+        await repository_tokens.revoke_family(claims["fam"], db)
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
 
-    await repository_users.update_token(user, refresh_token, db)
+    access_token = await auth_service.create_access_token(data={"sub": claims["sub"]})
+    refresh_token = await auth_service.create_refresh_token(data={"sub": claims["sub"], "jti": stored.id,
+                                                                  "fam": stored.family_id})
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
+
+@router.post('/logout')
+async def logout(credentials: HTTPAuthorizationCredentials = Security(security), db: Session = Depends(get_db)):
+    """
+    End the session of a refresh token
+
+    Args:
+        credentials (HTTPAuthorizationCredentials, optional): Credentials containing the refresh token.
+        db (Session, optional): SQLAlchemy database session.
+
+    Raises:
+        HTTPException: Invalid refresh token.
+
+    Returns:
+        dict: Response message.
+    """
+
+    claims = await auth_service.decode_refresh_token_claims(credentials.credentials)
+    if "fam" not in claims:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+    await repository_tokens.revoke_family(claims["fam"], db)
+    return {"message": "Logged out"}
+
+
+@router.get('/sessions', response_model=List[SessionResponse])
+async def get_sessions(current_user: User = Depends(auth_service.get_current_user), db: Session = Depends(get_db)):
+    """
+    List the active sessions of the authenticated user
+
+    Args:
+        current_user (User, optional): The authenticated user.
+        db (Session, optional): SQLAlchemy database session.
+
+    Returns:
+        List[SessionResponse]: One entry per signed-in device.
+    """
+
+    return await repository_tokens.get_sessions(current_user.id, db)
+
+
+@router.delete('/sessions/{family_id}')
+async def revoke_session(family_id: str, current_user: User = Depends(auth_service.get_current_user),
+                         db: Session = Depends(get_db)):
+    """
+    Sign a device out by revoking its session
+
+    Access tokens already issued to it stay valid until they expire.
+
+    Args:
+        family_id (str): ID of the session.
+        current_user (User, optional): The authenticated user.
+        db (Session, optional): SQLAlchemy database session.
+
+    Raises:
+        HTTPException: Session not found
+
+    Returns:
+        dict: Response message.
+    """
+
+    if not await repository_tokens.revoke_family(family_id, db, user_id=current_user.id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
+    return {"message": "Session revoked"}
+
+
 @router.get('/confirmed_email/{token}')
 async def confirmed_email(token: str, db: Session = Depends(get_db)):
     """
@@ -1,22 +1,139 @@
-from typing import List
-
-from fastapi import APIRouter, HTTPException, Depends, status
-from fastapi_limiter.depends import RateLimiter
+import hashlib
+import json
+from datetime import date
+from typing import List, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Depends, status, Response, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from database.db import get_db
-from schemas import ContactModel
+from database.db import get_db, get_read_db, served_by_replica
+from schemas import (BatchReport, ContactBatch, ContactBatchResponse, ContactIds, ContactModel, ContactPatch,
+                     ContactResponse, ImportReport)
 from repository import contacts as repository_contacts
 from database.models import User
 from services.auth import auth_service
+from services.cache import contact_cache
+from services import contacts_io, serialization
+from services.query_stats import QueryBudget
+from services.rate_limit import RateLimit
 
 router = APIRouter(prefix='/contacts')
 
-rate_limit = RateLimiter(times=10, seconds=60)
+rate_limit = RateLimit()
+bulk_rate_limit = RateLimit(cost=5)
+
+CACHE_HEADERS = {"Cache-Control": "private, no-cache"}
+CONTACT_FIELDS = tuple(ContactResponse.model_fields)
+
+
+def _etag(*parts) -> str:
+    return '"%s"' % hashlib.sha1(":".join(map(str, parts)).encode()).hexdigest()
+
+
+def _body_etag(body: bytes) -> str:
+    return '"%s"' % hashlib.sha1(body).hexdigest()
+
+
+def _not_modified(request: Request, etag: str) -> Optional[Response]:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return None
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if etag in candidates or "*" in candidates:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, **CACHE_HEADERS})
+    return None
+
+
+def sparse_fields(fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. "
+                                                                  "first_name,last_name,phone_number")
+                  ) -> Optional[Tuple[str, ...]]:
+    """
+    Parse the sparse fieldset of a contact read
+
+    Only the requested columns are selected and serialized. ``id`` is always
+    included, since it identifies the contact and carries the page cursor.
+
+    Args:
+        fields (Optional[str], optional): Comma-separated ContactResponse fields.
+
+    Raises:
+        HTTPException: Unknown field
+
+    Returns:
+        Optional[Tuple[str, ...]]: The fields, ``id`` first, or None for the whole contact.
+    """
+
+    if fields is None:
+        return None
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in CONTACT_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown fields: {', '.join(unknown)}.")
+    return tuple(dict.fromkeys(["id", *requested]))
+
+
+def _fields_key(fields: Optional[Tuple[str, ...]]) -> str:
+    return "*" if fields is None else ",".join(fields)
+
+
+def _pack_page(body: bytes, next_id: Optional[int]) -> bytes:
+    # A page is cached with the ID its next-page cursor points after on a
+    # first line, so a hit is served without parsing the JSON body.
+    return b"%s\n%s" % (b"" if next_id is None else b"%d" % next_id, body)
+
+
+def _unpack_page(page: bytes) -> Tuple[bytes, Optional[int]]:
+    next_id, _, body = page.partition(b"\n")
+    return body, int(next_id) if next_id else None
+
+
+async def _conditional_read(request: Request, response: Response, user: User, key: str, loader, db):
+    """
+    Serve a cached contact read with an ETag, answering If-None-Match with 304
 
+    The ETag is derived from the user's contact version, so an unchanged
+    resource is confirmed with one Redis lookup, without loading or
+    serializing rows. Without Redis it falls back to hashing the body.
 
-@router.post("/", response_model=ContactModel, description='No more than 10 requests per minute',
-            dependencies=[Depends(rate_limit)])
+    A replica may not have caught up with the version yet, so rows it
+    served are neither cached nor tagged with the version: the ETag is then
+    the hash of the payload too.
+
+    Returns:
+        The payload to return, or a 304 Response.
+    """
+
+    version = await contact_cache.version(user.id)
+    if version is not None:
+        etag = _etag(user.id, version, key)
+        not_modified = _not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
+
+    from_replica = False
+
+    async def load():
+        nonlocal from_replica
+        payload = await loader()
+        from_replica = served_by_replica(db)
+        return payload
+
+    payload = await contact_cache.read_through(user.id, key, load, version=version,
+                                               cacheable=lambda: not from_replica)
+    if version is None or from_replica:
+        etag = _body_etag(payload)
+        not_modified = _not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
+    response.headers["ETag"] = etag
+    response.headers.update(CACHE_HEADERS)
+    return payload
+
+
+@router.post("/", response_model=ContactResponse, description='No more than 10 requests per minute',
+            dependencies=[Depends(rate_limit), Depends(QueryBudget(3))])
 async def create_contact(body: ContactModel, db: Session = Depends(get_db),
                          current_user: User = Depends(auth_service.get_current_user)):
     """
@@ -28,30 +145,143 @@ async def create_contact(body: ContactModel, db: Session = Depends(get_db),
         current_user (User, optional):  The authenticated user.
 
     Returns:
-        ContactModel: The created contact.
+        ContactResponse: The created contact.
     """
-    return await repository_contacts.create_contact(body, current_user, db)
+    contact = await repository_contacts.create_contact(body, current_user, db)
+    return serialization.render(contact, adapter=serialization.contact_adapter)
 
 
-@router.get("/", response_model=list[ContactModel], description='No more than 10 requests per minute',
-            dependencies=[Depends(rate_limit)])
-async def get_contacts(skip: int = 0, limit: int = 20, db: Session = Depends(get_db),
-                        current_user: User = Depends(auth_service.get_current_user)):
+@router.post("/import", response_model=ImportReport, description='No more than 2 requests per minute',
+             dependencies=[Depends(bulk_rate_limit)])
+async def import_contacts(request: Request, format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+                          batch_size: int = Query(contacts_io.IMPORT_BATCH_SIZE, ge=1, le=5000),
+                          db: Session = Depends(get_db),
+                          current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Import contacts from a CSV or NDJSON request body
+
+    The body is streamed and inserted in batches, so files of any size can be
+    sent in one request. CSV files need a header row naming the ContactModel
+    fields.
+
+    Args:
+        request (Request): The incoming request carrying the file as its body.
+        format (Optional[str], optional): ``csv`` or ``ndjson``. Defaults to the request Content-Type.
+        batch_size (int, optional): Number of rows per INSERT statement.
+        db (Session, optional): SQLAlchemy database session.
+        current_user (User, optional): The authenticated user.
+
+    Raises:
+        HTTPException: Unsupported format
+
+    Returns:
+        ImportReport: Number of imported and failed rows with per-row errors.
+    """
+
+    if format is None:
+        content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+        format = contacts_io.IMPORT_FORMATS.get(content_type)
+    if format is None:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                            detail="Send text/csv or application/x-ndjson, or set the format parameter.")
+
+    return await contacts_io.import_contacts(request.stream(), format, current_user, db, batch_size)
+
+
+@router.post("/batch", response_model=BatchReport, description='No more than 2 requests per minute',
+             dependencies=[Depends(bulk_rate_limit), Depends(QueryBudget(6))])
+async def batch_contacts(body: ContactBatch, db: Session = Depends(get_db),
+                         current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Apply an ordered list of contact creations, updates and deletions
+
+    The operations are checked in order, as if sent one by one, and written
+    in one transaction with one statement per kind of operation. Each gets
+    a result with the status code the single request would have returned:
+    201 for a creation, 200 for an update or deletion, 404 and 409 for
+    missing contacts and email conflicts. In ``atomic`` mode (the default)
+    one failure rolls the whole batch back and the other operations report
+    424; in ``best_effort`` mode the failed operations are skipped.
+
+    Args:
+        body (ContactBatch): The operations, at most BATCH_MAX_OPERATIONS, and the mode.
+        db (Session, optional): SQLAlchemy database session.
+        current_user (User, optional): The authenticated user.
+
+    Returns:
+        BatchReport: Whether the batch was committed and the result of each operation.
+    """
+
+    return await repository_contacts.apply_batch(body.operations, current_user, db, atomic=body.mode == "atomic")
+
+
+@router.post("/batch-get", response_model=ContactBatchResponse, description='No more than 10 requests per minute',
+             dependencies=[Depends(rate_limit), Depends(QueryBudget(2))])
+async def batch_get_contacts(body: ContactIds, fields: Optional[Tuple[str, ...]] = Depends(sparse_fields),
+                             db: Session = Depends(get_read_db),
+                             current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Get many contacts by ID
+
+    The contacts are read with one ``IN`` query and returned in the order of
+    the requested IDs, repeated IDs once. IDs with no contact of the
+    authenticated user are listed in ``missing``. With ``fields`` only those
+    columns are selected and returned.
+
+    Args:
+        body (ContactIds): IDs of the contacts to retrieve, at most BATCH_GET_MAX_IDS.
+        fields (Optional[Tuple[str, ...]], optional): Sparse fieldset, see sparse_fields.
+        db (Session, optional): SQLAlchemy database session.
+        current_user (User, optional): The authenticated user.
+
+    Returns:
+        ContactBatchResponse: The contacts found and the missing IDs.
+    """
+
+    contacts = await repository_contacts.get_contacts_by_ids(body.ids, current_user, db, fields=fields)
+    if fields is None:
+        found_ids = {contact.id for contact in contacts}
+        found = serialization.dump(serialization.contact_list_adapter, contacts)
+    else:
+        found_ids = {contact["id"] for contact in contacts}
+        found = serialization.dump(serialization.sparse_list_adapter, contacts)
+    missing = [contact_id for contact_id in dict.fromkeys(body.ids) if contact_id not in found_ids]
+    return serialization.render(b'{"contacts":%s,"missing":%s}' % (found, json.dumps(missing).encode()),
+                                partial=fields is not None)
+
+
+@router.get("/", response_model=list[ContactResponse], description='No more than 10 requests per minute',
+            dependencies=[Depends(rate_limit), Depends(QueryBudget(2))])
+async def get_contacts(request: Request, response: Response, skip: int = 0, limit: int = 20, after: Optional[str] = None,
+                       fields: Optional[Tuple[str, ...]] = Depends(sparse_fields), db: Session = Depends(get_read_db),
+                       current_user: User = Depends(auth_service.get_current_user)):
     """
     Get all contacts
 
+    Contacts are ordered by ID. When the page is full, the ``X-Next-Cursor``
+    response header carries an opaque cursor; pass it back as ``after`` to get
+    the next page without the cost of an offset scan. Sending the page's ETag
+    back in ``If-None-Match`` returns 304 while the contacts are unchanged.
+    With ``fields`` only those columns are selected and returned.
+
     Args:
+        request (Request): The incoming request, checked for If-None-Match.
+        response (Response): The outgoing response, used to set the ETag and next-page cursor.
         skip (int, optional): Number of records to skip. Defaults to 0.
         limit (int, optional): Maximum number of records to retrieve.. Defaults to 20.
+        after (Optional[str], optional): Cursor from the previous page's ``X-Next-Cursor`` header.
+        fields (Optional[Tuple[str, ...]], optional): Sparse fieldset, see sparse_fields.
         db (Session, optional): SQLAlchemy database session.
         current_user (User, optional):The authenticated user
 
     Raises:
         HTTPException: negative number
         HTTPException: limit less than or equal to skip
+        HTTPException: invalid cursor
+        HTTPException: unknown field
 
     Returns:
-        List[ContactModel]: The list of contacts.
+        List[ContactResponse]: The list of contacts.
     """
     if skip < 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
@@ -60,19 +290,90 @@ async def get_contacts(skip: int = 0, limit: int = 20, db: Session = Depends(get
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail="The limit is less than or equal to the skip.")
 
-    contact = await repository_contacts.get_contacts(skip, limit, current_user, db)
-    return contact
+    after_id = None
+    if after is not None:
+        if skip:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail="The skip and after parameters cannot be combined.")
+        try:
+            after_id = repository_contacts.decode_cursor(after)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+
+    async def load():
+        contacts = await repository_contacts.get_contacts(skip, limit, current_user, db, after=after_id, fields=fields)
+        next_id = None
+        if len(contacts) == limit:
+            next_id = contacts[-1].id if fields is None else contacts[-1]["id"]
+        adapter = serialization.contact_list_adapter if fields is None else serialization.sparse_list_adapter
+        return _pack_page(serialization.dump(adapter, contacts), next_id)
+
+    key = f"list:{skip}:{limit}:{after_id}:{_fields_key(fields)}"
+    page = await _conditional_read(request, response, current_user, key, load, db)
+    if isinstance(page, Response):
+        return page
+    body, next_id = _unpack_page(page)
+    if next_id is not None:
+        response.headers["X-Next-Cursor"] = repository_contacts.encode_cursor(next_id)
+    return serialization.render(body, response, partial=fields is not None)
+
+
+@router.get("/export", response_class=StreamingResponse, description='No more than 2 requests per minute',
+            dependencies=[Depends(bulk_rate_limit)])
+async def export_contacts(request: Request, format: str = Query("ndjson", pattern="^(ndjson|csv|vcf)$"),
+                          db: Session = Depends(get_read_db),
+                          current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Export all contacts of the authenticated user
 
+    The file is streamed from a server-side cursor, so memory use stays flat
+    and the first bytes are sent as soon as the first batch is read. With
+    the contact cache enabled an unchanged export is answered with 304,
+    unless a replica serves it.
 
-@router.get("/{contact_id}", response_model=ContactModel, description='No more than 10 requests per minute',
-            dependencies=[Depends(rate_limit)])
-async def get_contact(contact_id: int, db: Session = Depends(get_db),
-                       current_user: User = Depends(auth_service.get_current_user)):
+    Args:
+        request (Request): The incoming request, checked for If-None-Match.
+        format (str, optional): ``ndjson``, ``csv`` or ``vcf``. Defaults to ``ndjson``.
+        db (Session, optional): SQLAlchemy database session.
+        current_user (User, optional): The authenticated user.
+
+    Returns:
+        StreamingResponse: The contact book in the requested format.
+    """
+
+    headers = {"Content-Disposition": f'attachment; filename="contacts.{format}"'}
+    version = await contact_cache.version(current_user.id)
+    # Rows from a lagging replica must not be tagged with the current version.
+    if version is not None and not served_by_replica(db):
+        etag = _etag(current_user.id, version, f"export:{format}")
+        not_modified = _not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
+        headers.update({"ETag": etag, **CACHE_HEADERS})
+
+    # get_read_db closes the session before the body is streamed; sessions are
+    # reusable after close(), so the stream takes it over and closes it again.
+    batches = repository_contacts.stream_contacts(current_user, db, contacts_io.EXPORT_BATCH_SIZE)
+    return StreamingResponse(contacts_io.export_contacts(batches, format),
+                             media_type=contacts_io.EXPORT_MEDIA_TYPES[format], headers=headers)
+
+
+@router.get("/{contact_id}", response_model=ContactResponse, description='No more than 10 requests per minute',
+            dependencies=[Depends(rate_limit), Depends(QueryBudget(2))])
+async def get_contact(request: Request, response: Response, contact_id: int,
+                      fields: Optional[Tuple[str, ...]] = Depends(sparse_fields), db: Session = Depends(get_read_db),
+                      current_user: User = Depends(auth_service.get_current_user)):
     """
     Get contact by ID
 
+    Answers ``If-None-Match`` with 304 while the contacts are unchanged.
+    With ``fields`` only those columns are selected and returned.
+
     Args:
+        request (Request): The incoming request, checked for If-None-Match.
+        response (Response): The outgoing response, used to set the ETag.
         contact_id (int): ID of the contact to retrieve.
+        fields (Optional[Tuple[str, ...]], optional): Sparse fieldset, see sparse_fields.
         db (Session, optional): SQLAlchemy database session.
         current_user (User, optional): The authenticated user.
 
@@ -80,18 +381,27 @@ async def get_contact(contact_id: int, db: Session = Depends(get_db),
         HTTPException: Contact not found
 
     Returns:
-        ContactModel: The requested contact.
+        ContactResponse: The requested contact.
     """
 
-    contact = await repository_contacts.get_contact(contact_id, current_user, db)
-
-    if contact is None:
+    async def load():
+        found = await repository_contacts.get_contact(contact_id, current_user, db, fields=fields)
+        if found is None:
+            return b"null"
+        adapter = serialization.contact_adapter if fields is None else serialization.sparse_adapter
+        return serialization.dump(adapter, found)
+
+    key = f"get:{contact_id}:{_fields_key(fields)}"
+    contact = await _conditional_read(request, response, current_user, key, load, db)
+    if isinstance(contact, Response):
+        return contact
+    if contact == b"null":
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found.")
-    return contact
+    return serialization.render(contact, response, partial=fields is not None)
 
 
-@router.put("/{contact_id}", response_model=ContactModel, description='No more than 10 requests per minute',
-            dependencies=[Depends(rate_limit)])
+@router.put("/{contact_id}", response_model=ContactResponse, description='No more than 10 requests per minute',
+            dependencies=[Depends(rate_limit), Depends(QueryBudget(3))])
 async def update_contact(contact_id: int, body: ContactModel, db: Session = Depends(get_db),
                          current_user: User = Depends(auth_service.get_current_user)):
     """
@@ -107,18 +417,53 @@ async def update_contact(contact_id: int, body: ContactModel, db: Session = Depe
         HTTPException: Contact not found
 
     Returns:
-        ContactModel: The updated contact.
+        ContactResponse: The updated contact.
     """
 
     contact = await repository_contacts.update_contact(contact_id, body, current_user, db)
 
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found.")
-    return contact
+    return serialization.render(contact, adapter=serialization.contact_adapter)
 
 
-@router.delete("/{contact_id}", response_model=ContactModel, description='No more than 10 requests per minute',
-            dependencies=[Depends(rate_limit)])
+@router.patch("/{contact_id}", response_model=ContactResponse, description='No more than 10 requests per minute',
+              dependencies=[Depends(rate_limit), Depends(QueryBudget(3))])
+async def patch_contact(contact_id: int, body: ContactPatch, db: Session = Depends(get_db),
+                        current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Update some fields of a contact
+
+    Only the fields present in the body are written, in one
+    ``UPDATE ... RETURNING`` statement on PostgreSQL.
+
+    Args:
+        contact_id (int): ID of the contact to update.
+        body (ContactPatch): The fields to change.
+        db (Session, optional): SQLAlchemy database session.
+        current_user (User, optional): The authenticated user.
+
+    Raises:
+        HTTPException: Contact not found
+        HTTPException: Email already used by another contact
+
+    Returns:
+        ContactResponse: The updated contact.
+    """
+
+    try:
+        contact = await repository_contacts.patch_contact(contact_id, body.model_dump(exclude_unset=True),
+                                                          current_user, db)
+    except IntegrityError:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A contact with this email already exists.")
+
+    if contact is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found.")
+    return serialization.render(contact, adapter=serialization.contact_adapter)
+
+
+@router.delete("/{contact_id}", response_model=ContactResponse, description='No more than 10 requests per minute',
+            dependencies=[Depends(rate_limit), Depends(QueryBudget(3))])
 async def delete_contact(contact_id: int, db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
     """
     Delete contact
@@ -132,33 +477,46 @@ async def delete_contact(contact_id: int, db: Session = Depends(get_db), current
         HTTPException: Contact not found
 
     Returns:
-        ContactModel: The deleted contact.
+        ContactResponse: The deleted contact.
     """
 
     contact = await repository_contacts.delete_contact(contact_id, current_user, db) 
 
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
-    return contact
-
-@router.get("/birthday/", response_model=List[ContactModel], description='No more than 10 requests per minute',
-            dependencies=[Depends(rate_limit)])
-async def get_upcoming_birthdays(db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+    return serialization.render(contact, adapter=serialization.contact_adapter)
+
+@router.get("/birthday/", response_model=List[ContactResponse], description='No more than 10 requests per minute',
+            dependencies=[Depends(rate_limit), Depends(QueryBudget(2))])
+async def get_upcoming_birthdays(request: Request, response: Response, days: int = Query(7, ge=0, le=365),
+                                 fields: Optional[Tuple[str, ...]] = Depends(sparse_fields),
+                                 db: Session = Depends(get_read_db),
+                                 current_user: User = Depends(auth_service.get_current_user)):
     """
     Get upcoming birthdays
 
+    Answers ``If-None-Match`` with 304 while the contacts are unchanged.
+    With ``fields`` only those columns are selected and returned.
+
     Args:
+        request (Request): The incoming request, checked for If-None-Match.
+        response (Response): The outgoing response, used to set the ETag.
+        days (int, optional): Number of days after today to look ahead. Defaults to 7.
+        fields (Optional[Tuple[str, ...]], optional): Sparse fieldset, see sparse_fields.
         db (Session, optional): SQLAlchemy database session.
         current_user (User, optional): The authenticated user.
 
-    Raises:
-        HTTPException: Contact not found
-
     Returns:
-        List[ContactModel]: The list of upcoming birthdays.
+        List[ContactResponse]: The list of upcoming birthdays.
     """
 
-    contact = await repository_contacts.get_upcoming_birthdays(current_user, db)
-    if contact is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found.")
-    return contact
\ No newline at end of file
+    async def load():
+        contacts = await repository_contacts.get_upcoming_birthdays(current_user, db, days, fields=fields)
+        adapter = serialization.contact_list_adapter if fields is None else serialization.sparse_list_adapter
+        return serialization.dump(adapter, contacts)
+
+    key = f"birthdays:{date.today()}:{days}:{_fields_key(fields)}"
+    contacts = await _conditional_read(request, response, current_user, key, load, db)
+    if isinstance(contacts, Response):
+        return contacts
+    return serialization.render(contacts, response, partial=fields is not None)
@@ -1,14 +1,15 @@
 import os
-from fastapi import APIRouter, Depends, UploadFile, File
-from fastapi_limiter.depends import RateLimiter
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Path, status
+from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
-import cloudinary
-import cloudinary.uploader
 
 from database.db import get_db
 from database.models import User
 from repository import users as repository_users
 from services.auth import auth_service
+from services import serialization
+from services.avatars import AVATAR_CACHE_CONTROL, AVATAR_MAX_BYTES, InvalidAvatar, LocalAvatarStorage, avatar_service
+from services.rate_limit import RateLimit
 from schemas import UserDb
 
 from dotenv import load_dotenv
@@ -17,7 +18,7 @@ load_dotenv()
 
 router = APIRouter(prefix="/users", tags=["users"])
 
-rate_limit = RateLimiter(times=10, seconds=60)
+rate_limit = RateLimit()
 
 @router.get("/me/", response_model=UserDb, dependencies=[Depends(rate_limit)])
 async def read_users_me(current_user: User = Depends(auth_service.get_current_user)):
@@ -30,7 +31,7 @@ async def read_users_me(current_user: User = Depends(auth_service.get_current_us
     Returns:
         UserDb: The authenticated user's profile.
     """
-    return current_user
+    return serialization.render(current_user, adapter=serialization.user_adapter)
 
 
 @router.patch('/avatar', response_model=UserDb)
@@ -40,24 +41,55 @@ async def update_avatar_user(file: UploadFile = File(),
     """
     Update the authenticated user's avatar
 
+    The image is cropped to 250x250 off the event loop and stored once per
+    distinct upload in the configured avatar storage.
+
     Args:
         file (UploadFile, optional): The avatar file.
         current_user (User, optional): The authenticated user.
         db (Session, optional): SQLAlchemy database session.
 
+    Raises:
+        HTTPException: File too large
+        HTTPException: Not an image
+
     Returns:
         UserDb: The authenticated user's updated profile.
     """
 
-    cloudinary.config(
-        cloud_name=os.getenv("CLOUDINARY_NAME"),
-        api_key=os.getenv("CLOUDINARY_API_KEY"),
-        api_secret=os.getenv("CLOUDINARY_API_SECRET"),
-        secure=True
-    )
-
-    r = cloudinary.uploader.upload(file.file, public_id=f'contact_book/{current_user.email}', overwrite=True)
-    src_url = cloudinary.CloudinaryImage(f'contact_book/{current_user.email}') \
-        .build_url(width=250, height=250, crop='fill', version=r.get('version'))
+    data = await file.read(AVATAR_MAX_BYTES + 1)
+    if len(data) > AVATAR_MAX_BYTES:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"The avatar must not exceed {AVATAR_MAX_BYTES} bytes.")
+    try:
+        src_url = await avatar_service.store(data, current_user.avatar)
+    except InvalidAvatar:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="The file is not a supported image.")
+    if src_url == current_user.avatar:
+        return current_user
     user = await repository_users.update_avatar(current_user.email, src_url, db)
     return user
+
+
+@router.get('/avatars/{name}', response_class=FileResponse)
+async def get_avatar(name: str = Path(pattern=r"^[0-9a-f]{64}\.png$")):
+    """
+    Serve an avatar kept by the local avatar storage
+
+    Avatar names are content hashes, so the response can be cached forever.
+
+    Args:
+        name (str): File name of the avatar.
+
+    Raises:
+        HTTPException: Avatar not found
+
+    Returns:
+        FileResponse: The PNG image.
+    """
+
+    storage = avatar_service.storage
+    if not isinstance(storage, LocalAvatarStorage) or not os.path.exists(storage.path(name[:-4])):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Avatar not found.")
+    return FileResponse(storage.path(name[:-4]), media_type="image/png",
+                        headers={"Cache-Control": AVATAR_CACHE_CONTROL})
@@ -1,6 +1,9 @@
 from datetime import date, datetime
-from pydantic import BaseModel, Field, EmailStr
+from typing import Annotated, List, Literal, Optional, Union
+from pydantic import BaseModel, Field, EmailStr, field_validator
 
+BATCH_GET_MAX_IDS = 100
+BATCH_MAX_OPERATIONS = 100
 
 
 class ContactModel(BaseModel):
@@ -12,12 +15,125 @@ class ContactModel(BaseModel):
     email: str
     phone_number: str
     birth_date: date
-    extra_data: str = None
+    extra_data: Optional[str] = None
 
     class Config:
         from_attributes = True
 
 
+class ContactResponse(ContactModel):
+    """
+    Schema for a contact returned by the API, including its ID.
+    """
+    id: int
+
+
+class ContactPatch(BaseModel):
+    """
+    Schema for a partial update of a contact; only the fields sent are changed.
+    """
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    email: Optional[str] = None
+    phone_number: Optional[str] = None
+    birth_date: Optional[date] = None
+    extra_data: Optional[str] = None
+
+    @field_validator("first_name", "last_name", "email", "phone_number", "birth_date")
+    @classmethod
+    def not_null(cls, value):
+        # Defaults are not validated, so this only rejects an explicit null.
+        if value is None:
+            raise ValueError("may not be null")
+        return value
+
+
+class ContactIds(BaseModel):
+    """
+    Schema for the request of a batch read of contacts.
+    """
+    ids: List[int] = Field(min_length=1, max_length=BATCH_GET_MAX_IDS)
+
+
+class ContactBatchResponse(BaseModel):
+    """
+    Schema for the result of a batch read of contacts.
+    """
+    contacts: List[ContactResponse]
+    missing: List[int]
+
+
+class CreateOperation(BaseModel):
+    """
+    Schema for a contact creation within a batch.
+    """
+    op: Literal["create"]
+    data: ContactModel
+
+
+class UpdateOperation(BaseModel):
+    """
+    Schema for a contact update within a batch.
+    """
+    op: Literal["update"]
+    id: int
+    data: ContactModel
+
+
+class DeleteOperation(BaseModel):
+    """
+    Schema for a contact deletion within a batch.
+    """
+    op: Literal["delete"]
+    id: int
+
+
+ContactOperation = Annotated[Union[CreateOperation, UpdateOperation, DeleteOperation], Field(discriminator="op")]
+
+
+class ContactBatch(BaseModel):
+    """
+    Schema for the request of a batch of contact operations.
+    """
+    operations: List[ContactOperation] = Field(min_length=1, max_length=BATCH_MAX_OPERATIONS)
+    mode: Literal["atomic", "best_effort"] = "atomic"
+
+
+class OperationResult(BaseModel):
+    """
+    Schema for the outcome of one operation of a batch, with an HTTP status code.
+    """
+    op: str
+    status: int
+    id: Optional[int] = None
+    detail: Optional[str] = None
+
+
+class BatchReport(BaseModel):
+    """
+    Schema for the result of a batch of contact operations.
+    """
+    committed: bool
+    results: List[OperationResult]
+
+
+class ImportRowError(BaseModel):
+    """
+    Schema for a row rejected by the contact import.
+    """
+    row: int
+    errors: List[str]
+
+
+class ImportReport(BaseModel):
+    """
+    Schema for the result of a contact import.
+    """
+    imported: int
+    failed: int
+    errors: List[ImportRowError]
+
+
 class UserModel(BaseModel):
     """
     Schema for the user registration.
@@ -35,6 +151,7 @@ class UserDb(BaseModel):
     username: str
     email: EmailStr
     created_at: datetime
+    avatar: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -48,6 +165,19 @@ class UserResponse(BaseModel):
     detail: str = "User successfully created"
 
 
+class SessionResponse(BaseModel):
+    """
+    Schema for a device session of the authenticated user.
+    """
+    family_id: str
+    device: Optional[str] = None
+    refreshed_at: datetime = Field(validation_alias="created_at")
+    expires_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
 class TokenModel(BaseModel):
     """
     Schema for the request containing an email address.
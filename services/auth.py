@@ -1,8 +1,10 @@
+import asyncio
 import os
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
 
 from jose import JWTError, jwt
-from fastapi import HTTPException, status, Depends
+from fastapi import HTTPException, Request, status, Depends
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
@@ -10,6 +12,7 @@ from sqlalchemy.orm import Session
 
 from database.db import get_db
 from repository import users as repository_users
+from services.cache import user_cache
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -22,8 +25,20 @@ class Auth:
         SECRET_KEY (str): Secret key for token encoding and decoding.
         ALGORITHM (str): Algorithm used for token encoding and decoding.
         oauth2_scheme (OAuth2PasswordBearer): OAuth2 password bearer for token retrieval.
+        BCRYPT_ROUNDS (int): bcrypt cost; hashes with a different cost are upgraded on the next login.
+        hash_executor (ThreadPoolExecutor): Worker pool running bcrypt off the event loop.
+        HASH_MAX_PENDING (int): Hashing jobs allowed in flight, running or waiting for a worker, before new
+            ones are rejected. Only the excess over PASSWORD_HASH_WORKERS can queue.
+        REFRESH_TOKEN_TTL (timedelta): Lifetime of a refresh token.
     """
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__default_rounds=BCRYPT_ROUNDS,
+                               bcrypt__min_rounds=BCRYPT_ROUNDS, bcrypt__max_rounds=BCRYPT_ROUNDS)
+    hash_executor = ThreadPoolExecutor(max_workers=int(os.getenv("PASSWORD_HASH_WORKERS", 4)),
+                                       thread_name_prefix="password-hash")
+    HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 64))
+    _hash_pending = 0
+    REFRESH_TOKEN_TTL = timedelta(days=int(os.getenv("REFRESH_TOKEN_TTL_DAYS", 7)))
     SECRET_KEY = os.getenv("SECRET_KEY")
     ALGORITHM = os.getenv("ALGORITHM")
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
@@ -45,6 +60,51 @@ class Auth:
     def get_password_hash(self, password: str):
         return self.pwd_context.hash(password)
 
+    async def _run_hashing(self, fn, *args):
+        if Auth._hash_pending >= self.HASH_MAX_PENDING:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Too many password checks in progress, try again later",
+                                headers={"Retry-After": "1"})
+        Auth._hash_pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.hash_executor, fn, *args)
+        finally:
+            Auth._hash_pending -= 1
+
+    async def hash_password(self, password: str) -> str:
+        """
+        Hash a password on the hashing pool without blocking the event loop.
+
+        Args:
+            password (str): The plain text password.
+
+        Raises:
+            HTTPException: Too many password checks in progress
+
+        Returns:
+            str: The bcrypt hash.
+        """
+
+        return await self._run_hashing(self.pwd_context.hash, password)
+
+    async def verify_and_update_password(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Verify a password on the hashing pool and rehash it if its cost is outdated.
+
+        Args:
+            plain_password (str): The plain text password.
+            hashed_password (str): The stored hash.
+
+        Raises:
+            HTTPException: Too many password checks in progress
+
+        Returns:
+            Tuple[bool, Optional[str]]: Whether the password matches, and a replacement hash
+            when the stored one was made with a different BCRYPT_ROUNDS.
+        """
+
+        return await self._run_hashing(self.pwd_context.verify_and_update, plain_password, hashed_password)
+
     async def create_access_token(self, data: dict, expires_delta: Optional[float] = None):
         """
         Create an access token.
@@ -82,7 +142,7 @@ class Auth:
         if expires_delta:
             expire = datetime.utcnow() + timedelta(seconds=expires_delta)
         else:
-            expire = datetime.utcnow() + timedelta(days=7)
+            expire = datetime.utcnow() + self.REFRESH_TOKEN_TTL
         to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "refresh_token"})
         encoded_refresh_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return encoded_refresh_token
@@ -102,20 +162,46 @@ class Auth:
             str: The decoded refresh token.
         """
 
+        return (await self.decode_refresh_token_claims(refresh_token))["sub"]
+
+    async def decode_refresh_token_claims(self, refresh_token: str) -> dict:
+        """
+        Decode a refresh token and return all of its claims.
+
+        Args:
+            refresh_token (str): The refresh token.
+
+        Raises:
+            HTTPException: Invalid scope for token
+            HTTPException: Could not validate credentials
+
+        Returns:
+            dict: The claims, including ``sub`` and, for tokens kept in the token store, ``jti`` and ``fam``.
+        """
+
         try:
             payload = jwt.decode(refresh_token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
             if payload['scope'] == 'refresh_token':
-                email = payload['sub']
-                return email
+                return payload
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid scope for token')
         except JWTError:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
 
-    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    async def get_current_user(self, request: Request, token: str = Depends(oauth2_scheme),
+                               db: Session = Depends(get_db)):
         """
         Get the current user.
 
+        The user is looked up in services.cache.user_cache first and only
+        loaded from the database on a miss. Either way a detached User is
+        returned, so commits in the route do not expire it.
+
+        The user's ID is recorded in ``request.state.user_id``: database.db
+        keys read-your-writes on it. The lookup runs on the primary, so the
+        route's read session picks its database only once the user is known.
+
         Args:
+            request (Request): The incoming request.
             token (str, optional): The access token.
             db (Session, optional): The database session.
 
@@ -143,9 +229,13 @@ class Auth:
         except JWTError as e:
             raise credentials_exception
 
-        user = await repository_users.get_user_by_email(email, db)
+        user = await user_cache.get(email)
         if user is None:
-            raise credentials_exception
+            user = await repository_users.get_user_by_email(email, db)
+            if user is None:
+                raise credentials_exception
+            user = await user_cache.set(user)
+        request.state.user_id = user.id
         return user
 
     def create_email_token(self, data: dict):
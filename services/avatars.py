@@ -0,0 +1,242 @@
+import asyncio
+import hashlib
+import io
+import os
+import posixpath
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from urllib.parse import urlparse
+
+import cloudinary
+import cloudinary.uploader
+import httpx
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from dotenv import load_dotenv
+load_dotenv()
+
+AVATAR_SIZE = (250, 250)
+AVATAR_MAX_BYTES = int(os.getenv("AVATAR_MAX_BYTES", 5 * 1024 * 1024))
+AVATAR_MAX_PIXELS = int(os.getenv("AVATAR_MAX_PIXELS", 25_000_000))
+AVATAR_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class InvalidAvatar(ValueError):
+    """
+    Raised when an upload is not an image Pillow can read.
+    """
+
+
+class AvatarStorage(ABC):
+    """
+    Where resized avatars are kept.
+
+    Avatars are stored under a key derived from the uploaded content, so a
+    stored avatar never changes and can be cached forever.
+    """
+
+    @abstractmethod
+    async def url(self, key: str) -> Optional[str]:
+        """
+        Get the public URL of a stored avatar.
+
+        Args:
+            key (str): Content-derived key of the avatar.
+
+        Returns:
+            Optional[str]: The URL, or None when nothing is stored under key.
+        """
+
+    @abstractmethod
+    async def save(self, key: str, data: bytes) -> str:
+        """
+        Store a resized avatar.
+
+        Args:
+            key (str): Content-derived key of the avatar.
+            data (bytes): The PNG image.
+
+        Returns:
+            str: The public URL of the avatar.
+        """
+
+
+class LocalAvatarStorage(AvatarStorage):
+    """
+    Keeps avatars in a local directory, served by ``GET /api/users/avatars/{name}``.
+
+    Attributes:
+        root (str): Directory holding the avatar files.
+        base_url (str): URL prefix the file names are appended to.
+    """
+
+    def __init__(self, root: str, base_url: str):
+        self.root = root
+        self.base_url = base_url
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.png")
+
+    async def url(self, key: str) -> Optional[str]:
+        if os.path.exists(self.path(key)):
+            return f"{self.base_url}{key}.png"
+        return None
+
+    async def save(self, key: str, data: bytes) -> str:
+        await asyncio.to_thread(self._write, key, data)
+        return f"{self.base_url}{key}.png"
+
+    def _write(self, key: str, data: bytes) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{self.path(key)}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(data)
+        os.replace(tmp_path, self.path(key))
+
+
+class CloudinaryAvatarStorage(AvatarStorage):
+    """
+    Keeps avatars on Cloudinary, configured once and called from worker threads.
+
+    The public ID of an avatar is derived from its key, so its delivery URL
+    is built locally. Whether an avatar exists is checked with a HEAD
+    request on that URL, served by the CDN, rather than with the Admin API,
+    whose hourly quota uploads would exhaust. Uploads never overwrite, so
+    storing the same avatar twice is harmless.
+
+    Attributes:
+        folder (str): Cloudinary folder of the avatars.
+        http (httpx.AsyncClient): Client of the existence checks.
+    """
+
+    def __init__(self, cloud_name: str, api_key: str, api_secret: str, folder: str = "contact_book"):
+        self.folder = folder
+        self.http = httpx.AsyncClient(timeout=5)
+        cloudinary.config(cloud_name=cloud_name, api_key=api_key, api_secret=api_secret, secure=True)
+
+    def public_id(self, key: str) -> str:
+        return f"{self.folder}/{key}"
+
+    def delivery_url(self, key: str) -> str:
+        return cloudinary.CloudinaryImage(self.public_id(key)).build_url(format="png", secure=True)
+
+    async def url(self, key: str) -> Optional[str]:
+        url = self.delivery_url(key)
+        try:
+            response = await self.http.head(url)
+        except httpx.HTTPError:
+            # Unknown; the upload that follows does not overwrite anything.
+            return None
+        return url if response.status_code == 200 else None
+
+    async def save(self, key: str, data: bytes) -> str:
+        await asyncio.to_thread(cloudinary.uploader.upload, data, public_id=self.public_id(key), format="png",
+                                overwrite=False)
+        return self.delivery_url(key)
+
+
+def resize(data: bytes, max_pixels: int = AVATAR_MAX_PIXELS) -> bytes:
+    """
+    Crop and scale an image to the avatar size.
+
+    The dimensions are checked before the pixels are decoded: a small,
+    highly compressed upload could otherwise expand to gigabytes.
+
+    Args:
+        data (bytes): The uploaded image.
+        max_pixels (int): Largest width times height accepted.
+
+    Raises:
+        InvalidAvatar: The data is not a readable image, or has more than max_pixels pixels.
+
+    Returns:
+        bytes: The avatar as PNG.
+    """
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if image.width * image.height > max_pixels:
+                raise InvalidAvatar(f"The image must not exceed {max_pixels} pixels.")
+            image = ImageOps.exif_transpose(image)
+            avatar = ImageOps.fit(image.convert("RGBA"), AVATAR_SIZE, Image.LANCZOS)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as err:
+        raise InvalidAvatar(str(err))
+    output = io.BytesIO()
+    avatar.save(output, format="PNG", optimize=True)
+    return output.getvalue()
+
+
+class AvatarService:
+    """
+    Resizes uploaded avatars off the event loop and stores each distinct image once.
+
+    Attributes:
+        storage (AvatarStorage): Backend holding the avatars.
+        executor (ThreadPoolExecutor): Worker pool running the resizing.
+        stats (dict): Stored and deduplicated upload counters.
+    """
+
+    def __init__(self, storage: AvatarStorage, workers: int = 2):
+        self.storage = storage
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="avatar")
+        self.stats = {"stored": 0, "deduplicated": 0}
+
+    @staticmethod
+    def key(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def url_key(url: str) -> str:
+        # Both backends name the file after the key: .../avatars/<key>.png, .../contact_book/<key>.png
+        return posixpath.splitext(posixpath.basename(urlparse(url).path))[0]
+
+    async def store(self, data: bytes, current_url: Optional[str] = None) -> str:
+        """
+        Store an uploaded avatar unless an identical upload is already stored.
+
+        The key is the hash of the uploaded bytes, so a repeated upload skips
+        both the resizing and the transfer to the backend. Re-uploading the
+        user's current avatar does not even query the backend.
+
+        Args:
+            data (bytes): The uploaded image.
+            current_url (Optional[str]): URL of the user's current avatar.
+
+        Raises:
+            InvalidAvatar: The data is not a readable image.
+
+        Returns:
+            str: The public URL of the avatar.
+        """
+
+        key = self.key(data)
+        if current_url is not None and self.url_key(current_url) == key:
+            self.stats["deduplicated"] += 1
+            return current_url
+        url = await self.storage.url(key)
+        if url is not None:
+            self.stats["deduplicated"] += 1
+            return url
+        avatar = await asyncio.get_running_loop().run_in_executor(self.executor, resize, data)
+        url = await self.storage.save(key, avatar)
+        self.stats["stored"] += 1
+        return url
+
+
+def create_storage() -> AvatarStorage:
+    """
+    Build the backend selected by AVATAR_STORAGE (``cloudinary`` or ``local``).
+
+    Returns:
+        AvatarStorage: The storage backend.
+    """
+
+    if os.getenv("AVATAR_STORAGE", "cloudinary") == "local":
+        return LocalAvatarStorage(root=os.getenv("AVATAR_DIR", "./media/avatars"),
+                                  base_url=os.getenv("AVATAR_BASE_URL", "/api/users/avatars/"))
+    return CloudinaryAvatarStorage(cloud_name=os.getenv("CLOUDINARY_NAME"), api_key=os.getenv("CLOUDINARY_API_KEY"),
+                                   api_secret=os.getenv("CLOUDINARY_API_SECRET"))
+
+
+avatar_service = AvatarService(create_storage(), workers=int(os.getenv("AVATAR_WORKERS", 2)))
@@ -0,0 +1,276 @@
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Optional
+
+from redis.exceptions import RedisError
+
+from database.models import User
+
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+class UserCache:
+    """
+    Two-tier cache for the authenticated-user lookup.
+
+    The first tier is an in-process LRU with a TTL, the second one an optional
+    Redis shared by all workers. Only the fields needed by the protected
+    routes are cached (never the password hash or refresh token), and hits
+    return a detached User built from them.
+
+    Attributes:
+        FIELDS (tuple): User columns kept in the cache.
+        ttl (int): Seconds an entry stays valid in either tier.
+        maxsize (int): Maximum number of entries in the in-process tier.
+        redis: Redis client set by init(), or None to use the in-process tier only.
+        stats (dict): Hit and miss counters per tier.
+    """
+    FIELDS = ("id", "username", "email", "created_at", "confirmed", "avatar")
+
+    def __init__(self, ttl: int, maxsize: int, prefix: str = "user_cache:"):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.prefix = prefix
+        self.redis = None
+        self._local = OrderedDict()
+        self.stats = {"local_hits": 0, "redis_hits": 0, "misses": 0, "invalidations": 0}
+
+    def init(self, redis) -> None:
+        """
+        Enable the shared Redis tier.
+
+        Args:
+            redis (redis.asyncio.Redis): Redis client.
+        """
+
+        self.redis = redis
+
+    def clear(self) -> None:
+        """
+        Drop every entry of the in-process tier.
+        """
+
+        self._local.clear()
+
+    async def get(self, email: str) -> Optional[User]:
+        """
+        Get a cached user.
+
+        Args:
+            email (str): Email of the user.
+
+        Returns:
+            Optional[User]: A detached user, or None on a miss.
+        """
+
+        entry = self._local.get(email)
+        if entry is not None:
+            expires_at, fields = entry
+            if expires_at > time.monotonic():
+                self._local.move_to_end(email)
+                self.stats["local_hits"] += 1
+                return self._build(fields)
+            del self._local[email]
+
+        if self.redis is not None:
+            try:
+                raw = await self.redis.get(self.prefix + email)
+            except RedisError:
+                raw = None
+            if raw is not None:
+                fields = json.loads(raw)
+                fields["created_at"] = fields["created_at"] and datetime.fromisoformat(fields["created_at"])
+                self._store_local(email, fields)
+                self.stats["redis_hits"] += 1
+                return self._build(fields)
+
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, user: User) -> User:
+        """
+        Cache a user loaded from the database.
+
+        Args:
+            user (User): The user.
+
+        Returns:
+            User: A detached copy of the cached fields, the same object a hit returns.
+        """
+
+        fields = {field: getattr(user, field) for field in self.FIELDS}
+        self._store_local(user.email, fields)
+        if self.redis is not None:
+            try:
+                await self.redis.set(self.prefix + user.email, json.dumps(fields, default=datetime.isoformat),
+                                     ex=self.ttl)
+            except RedisError:
+                pass
+        return self._build(fields)
+
+    async def invalidate(self, email: str) -> None:
+        """
+        Remove a user from both tiers after it changed.
+
+        Other workers drop their in-process copy when its TTL expires.
+
+        Args:
+            email (str): Email of the user.
+        """
+
+        self.stats["invalidations"] += 1
+        self._local.pop(email, None)
+        if self.redis is not None:
+            try:
+                await self.redis.delete(self.prefix + email)
+            except RedisError:
+                pass
+
+    def _store_local(self, email: str, fields: dict) -> None:
+        self._local[email] = (time.monotonic() + self.ttl, fields)
+        self._local.move_to_end(email)
+        while len(self._local) > self.maxsize:
+            self._local.popitem(last=False)
+
+    @staticmethod
+    def _build(fields: dict) -> User:
+        return User(**fields)
+
+
+user_cache = UserCache(ttl=int(os.getenv("USER_CACHE_TTL", 60)), maxsize=int(os.getenv("USER_CACHE_SIZE", 10000)))
+
+
+class ContactCache:
+    """
+    Redis read-through cache for serialized contact responses.
+
+    Every user has a version counter that writes increment. Cached entries
+    are keyed by user, version and query, so a write makes all of the user's
+    entries unreachable in O(1) without scanning keys; the orphaned entries
+    expire on their own. Version counters never expire, since a counter that
+    restarted from zero could make old entries reachable again. Without Redis
+    every read goes to the loader.
+
+    A bump that fails leaves the old entries reachable, so the process then
+    bypasses the cache for that user for one TTL, after which every entry
+    written under the old version has expired.
+
+    Attributes:
+        ttl (int): Seconds a cached response is kept.
+        redis: Redis client set by init(), or None to disable caching.
+        stats (dict): Hit, miss and invalidation counters.
+    """
+
+    def __init__(self, ttl: int, prefix: str = "contact_cache:"):
+        self.ttl = ttl
+        self.prefix = prefix
+        self.redis = None
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0, "failed_invalidations": 0}
+        self._bypass_until = {}
+
+    def init(self, redis) -> None:
+        """
+        Enable caching on the given Redis client.
+
+        Args:
+            redis (redis.asyncio.Redis): Redis client.
+        """
+
+        self.redis = redis
+
+    async def version(self, user_id: int) -> Optional[int]:
+        """
+        Get the current version of a user's contacts.
+
+        Args:
+            user_id (int): ID of the user.
+
+        Returns:
+            Optional[int]: The version, or None when the cache is unavailable.
+        """
+
+        if self.redis is None:
+            return None
+        bypass_until = self._bypass_until.get(user_id)
+        if bypass_until is not None:
+            if time.monotonic() < bypass_until:
+                return None
+            del self._bypass_until[user_id]
+        try:
+            return int(await self.redis.get(f"{self.prefix}{user_id}:version") or 0)
+        except RedisError:
+            return None
+
+    async def read_through(self, user_id: int, key: str, loader: Callable[[], Awaitable[bytes]],
+                           version: Optional[int] = None, cacheable: Optional[Callable[[], bool]] = None) -> bytes:
+        """
+        Return a cached response, loading and storing it on a miss.
+
+        Responses are stored as the bytes the loader produced, so a hit is
+        sent without being decoded and encoded again.
+
+        Args:
+            user_id (int): ID of the user owning the contacts.
+            key (str): Identifies the query and its parameters.
+            loader (Callable[[], Awaitable[bytes]]): Produces the serialized response.
+            version (Optional[int]): Version already read by the caller, saves one round trip.
+            cacheable (Optional[Callable[[], bool]]): Called after the loader; False keeps the response
+                out of the cache, e.g. when it may be older than the version.
+
+        Returns:
+            bytes: The cached or freshly loaded response.
+        """
+
+        if version is None:
+            version = await self.version(user_id)
+        if version is None:
+            return await loader()
+
+        data_key = f"{self.prefix}{user_id}:{version}:{key}"
+        try:
+            raw = await self.redis.get(data_key)
+        except RedisError:
+            raw = None
+        if raw is not None:
+            self.stats["hits"] += 1
+            # Clients created with decode_responses=True return str.
+            return raw.encode() if isinstance(raw, str) else raw
+
+        self.stats["misses"] += 1
+        payload = await loader()
+        if cacheable is not None and not cacheable():
+            return payload
+        try:
+            await self.redis.set(data_key, payload, ex=self.ttl)
+        except RedisError:
+            pass
+        return payload
+
+    async def bump(self, user_id: int) -> None:
+        """
+        Invalidate every cached response of a user after a write.
+
+        Args:
+            user_id (int): ID of the user.
+        """
+
+        if self.redis is None:
+            return
+        self.stats["invalidations"] += 1
+        try:
+            await self.redis.incr(f"{self.prefix}{user_id}:version")
+        except RedisError as error:
+            self.stats["failed_invalidations"] += 1
+            self._bypass_until[user_id] = time.monotonic() + self.ttl
+            logger.warning("Contact cache of user %s not invalidated, bypassing it for %ss: %s",
+                           user_id, self.ttl, error)
+
+
+contact_cache = ContactCache(ttl=int(os.getenv("CONTACT_CACHE_TTL", 300)))
@@ -0,0 +1,233 @@
+import os
+import zlib
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Sequence
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from dotenv import load_dotenv
+load_dotenv()
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 500))
+
+# Media types whose content is already compressed; compressing them again
+# costs CPU and saves next to nothing. SVG is XML and compresses well.
+INCOMPRESSIBLE_PREFIXES = ("image/", "audio/", "video/", "font/woff")
+INCOMPRESSIBLE_TYPES = {"application/zip", "application/gzip", "application/x-gzip", "application/zstd",
+                        "application/x-brotli", "application/pdf", "application/octet-stream"}
+
+
+class Encoder(ABC):
+    """
+    Incremental compressor of one response body.
+
+    compress() returns everything compressed so far, flushed, so each chunk
+    of a streaming response can be sent as soon as it is produced.
+    """
+
+    @abstractmethod
+    def compress(self, data: bytes) -> bytes:
+        """
+        Compress a chunk and flush it.
+
+        Args:
+            data (bytes): The next chunk of the body.
+
+        Returns:
+            bytes: The compressed data ready to be sent.
+        """
+
+    @abstractmethod
+    def finish(self, data: bytes = b"") -> bytes:
+        """
+        Compress the last chunk and end the stream.
+
+        Args:
+            data (bytes): The last chunk of the body, or all of it.
+
+        Returns:
+            bytes: The remaining compressed data.
+        """
+
+
+class GzipEncoder(Encoder):
+
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class BrotliEncoder(Encoder):
+
+    def __init__(self, level: int):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+class ZstdEncoder(Encoder):
+
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+# Content-codings by server preference: at the same client quality value the
+# first one wins. Codings whose library is not installed are left out.
+ENCODERS = {"zstd": ZstdEncoder, "br": BrotliEncoder, "gzip": GzipEncoder}
+AVAILABLE_ENCODINGS = tuple(name for name, available in (("zstd", zstandard), ("br", brotli), ("gzip", zlib))
+                            if available is not None)
+DEFAULT_LEVELS = {"zstd": 3, "br": 4, "gzip": 6}
+
+
+def negotiate(accept_encoding: str, encodings: Sequence[str] = AVAILABLE_ENCODINGS) -> Optional[str]:
+    """
+    Pick the content-coding of a response from the request's Accept-Encoding.
+
+    Args:
+        accept_encoding (str): Value of the Accept-Encoding header.
+        encodings (Sequence[str]): Supported codings, preferred first.
+
+    Returns:
+        Optional[str]: The coding with the highest quality value, or None to send the body as it is.
+    """
+
+    qualities = {}
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+
+    best, best_quality = None, 0.0
+    for coding in encodings:
+        quality = qualities.get(coding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def compressible(headers: Headers) -> bool:
+    if "content-encoding" in headers:
+        return False
+    media_type = headers.get("content-type", "").split(";")[0].strip().lower()
+    if media_type == "image/svg+xml":
+        return True
+    return not (media_type.startswith(INCOMPRESSIBLE_PREFIXES) or media_type in INCOMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing response bodies with zstd, brotli or gzip.
+
+    The coding is negotiated from Accept-Encoding. A body sent in one
+    message is compressed in one pass, and left alone below minimum_size.
+    A streaming body is compressed as it goes: every chunk is flushed to the
+    client as soon as it is compressed, so nothing is buffered and the first
+    bytes of an export are not delayed. Already compressed media, such as
+    avatar images, are passed through. Compressed responses carry a weak
+    ETag, since the bytes differ from those of the identity representation.
+
+    Attributes:
+        minimum_size (int): Bytes below which a complete body is sent uncompressed.
+        encodings (Sequence[str]): Codings offered, preferred first.
+        levels (Dict[str, int]): Compression level by coding.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE,
+                 encodings: Sequence[str] = AVAILABLE_ENCODINGS, levels: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encodings = tuple(encodings)
+        self.levels = {**DEFAULT_LEVELS, **(levels or {})}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""), self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        encoder = None
+
+        async def send_compressed(message):
+            nonlocal start, encoder
+            if message["type"] == "http.response.start":
+                # Held back until the first body chunk tells whether to compress.
+                start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if encoder is None:
+                headers = MutableHeaders(scope=start)
+                status = start["status"]
+                if status < 200 or status in (204, 206, 304) or not compressible(headers) \
+                        or (not more_body and len(body) < self.minimum_size):
+                    if compressible(headers):
+                        headers.add_vary_header("Accept-Encoding")
+                    await send(start)
+                    start = None
+                    await send(message)
+                    return
+                encoder = ENCODERS[encoding](self.levels[encoding])
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                etag = headers.get("etag")
+                if etag is not None and not etag.startswith("W/"):
+                    headers["ETag"] = f"W/{etag}"
+                if not more_body:
+                    body = encoder.finish(body)
+                    headers["Content-Length"] = str(len(body))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                if "content-length" in headers:
+                    del headers["Content-Length"]
+                await send(start)
+
+            if more_body:
+                await send({"type": "http.response.body", "body": encoder.compress(body), "more_body": True})
+            else:
+                await send({"type": "http.response.body", "body": encoder.finish(body)})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,297 @@
+import codecs
+import csv
+import io
+import json
+import os
+from typing import AsyncIterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+
+from database.models import Contact, User
+from repository import contacts as repository_contacts
+from schemas import ContactModel, ImportReport, ImportRowError
+
+from dotenv import load_dotenv
+load_dotenv()
+
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 500))
+IMPORT_MAX_REPORTED_ERRORS = int(os.getenv("IMPORT_MAX_REPORTED_ERRORS", 1000))
+# Longest line or CSV record, in characters, an import buffers.
+IMPORT_MAX_RECORD_SIZE = int(os.getenv("IMPORT_MAX_RECORD_SIZE", 64 * 1024))
+
+IMPORT_FORMATS = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+ParsedRow = Tuple[int, Optional[dict], Optional[str]]
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], max_length: int = IMPORT_MAX_RECORD_SIZE
+                     ) -> AsyncIterator[Optional[str]]:
+    """
+    Split a stream of UTF-8 byte chunks into lines without buffering the whole body.
+
+    A line longer than max_length is dropped as it arrives rather than
+    buffered, so memory use stays bounded whatever the body holds.
+
+    Args:
+        chunks (AsyncIterator[bytes]): The raw request body.
+        max_length (int): Longest line kept, in characters, line terminator included.
+
+    Yields:
+        Optional[str]: Each line, including its line terminator, or None for a line longer than max_length.
+    """
+
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    oversized = False
+    async for chunk in chunks:
+        *lines, pending = (pending + decoder.decode(chunk)).split("\n")
+        for line in lines:
+            yield None if oversized or len(line) >= max_length else line + "\n"
+            oversized = False
+        if len(pending) >= max_length:
+            pending, oversized = "", True
+    pending += decoder.decode(b"", final=True)
+    if oversized or len(pending) > max_length:
+        yield None
+    elif pending:
+        yield pending
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes], max_length: int = IMPORT_MAX_RECORD_SIZE
+                      ) -> AsyncIterator[ParsedRow]:
+    """
+    Parse a newline-delimited JSON body one object at a time.
+
+    Args:
+        chunks (AsyncIterator[bytes]): The raw request body.
+        max_length (int): Longest line accepted, in characters; longer ones are row errors.
+
+    Yields:
+        Tuple[int, Optional[dict], Optional[str]]: Row number, parsed object or None, parse error or None.
+    """
+
+    row_number = 0
+    async for line in iter_lines(chunks, max_length):
+        if line is None:
+            row_number += 1
+            yield row_number, None, f"Line longer than {max_length} characters"
+            continue
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            fields = json.loads(line)
+        except ValueError as err:
+            yield row_number, None, f"Invalid JSON: {err}"
+            continue
+        if not isinstance(fields, dict):
+            yield row_number, None, "Expected a JSON object"
+            continue
+        yield row_number, fields, None
+
+
+async def iter_csv(chunks: AsyncIterator[bytes], max_length: int = IMPORT_MAX_RECORD_SIZE
+                   ) -> AsyncIterator[ParsedRow]:
+    """
+    Parse a CSV body with a header row one record at a time.
+
+    Lines are joined until the quotes balance, so quoted fields may contain
+    line breaks even when they straddle two body chunks. The quotes of each
+    line are counted once, as it arrives. A record longer than max_length is
+    not buffered: it is skipped up to its end and reported as a row error.
+    The quotes of a line too long to buffer are not counted.
+
+    Args:
+        chunks (AsyncIterator[bytes]): The raw request body.
+        max_length (int): Longest record accepted, in characters.
+
+    Yields:
+        Tuple[int, Optional[dict], Optional[str]]: Row number, parsed record or None, parse error or None.
+    """
+
+    header = None
+    lines: List[str] = []
+    length = 0
+    quoted = False
+    oversized = False
+    row_number = 0
+    async for line in iter_lines(chunks, max_length):
+        if line is None:
+            oversized = True
+        else:
+            if line.count('"') % 2:
+                quoted = not quoted
+            length += len(line)
+            if length > max_length:
+                oversized, lines = True, []
+            elif not oversized:
+                lines.append(line)
+        if quoted:
+            continue
+        text = "".join(lines)
+        lines, length = [], 0
+        if oversized:
+            oversized = False
+            if header is None:
+                yield 0, None, f"Invalid CSV header: longer than {max_length} characters"
+                return
+            row_number += 1
+            yield row_number, None, f"Record longer than {max_length} characters"
+            continue
+        if not text.strip():
+            continue
+        if header is None:
+            try:
+                header = [name.strip() for name in next(csv.reader([text]))]
+            except csv.Error as err:
+                yield 0, None, f"Invalid CSV header: {err}"
+                return
+            continue
+        row_number += 1
+        try:
+            values = next(csv.reader([text]))
+        except csv.Error as err:
+            yield row_number, None, f"Invalid CSV: {err}"
+            continue
+        if len(values) > len(header):
+            yield row_number, None, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        yield row_number, {name: value for name, value in zip(header, values) if value != ""}, None
+    if quoted:
+        yield row_number + 1, None, "Invalid CSV: unterminated quoted field"
+
+
+async def import_contacts(chunks: AsyncIterator[bytes], fmt: str, user: User, db: Session,
+                          batch_size: int = IMPORT_BATCH_SIZE) -> ImportReport:
+    """
+    Validate and insert contacts from a streamed CSV or NDJSON body.
+
+    Rows are validated with ContactModel as they arrive and inserted
+    ``batch_size`` at a time, so memory use is bounded by one batch plus the
+    error report (capped at IMPORT_MAX_REPORTED_ERRORS entries).
+
+    Args:
+        chunks (AsyncIterator[bytes]): The raw request body.
+        fmt (str): ``csv`` or ``ndjson``.
+        user (User): The authenticated user.
+        db (Session): SQLAlchemy database session.
+        batch_size (int): Number of rows per multi-row INSERT.
+
+    Returns:
+        ImportReport: Number of imported and failed rows with per-row errors.
+    """
+
+    report = ImportReport(imported=0, failed=0, errors=[])
+
+    def fail(row_number: int, errors: List[str]) -> None:
+        report.failed += 1
+        if len(report.errors) < IMPORT_MAX_REPORTED_ERRORS:
+            report.errors.append(ImportRowError(row=row_number, errors=errors))
+
+    async def flush(batch: List[Tuple[int, ContactModel]]) -> None:
+        results = await repository_contacts.create_contacts_bulk([body for _, body in batch], user, db)
+        for (row_number, _), error in zip(batch, results):
+            if error is None:
+                report.imported += 1
+            else:
+                fail(row_number, [error])
+
+    rows = iter_csv(chunks) if fmt == "csv" else iter_ndjson(chunks)
+    batch = []
+    async for row_number, fields, parse_error in rows:
+        if parse_error is not None:
+            fail(row_number, [parse_error])
+            continue
+        try:
+            batch.append((row_number, ContactModel.model_validate(fields)))
+        except ValidationError as err:
+            fail(row_number, [f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in err.errors()])
+            continue
+        if len(batch) >= batch_size:
+            await flush(batch)
+            batch = []
+    if batch:
+        await flush(batch)
+    return report
+
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+
+EXPORT_FIELDS = ("id", "first_name", "last_name", "email", "phone_number", "birth_date", "extra_data")
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "vcf": "text/vcard",
+}
+
+
+def _export_record(contact: Contact) -> dict:
+    record = {field: getattr(contact, field) for field in EXPORT_FIELDS}
+    if record["birth_date"] is not None:
+        record["birth_date"] = record["birth_date"].isoformat()
+    return record
+
+
+def _vcard_escape(value: Optional[str]) -> str:
+    if value is None:
+        return ""
+    return value.replace("\\", "\\\\").replace(",", "\\,").replace(";", "\\;").replace("\r\n", "\\n") \
+        .replace("\n", "\\n")
+
+
+def _vcard(contact: Contact) -> str:
+    lines = [
+        "BEGIN:VCARD",
+        "VERSION:3.0",
+        f"N:{_vcard_escape(contact.last_name)};{_vcard_escape(contact.first_name)};;;",
+        f"FN:{_vcard_escape(' '.join(filter(None, (contact.first_name, contact.last_name))))}",
+    ]
+    if contact.email:
+        lines.append(f"EMAIL;TYPE=INTERNET:{_vcard_escape(contact.email)}")
+    if contact.phone_number:
+        lines.append(f"TEL;TYPE=CELL:{_vcard_escape(contact.phone_number)}")
+    if contact.birth_date:
+        lines.append(f"BDAY:{contact.birth_date.isoformat()}")
+    if contact.extra_data:
+        lines.append(f"NOTE:{_vcard_escape(contact.extra_data)}")
+    lines.append("END:VCARD")
+    return "\r\n".join(lines) + "\r\n"
+
+
+async def export_contacts(batches: AsyncIterator[List[Contact]], fmt: str) -> AsyncIterator[bytes]:
+    """
+    Serialize batches of contacts into chunks of an NDJSON, CSV or vCard file.
+
+    Args:
+        batches (AsyncIterator[List[Contact]]): Contacts as produced by repository.contacts.stream_contacts.
+        fmt (str): ``ndjson``, ``csv`` or ``vcf``.
+
+    Yields:
+        bytes: One encoded chunk per batch (plus the CSV header).
+    """
+
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_FIELDS)
+        yield buffer.getvalue().encode()
+        async for batch in batches:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows([_export_record(contact)[field] for field in EXPORT_FIELDS] for contact in batch)
+            yield buffer.getvalue().encode()
+    elif fmt == "vcf":
+        async for batch in batches:
+            yield "".join(_vcard(contact) for contact in batch).encode()
+    else:
+        async for batch in batches:
+            yield "".join(json.dumps(_export_record(contact)) + "\n" for contact in batch).encode()
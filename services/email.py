@@ -1,8 +1,15 @@
+import asyncio
+import logging
 import os
+import time
+from email.message import EmailMessage
+from email.utils import formataddr
 from pathlib import Path
+from typing import Dict, List, Optional
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
+import aiosmtplib
+from aiosmtplib.errors import SMTPException, SMTPRecipientsRefused, SMTPResponseException
+from fastapi_mail import ConnectionConfig
 from pydantic import EmailStr
 
 from services.auth import auth_service
@@ -10,6 +17,7 @@ from services.auth import auth_service
 from dotenv import load_dotenv
 load_dotenv()
 
+logger = logging.getLogger(__name__)
 
 conf = ConnectionConfig(
     MAIL_USERNAME=os.getenv("MAIL_USERNAME"),
@@ -25,29 +33,231 @@ conf = ConnectionConfig(
     TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
 )
 
+confirmation_template = conf.template_engine().get_template("email_template.html")
+birthday_template = conf.template_engine().get_template("birthday_digest.html")
+
+
+class MailDispatcher:
+    """
+    Delivers queued email over a small pool of persistent SMTP connections.
+
+    Each worker keeps its own connection open between messages and closes it
+    after idle_timeout seconds without mail. Workers take up to batch_size
+    messages off the queue at a time and send them back to back on the same
+    connection. Transient failures (network errors, 4xx replies) are retried
+    with exponential backoff on a fresh connection; 5xx replies and refused
+    recipients fail immediately. The queue is bounded, so producers wait when
+    delivery falls behind instead of exhausting memory.
+
+    Attributes:
+        config (ConnectionConfig): SMTP server settings.
+        pool_size (int): Number of workers, each with one connection.
+        batch_size (int): Messages a worker takes off the queue at once.
+        max_retries (int): Retries of a message after a transient failure.
+        retry_backoff (float): Seconds before the first retry, doubled for each next one.
+        idle_timeout (float): Seconds an unused connection is kept open.
+        queue (asyncio.Queue): Messages waiting for delivery.
+        stats (dict): Delivery counters, see metrics().
+    """
+
+    def __init__(self, config: ConnectionConfig, queue_size: int = 1000, pool_size: int = 2, batch_size: int = 20,
+                 max_retries: int = 3, retry_backoff: float = 1.0, idle_timeout: float = 60.0):
+        self.config = config
+        self.pool_size = pool_size
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.idle_timeout = idle_timeout
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.stats = {"queued": 0, "sent": 0, "failed": 0, "retries": 0, "batches": 0, "connections": 0}
+        self._workers: List[asyncio.Task] = []
+        self._started_at = None
+
+    @property
+    def sender(self) -> str:
+        return formataddr((self.config.MAIL_FROM_NAME or "", self.config.MAIL_FROM))
+
+    def start(self) -> None:
+        """
+        Start the delivery workers.
+        """
+
+        if not self._workers:
+            self._started_at = time.monotonic()
+            self._workers = [asyncio.create_task(self._work()) for _ in range(self.pool_size)]
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """
+        Wait for the queue to drain, then stop the workers and close their connections.
+
+        Args:
+            timeout (float): Seconds to wait for queued messages to be delivered.
+        """
+
+        if self._workers:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def enqueue(self, message: EmailMessage) -> None:
+        """
+        Queue a message for delivery, waiting while the queue is full.
+
+        Args:
+            message (EmailMessage): The message; From is set when missing.
+        """
+
+        if message["From"] is None:
+            message["From"] = self.sender
+        await self.queue.put(message)
+        self.stats["queued"] += 1
+
+    def metrics(self) -> dict:
+        """
+        Report delivery counters and throughput.
+
+        Returns:
+            dict: The stats counters plus the current queue depth and messages sent per second since start().
+        """
+
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0
+        return {
+            **self.stats,
+            "queue_depth": self.queue.qsize(),
+            "sent_per_second": round(self.stats["sent"] / elapsed, 2) if elapsed else 0.0,
+        }
+
+    async def _work(self) -> None:
+        smtp = None
+        try:
+            while True:
+                if smtp is None:
+                    message = await self.queue.get()
+                else:
+                    try:
+                        message = await asyncio.wait_for(self.queue.get(), self.idle_timeout)
+                    except asyncio.TimeoutError:
+                        smtp = await self._close(smtp)
+                        continue
+                batch = [message]
+                while len(batch) < self.batch_size and not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                self.stats["batches"] += 1
+                for message in batch:
+                    try:
+                        smtp = await self._deliver(smtp, message)
+                    except Exception:
+                        # A bad message must not end the worker: with no worker left the
+                        # bounded queue fills and every enqueue() waits forever.
+                        self.stats["failed"] += 1
+                        logger.exception("Email to %s not delivered", message["To"])
+                        smtp = await self._close(smtp)
+                    finally:
+                        self.queue.task_done()
+        finally:
+            await self._close(smtp)
+
+    async def _deliver(self, smtp: Optional[aiosmtplib.SMTP], message: EmailMessage) -> Optional[aiosmtplib.SMTP]:
+        if self.config.SUPPRESS_SEND:
+            self.stats["sent"] += 1
+            return smtp
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                if smtp is None or not smtp.is_connected:
+                    smtp = await self._connect()
+                await smtp.send_message(message)
+                self.stats["sent"] += 1
+                return smtp
+            except (SMTPException, OSError) as err:
+                error = err
+                # A failed transaction leaves the session in an unknown state.
+                smtp = await self._close(smtp)
+                if isinstance(err, SMTPRecipientsRefused) or \
+                        (isinstance(err, SMTPResponseException) and err.code >= 500):
+                    break
+            if attempt < self.max_retries:
+                self.stats["retries"] += 1
+                await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+
+        self.stats["failed"] += 1
+        logger.error("Email to %s not delivered: %s", message["To"], error)
+        return smtp
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        smtp = aiosmtplib.SMTP(
+            hostname=self.config.MAIL_SERVER,
+            port=self.config.MAIL_PORT,
+            use_tls=self.config.MAIL_SSL_TLS,
+            start_tls=self.config.MAIL_STARTTLS,
+            validate_certs=self.config.VALIDATE_CERTS,
+            timeout=self.config.TIMEOUT,
+        )
+        await smtp.connect()
+        if self.config.USE_CREDENTIALS:
+            await smtp.login(self.config.MAIL_USERNAME, self.config.MAIL_PASSWORD)
+        self.stats["connections"] += 1
+        return smtp
+
+    @staticmethod
+    async def _close(smtp: Optional[aiosmtplib.SMTP]) -> None:
+        if smtp is not None and smtp.is_connected:
+            try:
+                await smtp.quit()
+            except (SMTPException, OSError):
+                smtp.close()
+        return None
+
+
+mail_dispatcher = MailDispatcher(
+    conf,
+    queue_size=int(os.getenv("MAIL_QUEUE_SIZE", 1000)),
+    pool_size=int(os.getenv("MAIL_POOL_SIZE", 2)),
+    batch_size=int(os.getenv("MAIL_BATCH_SIZE", 20)),
+    max_retries=int(os.getenv("MAIL_MAX_RETRIES", 3)),
+    retry_backoff=float(os.getenv("MAIL_RETRY_BACKOFF", 1.0)),
+    idle_timeout=float(os.getenv("MAIL_IDLE_TIMEOUT", 60)),
+)
+
+
 async def send_email(email: EmailStr, username: str, host: str):
     """
-    Sends an email to the specified email address.
+    Queues the confirmation email for the specified email address.
+
+    The message is delivered by services.email.mail_dispatcher.
 
     Args:
         email (EmailStr): The email address to send the email to.
         username (str): The username of the user.
         host (str): The host of the server.
+    """
+
+    token_verification = auth_service.create_email_token({"sub": email})
+    message = EmailMessage()
+    message["Subject"] = "Confirm your email "
+    message["To"] = email
+    message.set_content(confirmation_template.render(host=host, username=username, token=token_verification), subtype="html")
+    await mail_dispatcher.enqueue(message)
+
 
-    Raises:
-        ConnectionErrors: If there is an error connecting to the mail server.
+async def send_birthday_digest(email: EmailStr, username: str, birthdays: List[Dict], days: int):
     """
+    Queues a digest of the user's upcoming birthdays.
 
-    try:
-        token_verification = auth_service.create_email_token({"sub": email})
-        message = MessageSchema(
-            subject="Confirm your email ",
-            recipients=[email],
-            template_body={"host": host, "username": username, "token": token_verification},
-            subtype=MessageType.html
-        )
+    Args:
+        email (EmailStr): The email address to send the email to.
+        username (str): The username of the user.
+        birthdays (List[Dict]): Entries with the contact's ``name``, birthday ``date`` and ``in_days``, soonest first.
+        days (int): Length of the window the digest covers.
+    """
 
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="email_template.html")
-    except ConnectionErrors as err:
-        print(err)
+    message = EmailMessage()
+    message["Subject"] = "Upcoming birthdays"
+    message["To"] = email
+    message.set_content(birthday_template.render(username=username, birthdays=birthdays, days=days), subtype="html")
+    await mail_dispatcher.enqueue(message)
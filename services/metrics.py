@@ -0,0 +1,124 @@
+import os
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, \
+    generate_latest, multiprocess
+from sqlalchemy import event
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+http_requests = Counter(
+    "http_requests_total", "HTTP requests served, by route template and status code.",
+    ("method", "route", "status"))
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Time spent serving HTTP requests, by route template.",
+    ("method", "route"))
+http_in_flight = Gauge(
+    "http_requests_in_flight", "HTTP requests being served.", multiprocess_mode="livesum")
+db_pool_size = Gauge(
+    "db_pool_size", "Connections a SQLAlchemy pool keeps open, overflow excluded, by pool.",
+    ("pool",), multiprocess_mode="livesum")
+db_pool_checked_out = Gauge(
+    "db_pool_checked_out", "Connections checked out of a SQLAlchemy pool, by pool.",
+    ("pool",), multiprocess_mode="livesum")
+db_pool_connects = Counter(
+    "db_pool_connects", "New database connections opened by a SQLAlchemy pool, by pool.", ("pool",))
+db_pool_usage = Histogram(
+    "db_pool_connection_usage_seconds", "Time a connection stays checked out of a SQLAlchemy pool, by pool.",
+    ("pool",))
+rate_limit_redis = Histogram(
+    "rate_limit_redis_seconds", "Latency of the rate limiter's Redis synchronization calls, by outcome.",
+    ("outcome",), buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0))
+
+
+def render() -> bytes:
+    """
+    Render the metrics in the Prometheus text exposition format.
+
+    When the app runs in several worker processes, PROMETHEUS_MULTIPROC_DIR
+    points prometheus_client at a shared directory and the values of all the
+    workers are aggregated.
+
+    Returns:
+        bytes: The exposition.
+    """
+
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def instrument_engine(engine, name: str = "primary") -> None:
+    """
+    Track the connections of the engine's pool through its events: how many
+    are checked out, how many are opened and how long each checkout lasts.
+
+    Args:
+        engine: The SQLAlchemy Engine or AsyncEngine.
+        name (str): Value of the ``pool`` label, e.g. ``primary`` or ``replica0``.
+    """
+
+    pool = getattr(engine, "sync_engine", engine).pool
+    checked_out = db_pool_checked_out.labels(name)
+    connects = db_pool_connects.labels(name)
+    usage = db_pool_usage.labels(name)
+    # Only queue pools have a fixed size to report on.
+    if hasattr(pool, "size"):
+        db_pool_size.labels(name).set(pool.size())
+
+    @event.listens_for(pool, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        connects.inc()
+
+    @event.listens_for(pool, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["checked_out_at"] = time.perf_counter()
+        checked_out.inc()
+
+    @event.listens_for(pool, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        started = connection_record.info.pop("checked_out_at", None)
+        if started is not None:
+            usage.observe(time.perf_counter() - started)
+            checked_out.dec()
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the latency, status and concurrency of HTTP requests.
+
+    Requests are labelled with the template of the route that served them
+    (``/api/contacts/{contact_id}``), so the number of series does not grow
+    with the IDs in the URLs. Requests matching no route share the
+    ``unmatched`` label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_in_flight.dec()
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            http_request_duration.labels(scope["method"], path).observe(elapsed)
+            http_requests.labels(scope["method"], path, str(status_code)).inc()
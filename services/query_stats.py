@@ -0,0 +1,210 @@
+import logging
+import os
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+from dotenv import load_dotenv
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+EXPLAIN_PREFIXES = {"postgresql": "EXPLAIN ", "sqlite": "EXPLAIN QUERY PLAN ", "mysql": "EXPLAIN "}
+
+
+class QueryBudgetExceeded(AssertionError):
+    """
+    Raised in strict mode when a request runs more queries than its route allows.
+    """
+
+
+class QueryStats:
+    """
+    The SQL statements run while serving one request.
+
+    Attributes:
+        count (int): Number of statements.
+        duration (float): Seconds spent in the database.
+        shapes (Counter): Executions of each distinct statement text.
+        budget (Optional[int]): Statements the route allows, see QueryBudget.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+        self.budget = None
+
+    def repeated(self, threshold: int) -> Dict[str, int]:
+        """
+        Find statements run often enough to be a likely N+1 pattern.
+
+        Args:
+            threshold (int): Executions from which a statement is reported.
+
+        Returns:
+            Dict[str, int]: Executions by statement text.
+        """
+
+        return {statement: count for statement, count in self.shapes.items() if count >= threshold}
+
+    def server_timing(self) -> str:
+        unit = "query" if self.count == 1 else "queries"
+        return f'db;dur={self.duration * 1000:.2f};desc="{self.count} {unit}"'
+
+
+current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+class QueryMonitor:
+    """
+    Accounts the SQL statements of each request through SQLAlchemy cursor events.
+
+    Statements are charged to the QueryStats of the request being served,
+    which QueryMonitorMiddleware keeps in a context variable; that variable
+    follows the request into the threads running sync code. Statements
+    slower than slow_query_ms are logged with their parameters and plan.
+
+    Attributes:
+        slow_query_ms (float): Duration from which a statement is logged, 0 to disable.
+        n_plus_one_threshold (int): Executions of one statement within a request reported as a likely N+1.
+        strict (bool): Raise QueryBudgetExceeded instead of answering when a route exceeds its budget.
+    """
+
+    def __init__(self, slow_query_ms: float = 200, n_plus_one_threshold: int = 5, strict: bool = False):
+        self.slow_query_ms = slow_query_ms
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.strict = strict
+
+    def instrument(self, engine) -> None:
+        """
+        Register the cursor event hooks on an engine.
+
+        Args:
+            engine: The SQLAlchemy Engine or AsyncEngine.
+        """
+
+        engine = getattr(engine, "sync_engine", engine)
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        stats = current_stats.get()
+        if stats is not None:
+            stats.count += 1
+            stats.duration += elapsed
+            stats.shapes[statement] += 1
+        if self.slow_query_ms and elapsed * 1000 >= self.slow_query_ms:
+            logger.warning("Slow query (%.1f ms): %s\n  parameters: %r\n  plan: %s", elapsed * 1000, statement,
+                           parameters, self.explain(conn, statement, parameters))
+
+    @staticmethod
+    def explain(conn, statement: str, parameters) -> str:
+        """
+        Get the plan of a read statement on the connection that ran it.
+
+        Args:
+            conn (Connection): The SQLAlchemy connection.
+            statement (str): The statement as sent to the driver.
+            parameters: Its bound parameters.
+
+        Returns:
+            str: The plan, one row per line, or why it is not available.
+        """
+
+        prefix = EXPLAIN_PREFIXES.get(conn.dialect.name)
+        if prefix is None or not re.match(r"\s*(SELECT|WITH)\b", statement, re.IGNORECASE):
+            return "not available"
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            return "\n    ".join(" ".join(str(column) for column in row) for row in cursor.fetchall())
+        except Exception as err:
+            return f"not available ({err})"
+        finally:
+            cursor.close()
+
+    def check(self, stats: QueryStats, method: str, path: str) -> None:
+        """
+        Report likely N+1 patterns and enforce the route's budget in strict mode.
+
+        Args:
+            stats (QueryStats): Statements of the request.
+            method (str): HTTP method of the request.
+            path (str): Path of the request.
+
+        Raises:
+            QueryBudgetExceeded: Budget exceeded in strict mode.
+        """
+
+        for statement, count in stats.repeated(self.n_plus_one_threshold).items():
+            logger.warning("Likely N+1 in %s %s: %d executions of %s", method, path, count, statement)
+        if stats.budget is not None and stats.count > stats.budget:
+            message = f"{method} {path} ran {stats.count} queries, its budget is {stats.budget}"
+            if self.strict:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+
+query_monitor = QueryMonitor(slow_query_ms=float(os.getenv("SLOW_QUERY_MS", 200)),
+                             n_plus_one_threshold=int(os.getenv("N_PLUS_ONE_THRESHOLD", 5)),
+                             strict=os.getenv("SQL_STRICT", "false").lower() == "true")
+
+
+class QueryBudget:
+    """
+    Route dependency declaring how many statements the route may run.
+
+    Attributes:
+        max_queries (int): Statements allowed per request.
+    """
+
+    def __init__(self, max_queries: int):
+        self.max_queries = max_queries
+
+    async def __call__(self):
+        stats = current_stats.get()
+        if stats is not None:
+            stats.budget = self.max_queries
+
+
+class QueryMonitorMiddleware:
+    """
+    ASGI middleware accounting the SQL statements of each request.
+
+    The number of statements and the time spent in the database are sent in
+    a ``Server-Timing`` header. The checks run when the response starts,
+    so statements run while a response streams are not included.
+    """
+
+    def __init__(self, app, monitor: Optional[QueryMonitor] = None):
+        self.app = app
+        self.monitor = monitor or query_monitor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = current_stats.set(stats)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                self.monitor.check(stats, scope["method"], scope["path"])
+                MutableHeaders(scope=message).append("Server-Timing", stats.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_stats.reset(token)
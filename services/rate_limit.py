@@ -0,0 +1,286 @@
+import asyncio
+import math
+import os
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from fastapi import Depends, HTTPException, Request, status
+from redis.exceptions import RedisError
+from starlette.datastructures import MutableHeaders
+
+from database.models import User
+from services.auth import auth_service
+from services.metrics import rate_limit_redis
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Refills each global bucket by the time elapsed on the Redis clock, takes
+# the worker's consumption since its last sync and returns the new levels.
+SYNC_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local ttl = tonumber(ARGV[3])
+local levels = {}
+for i, key in ipairs(KEYS) do
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate) - tonumber(ARGV[3 + i])
+    redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', tostring(now))
+    redis.call('EXPIRE', key, ttl)
+    levels[i] = tostring(tokens)
+end
+return levels
+"""
+
+
+class RateLimitState(NamedTuple):
+    """
+    Outcome of charging a bucket.
+
+    Attributes:
+        allowed (bool): Whether the request fits in the bucket.
+        limit (int): Bucket capacity.
+        remaining (int): Whole tokens left after the request.
+        reset (int): Seconds until the bucket is full again.
+        retry_after (int): Seconds until the request would fit, 0 when allowed.
+        window (int): Seconds the bucket takes to refill from empty.
+    """
+    allowed: bool
+    limit: int
+    remaining: int
+    reset: int
+    retry_after: int
+    window: int
+
+    def headers(self) -> Dict[str, str]:
+        return {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(self.reset),
+            "RateLimit-Policy": f"{self.limit};w={self.window}",
+        }
+
+
+class TokenBucketLimiter:
+    """
+    Token buckets kept in process and synchronized with Redis in batches.
+
+    Requests are charged against the local bucket without any I/O. When Redis
+    is available, a background task sends the consumption of every active
+    bucket to Redis once per sync interval in a single script call, and the
+    local buckets take over the global levels it returns. Each worker can
+    therefore overshoot a budget by at most what it admits during one
+    interval. Without Redis every worker enforces the limit on its own.
+
+    Attributes:
+        capacity (int): Tokens a full bucket holds.
+        seconds (int): Seconds an empty bucket takes to refill.
+        rate (float): Tokens added per second.
+        sync_interval (float): Seconds between two synchronizations with Redis.
+        redis: Redis client set by init(), or None for the local-only mode.
+        stats (dict): Allowed, limited and synchronization counters.
+    """
+
+    def __init__(self, times: int, seconds: int, sync_interval: float, prefix: str = "rate_limit:"):
+        self.capacity = times
+        self.seconds = seconds
+        self.rate = times / seconds
+        self.sync_interval = sync_interval
+        self.prefix = prefix
+        self.redis = None
+        self._buckets = {}
+        self._pending = {}
+        self._task = None
+        self.stats = {"allowed": 0, "limited": 0, "syncs": 0, "sync_errors": 0}
+
+    def init(self, redis=None) -> None:
+        """
+        Start the periodic synchronization task.
+
+        Args:
+            redis (redis.asyncio.Redis, optional): Redis client. Buckets stay local when None.
+        """
+
+        self.redis = redis
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """
+        Stop the synchronization task and send the remaining consumption.
+        """
+
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.sync()
+
+    def reset(self) -> None:
+        """
+        Drop every local bucket and unsynchronized consumption.
+        """
+
+        self._buckets.clear()
+        self._pending.clear()
+
+    def hit(self, key: str, cost: float = 1) -> RateLimitState:
+        """
+        Charge a request to a bucket.
+
+        Args:
+            key (str): Identifies the bucket, e.g. ``user:42``.
+            cost (float): Tokens the request takes.
+
+        Returns:
+            RateLimitState: Whether the request is allowed and the header values.
+        """
+
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        tokens = self.capacity if bucket is None else min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+            if self.redis is not None:
+                self._pending[key] = self._pending.get(key, 0) + cost
+        self._buckets[key] = [tokens, now]
+        self.stats["allowed" if allowed else "limited"] += 1
+        return RateLimitState(
+            allowed=allowed,
+            limit=self.capacity,
+            remaining=max(0, math.floor(tokens)),
+            reset=math.ceil((self.capacity - tokens) / self.rate),
+            retry_after=0 if allowed else math.ceil((cost - tokens) / self.rate),
+            window=self.seconds,
+        )
+
+    async def sync(self) -> None:
+        """
+        Send the consumption since the last sync to Redis and adopt the global levels.
+
+        On a Redis error the consumption is dropped and the buckets stay local
+        until the next successful sync.
+        """
+
+        if self.redis is None or not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        keys: List[str] = list(pending)
+        started = time.perf_counter()
+        try:
+            levels = await self.redis.eval(SYNC_SCRIPT, len(keys), *(self.prefix + key for key in keys),
+                                           self.capacity, self.rate, self.seconds,
+                                           *(pending[key] for key in keys))
+        except RedisError:
+            rate_limit_redis.labels("error").observe(time.perf_counter() - started)
+            self.stats["sync_errors"] += 1
+            return
+        rate_limit_redis.labels("ok").observe(time.perf_counter() - started)
+        self.stats["syncs"] += 1
+        now = time.monotonic()
+        for key, level in zip(keys, levels):
+            # Requests admitted while the script ran are not in the global level yet.
+            self._buckets[key] = [float(level) - self._pending.get(key, 0), now]
+
+    def prune(self) -> None:
+        """
+        Forget local buckets that have refilled completely.
+        """
+
+        now = time.monotonic()
+        full = [key for key, (tokens, updated) in self._buckets.items()
+                if key not in self._pending and tokens + (now - updated) * self.rate >= self.capacity]
+        for key in full:
+            del self._buckets[key]
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            self.prune()
+            await self.sync()
+
+
+rate_limiter = TokenBucketLimiter(times=int(os.getenv("RATE_LIMIT_TIMES", 10)),
+                                  seconds=int(os.getenv("RATE_LIMIT_SECONDS", 60)),
+                                  sync_interval=float(os.getenv("RATE_LIMIT_SYNC_INTERVAL", 1)))
+
+
+class RateLimit:
+    """
+    Route dependency charging the authenticated user's bucket for the route.
+
+    Every route has its own bucket per user, keyed by method and path
+    template, so a burst on one endpoint leaves the others available; cost
+    sets how much of it a request takes, so heavy endpoints allow fewer
+    requests in the window.
+
+    Attributes:
+        cost (float): Tokens charged per request.
+        limiter (TokenBucketLimiter): Buckets to charge.
+    """
+
+    def __init__(self, cost: float = 1, limiter: Optional[TokenBucketLimiter] = None):
+        self.cost = cost
+        self.limiter = limiter or rate_limiter
+
+    async def __call__(self, request: Request, current_user: User = Depends(auth_service.get_current_user)):
+        self.check(request, f"user:{current_user.id}")
+
+    def check(self, request: Request, key: str) -> None:
+        """
+        Charge the request and record the outcome for the response headers.
+
+        Args:
+            request (Request): The incoming request.
+            key (str): Identifies the client; the route is appended to get the bucket.
+
+        Raises:
+            HTTPException: Budget exhausted
+        """
+
+        route = request.scope.get("route")
+        path = route.path if route is not None else request.url.path
+        state = self.limiter.hit(f"{key}:{request.method}:{path}", self.cost)
+        request.state.rate_limit = state
+        if not state.allowed:
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too Many Requests",
+                                headers={"Retry-After": str(state.retry_after)})
+
+
+class ClientRateLimit(RateLimit):
+    """
+    Route dependency charging a bucket per client address, for routes without authentication.
+    """
+
+    async def __call__(self, request: Request):
+        self.check(request, f"ip:{request.client.host if request.client else 'unknown'}")
+
+
+class RateLimitHeadersMiddleware:
+    """
+    ASGI middleware adding ``RateLimit-*`` headers to rate-limited responses.
+
+    Headers are added here rather than in the dependency so they also reach
+    responses returned directly by routes, 304s, streams and 429 errors.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                state = scope.get("state", {}).get("rate_limit")
+                if state is not None:
+                    MutableHeaders(scope=message).update(state.headers())
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
@@ -0,0 +1,78 @@
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+from fastapi import Response
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+
+from schemas import ContactResponse, UserDb
+
+from dotenv import load_dotenv
+load_dotenv()
+
+FAST_JSON = os.getenv("FAST_JSON", "false").lower() == "true"
+
+# Compiled once at import time instead of per request.
+contact_adapter = TypeAdapter(ContactResponse)
+contact_list_adapter = TypeAdapter(List[ContactResponse])
+user_adapter = TypeAdapter(UserDb)
+# Sparse fieldsets: rows holding only the requested columns.
+sparse_adapter = TypeAdapter(Dict[str, Any])
+sparse_list_adapter = TypeAdapter(List[Dict[str, Any]])
+
+default_response_class = ORJSONResponse if FAST_JSON else JSONResponse
+
+
+def dump(adapter: TypeAdapter, value: Any) -> bytes:
+    """
+    Serialize ORM objects straight to a JSON body in one validation pass.
+
+    The bytes are written by pydantic-core; they are cached and sent as
+    they are, without going through Python dicts or json.dumps.
+
+    Args:
+        adapter (TypeAdapter): Adapter of the response schema.
+        value (Any): ORM object or list of ORM objects.
+
+    Returns:
+        bytes: The JSON body.
+    """
+
+    return adapter.dump_json(adapter.validate_python(value, from_attributes=True))
+
+
+def render(payload: Any, response: Optional[Response] = None, adapter: Optional[TypeAdapter] = None,
+           partial: bool = False) -> Any:
+    """
+    Return a route result, pre-rendered when FAST_JSON is on.
+
+    With FAST_JSON off the payload goes through the route's response_model:
+    a JSON body from dump(), fresh or cached, is parsed back and returned
+    with ORM objects unchanged, and FastAPI validates, filters and encodes
+    it with jsonable_encoder. With the flag on, a JSON body is sent as it is
+    in a finished response, which FastAPI passes through untouched, and ORM
+    objects are validated by the adapter and written to bytes by
+    pydantic-core. Sparse fieldsets cannot match the response_model, so
+    ``partial`` bodies are always sent as they are.
+
+    Args:
+        payload (Any): A JSON body, or ORM objects.
+        response (Optional[Response]): The route's injected response, whose headers are kept.
+        adapter (Optional[TypeAdapter]): Adapter of the response schema.
+        partial (bool): The body holds a sparse fieldset.
+
+    Returns:
+        Any: The payload, or a Response.
+    """
+
+    if not FAST_JSON and not partial:
+        return json.loads(payload) if isinstance(payload, bytes) else payload
+    if isinstance(payload, bytes):
+        body = payload
+    elif adapter is not None:
+        body = adapter.dump_json(adapter.validate_python(payload, from_attributes=True))
+    else:
+        return payload
+    headers = dict(response.headers) if response is not None else None
+    return Response(body, headers=headers, media_type="application/json")
@@ -5,8 +5,11 @@ from sqlalchemy.orm import sessionmaker
 
 from main import app
 from database.models import Base, User
-from database.db import get_db
+from database.db import get_db, get_read_db
 from services.auth import auth_service
+from services.cache import user_cache
+from services.query_stats import query_monitor
+from services.rate_limit import rate_limiter
 
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -16,10 +19,16 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Routes exceeding their QueryBudget fail the test instead of logging.
+query_monitor.instrument(engine)
+query_monitor.strict = True
+
 @pytest.fixture(scope="function", autouse=True)
 def session():
     Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
+    user_cache.clear()
+    rate_limiter.reset()
 
     db = TestingSessionLocal()
     try:
@@ -36,6 +45,7 @@ def client(session):
             session.close()
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
 
     yield TestClient(app)
 
@@ -1,4 +1,9 @@
 from unittest.mock import MagicMock
+
+from passlib.context import CryptContext
+
+from database.models import User
+from services.auth import auth_service
 from tests.conftest import login_user_confirmed_true_and_hash_password
 
 
@@ -28,4 +33,111 @@ def test_login_user(user, session, client):
     data = response.json()
     assert 'access_token' in data
     assert 'refresh_token' in data
-    assert data["token_type"] == "bearer"
\ No newline at end of file
+    assert data["token_type"] == "bearer"
+
+def test_login_rehashes_outdated_password_cost(user, session, client):
+    login_user_confirmed_true_and_hash_password(user, session)
+    db_user = session.query(User).filter(User.email == user.email).first()
+    db_user.password = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash(user.password)
+    session.commit()
+
+    response = client.post(
+        "/api/auth/login",
+        data={"username": user.email, "password": user.password},
+    )
+
+    assert response.status_code == 200, response.text
+    session.expire_all()
+    db_user = session.query(User).filter(User.email == user.email).first()
+    assert db_user.password.startswith(f"$2b${auth_service.BCRYPT_ROUNDS:02d}$")
+
+
+def test_login_wrong_password(user, session, client):
+    login_user_confirmed_true_and_hash_password(user, session)
+
+    response = client.post(
+        "/api/auth/login",
+        data={"username": user.email, "password": "wrong-password"},
+    )
+
+    assert response.status_code == 401, response.text
+    assert response.json()["detail"] == "Invalid password"
+
+
+def login(client, user, device="pytest"):
+    response = client.post(
+        "/api/auth/login",
+        data={"username": user.email, "password": user.password},
+        headers={"User-Agent": device},
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_refresh_token_rotates(user, session, client):
+    login_user_confirmed_true_and_hash_password(user, session)
+    tokens = login(client, user)
+
+    response = client.get("/api/auth/refresh_token",
+                          headers={"Authorization": f"Bearer {tokens['refresh_token']}"})
+
+    assert response.status_code == 200, response.text
+    assert response.json()["refresh_token"] != tokens["refresh_token"]
+    session.expire_all()
+    assert session.query(User).filter(User.email == user.email).first().refresh_token is None
+
+
+def test_refresh_token_reuse_revokes_family(user, session, client):
+    login_user_confirmed_true_and_hash_password(user, session)
+    stolen = login(client, user)["refresh_token"]
+    rotated = client.get("/api/auth/refresh_token", headers={"Authorization": f"Bearer {stolen}"}).json()
+
+    response = client.get("/api/auth/refresh_token", headers={"Authorization": f"Bearer {stolen}"})
+    assert response.status_code == 401, response.text
+    assert response.json()["detail"] == "Invalid refresh token"
+
+    response = client.get("/api/auth/refresh_token",
+                          headers={"Authorization": f"Bearer {rotated['refresh_token']}"})
+    assert response.status_code == 401, response.text
+
+
+def test_sessions_per_device(user, session, client):
+    login_user_confirmed_true_and_hash_password(user, session)
+    phone = login(client, user, "phone")
+    laptop = login(client, user, "laptop")
+
+    response = client.get("/api/auth/sessions", headers={"Authorization": f"Bearer {laptop['access_token']}"})
+    assert response.status_code == 200, response.text
+    sessions = response.json()
+    assert sorted(item["device"] for item in sessions) == ["laptop", "phone"]
+
+    family_id = next(item["family_id"] for item in sessions if item["device"] == "phone")
+    response = client.delete(f"/api/auth/sessions/{family_id}",
+                             headers={"Authorization": f"Bearer {laptop['access_token']}"})
+    assert response.status_code == 200, response.text
+
+    response = client.get("/api/auth/refresh_token", headers={"Authorization": f"Bearer {phone['refresh_token']}"})
+    assert response.status_code == 401, response.text
+    response = client.get("/api/auth/refresh_token", headers={"Authorization": f"Bearer {laptop['refresh_token']}"})
+    assert response.status_code == 200, response.text
+
+
+def test_revoke_unknown_session(user, session, client):
+    login_user_confirmed_true_and_hash_password(user, session)
+    tokens = login(client, user)
+
+    response = client.delete("/api/auth/sessions/unknown",
+                             headers={"Authorization": f"Bearer {tokens['access_token']}"})
+
+    assert response.status_code == 404, response.text
+
+
+def test_logout(user, session, client):
+    login_user_confirmed_true_and_hash_password(user, session)
+    tokens = login(client, user)
+
+    response = client.post("/api/auth/logout", headers={"Authorization": f"Bearer {tokens['refresh_token']}"})
+    assert response.status_code == 200, response.text
+
+    response = client.get("/api/auth/refresh_token", headers={"Authorization": f"Bearer {tokens['refresh_token']}"})
+    assert response.status_code == 401, response.text
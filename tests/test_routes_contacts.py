@@ -0,0 +1,357 @@
+import asyncio
+from datetime import date
+from unittest.mock import patch
+
+import fastapi.routing
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from main import app
+from database.db import ReplicaRouter, get_db, get_read_db
+from database.models import Base, Contact
+from repository import contacts as repository_contacts
+from routes import contacts as contacts_routes
+from services.auth import auth_service
+from services.cache import contact_cache
+from services.rate_limit import rate_limiter
+from tests.conftest import TestingSessionLocal, login_user_confirmed_true_and_hash_password
+from tests.test_unit_services_cache import FakeRedis
+
+
+CONTACT = {
+    "first_name": "Name",
+    "last_name": "Lastname",
+    "email": "xyz@example.com",
+    "phone_number": "123 456 789",
+    "birth_date": "1990-05-17",
+    "extra_data": "Extra data",
+}
+
+
+@pytest.fixture(scope="function")
+def headers(user, session, client):
+    login_user_confirmed_true_and_hash_password(user, session)
+    app.dependency_overrides[contacts_routes.rate_limit] = lambda: None
+    token = asyncio.run(auth_service.create_access_token(data={"sub": user.email}))
+    yield {"Authorization": f"Bearer {token}"}
+    app.dependency_overrides.pop(contacts_routes.rate_limit, None)
+
+
+def create_contacts(client, headers, count):
+    for i in range(count):
+        response = client.post("/api/contacts/", json={**CONTACT, "email": f"contact{i}@example.com"}, headers=headers)
+        assert response.status_code == 200, response.text
+
+
+def test_get_contacts_cursor_pages(client, headers):
+    create_contacts(client, headers, 3)
+
+    first = client.get("/api/contacts/", params={"limit": 2}, headers=headers)
+    second = client.get("/api/contacts/", params={"limit": 2, "after": first.headers["X-Next-Cursor"]},
+                        headers=headers)
+
+    assert [c["email"] for c in first.json()] == ["contact0@example.com", "contact1@example.com"]
+    assert [c["email"] for c in second.json()] == ["contact2@example.com"]
+    assert "X-Next-Cursor" not in second.headers
+
+
+@pytest.mark.parametrize("fast_json", [False, True])
+def test_get_contacts_fast_json(client, headers, fast_json):
+    create_contacts(client, headers, 3)
+
+    with patch("services.serialization.FAST_JSON", fast_json), \
+            patch("fastapi.routing.serialize_response", wraps=fastapi.routing.serialize_response) as serialize:
+        page = client.get("/api/contacts/", params={"limit": 2}, headers=headers)
+        contact = client.get(f"/api/contacts/{page.json()[0]['id']}", headers=headers)
+        sparse = client.get("/api/contacts/", params={"fields": "email"}, headers=headers)
+
+    assert [c["email"] for c in page.json()] == ["contact0@example.com", "contact1@example.com"]
+    assert "X-Next-Cursor" in page.headers and "ETag" in page.headers
+    assert contact.json()["email"] == "contact0@example.com"
+    assert [list(c) for c in sparse.json()] == [["id", "email"]] * 3
+    # Only the default path is validated and filtered by the response_model.
+    assert serialize.call_count == (0 if fast_json else 2)
+
+
+def test_get_contacts_invalid_cursor(client, headers):
+    response = client.get("/api/contacts/", params={"after": "not-a-cursor"}, headers=headers)
+
+    assert response.status_code == 400, response.text
+
+
+def test_get_contacts_sparse_fields(client, headers):
+    create_contacts(client, headers, 3)
+
+    page = client.get("/api/contacts/", params={"limit": 2, "fields": "first_name,phone_number"}, headers=headers)
+    contact = client.get(f"/api/contacts/{page.json()[0]['id']}", params={"fields": "birth_date"}, headers=headers)
+
+    assert page.status_code == 200, page.text
+    assert [list(c) for c in page.json()] == [["id", "first_name", "phone_number"]] * 2
+    assert "X-Next-Cursor" in page.headers
+    assert contact.json() == {"id": page.json()[0]["id"], "birth_date": "1990-05-17"}
+
+
+def test_get_contacts_unknown_field(client, headers):
+    response = client.get("/api/contacts/", params={"fields": "first_name,password"}, headers=headers)
+
+    assert response.status_code == 400, response.text
+    assert response.json()["detail"] == "Unknown fields: password."
+
+
+def test_batch_get_contacts(client, headers):
+    create_contacts(client, headers, 3)
+    ids = [c["id"] for c in client.get("/api/contacts/", headers=headers).json()]
+
+    response = client.post("/api/contacts/batch-get", json={"ids": [ids[2], 999, ids[0], ids[2]]}, headers=headers)
+    sparse = client.post("/api/contacts/batch-get", params={"fields": "email"}, json={"ids": [ids[1]]},
+                         headers=headers)
+
+    assert response.status_code == 200, response.text
+    assert [c["id"] for c in response.json()["contacts"]] == [ids[2], ids[0]]
+    assert response.json()["contacts"][0]["email"] == "contact2@example.com"
+    assert response.json()["missing"] == [999]
+    assert response.headers["Server-Timing"].endswith('desc="1 query"')
+    assert sparse.json() == {"contacts": [{"id": ids[1], "email": "contact1@example.com"}], "missing": []}
+
+
+def test_batch_get_contacts_limits(client, headers):
+    empty = client.post("/api/contacts/batch-get", json={"ids": []}, headers=headers)
+    too_many = client.post("/api/contacts/batch-get", json={"ids": list(range(101))}, headers=headers)
+
+    assert empty.status_code == 422
+    assert too_many.status_code == 422
+
+
+def contact_ids(client, headers):
+    return [c["id"] for c in client.get("/api/contacts/", headers=headers).json()]
+
+
+def test_batch_atomic(client, headers):
+    create_contacts(client, headers, 3)
+    ids = contact_ids(client, headers)
+    operations = [
+        {"op": "delete", "id": ids[0]},
+        {"op": "create", "data": {**CONTACT, "email": "contact0@example.com"}},
+        {"op": "update", "id": ids[1], "data": {**CONTACT, "email": "updated@example.com"}},
+        {"op": "update", "id": ids[1], "data": {**CONTACT, "first_name": "Again", "email": "updated@example.com"}},
+        {"op": "create", "data": {**CONTACT, "email": "contact1@example.com"}},
+    ]
+
+    response = client.post("/api/contacts/batch", json={"operations": operations}, headers=headers)
+
+    assert response.status_code == 200, response.text
+    report = response.json()
+    assert report["committed"] is True
+    assert [(r["op"], r["status"]) for r in report["results"]] == [
+        ("delete", 200), ("create", 201), ("update", 200), ("update", 200), ("create", 201)]
+    contacts = {c["id"]: c for c in client.get("/api/contacts/", headers=headers).json()}
+    assert ids[0] not in contacts
+    assert contacts[ids[1]]["first_name"] == "Again"
+    assert contacts[report["results"][1]["id"]]["email"] == "contact0@example.com"
+    assert contacts[report["results"][4]["id"]]["email"] == "contact1@example.com"
+    # Lookup, then one statement per kind of operation plus the read-back of the new IDs.
+    assert response.headers["Server-Timing"].endswith('desc="5 queries"')
+
+
+def test_batch_atomic_rolled_back(client, headers):
+    create_contacts(client, headers, 2)
+    ids = contact_ids(client, headers)
+    operations = [
+        {"op": "delete", "id": ids[0]},
+        {"op": "update", "id": ids[0], "data": CONTACT},
+        {"op": "create", "data": {**CONTACT, "email": "contact1@example.com"}},
+    ]
+
+    report = client.post("/api/contacts/batch", json={"operations": operations}, headers=headers).json()
+
+    assert report["committed"] is False
+    assert [r["status"] for r in report["results"]] == [424, 404, 409]
+    assert contact_ids(client, headers) == ids
+
+
+def test_batch_best_effort(client, headers):
+    create_contacts(client, headers, 1)
+    operations = [
+        {"op": "create", "data": {**CONTACT, "email": "contact0@example.com"}},
+        {"op": "create", "data": {**CONTACT, "email": "new@example.com"}},
+        {"op": "delete", "id": 999},
+    ]
+
+    report = client.post("/api/contacts/batch", json={"operations": operations, "mode": "best_effort"},
+                         headers=headers).json()
+
+    assert report["committed"] is True
+    assert [r["status"] for r in report["results"]] == [409, 201, 404]
+    assert len(contact_ids(client, headers)) == 2
+
+
+@pytest.mark.parametrize("mode, statuses, count", [("atomic", [424, 409], 1), ("best_effort", [201, 409], 2)])
+def test_batch_replayed_on_conflict(client, headers, mode, statuses, count):
+    create_contacts(client, headers, 1)
+    operations = [
+        {"op": "create", "data": {**CONTACT, "email": "new@example.com"}},
+        {"op": "create", "data": {**CONTACT, "email": "contact0@example.com"}},
+    ]
+    init = repository_contacts._BatchPlan.__init__
+
+    # Hide the existing contact from the plan, as if it had been created concurrently.
+    with patch.object(repository_contacts._BatchPlan, "__init__", lambda plan, rows: init(plan, [])):
+        report = client.post("/api/contacts/batch", json={"operations": operations, "mode": mode},
+                             headers=headers).json()
+
+    assert [r["status"] for r in report["results"]] == statuses
+    assert len(contact_ids(client, headers)) == count
+
+
+@pytest.mark.parametrize("mode, statuses, count", [("atomic", [424, 404, 424], 1), ("best_effort", [201, 404, 409], 2)])
+def test_batch_replay_reports_concurrent_delete(client, headers, mode, statuses, count):
+    create_contacts(client, headers, 1)
+    operations = [
+        {"op": "create", "data": {**CONTACT, "email": "new@example.com"}},
+        {"op": "delete", "id": 999},
+        {"op": "create", "data": {**CONTACT, "email": "contact0@example.com"}},
+    ]
+    init = repository_contacts._BatchPlan.__init__
+
+    # Show the plan a contact deleted since, and hide one created since.
+    with patch.object(repository_contacts._BatchPlan, "__init__",
+                      lambda plan, rows: init(plan, [(999, "deleted@example.com")])):
+        report = client.post("/api/contacts/batch", json={"operations": operations, "mode": mode},
+                             headers=headers).json()
+
+    assert report["committed"] is (mode == "best_effort")
+    assert [r["status"] for r in report["results"]] == statuses
+    assert len(contact_ids(client, headers)) == count
+
+
+def test_patch_contact(client, headers):
+    create_contacts(client, headers, 2)
+    ids = contact_ids(client, headers)
+
+    patched = client.patch(f"/api/contacts/{ids[0]}", json={"phone_number": "000", "extra_data": None},
+                           headers=headers)
+    conflict = client.patch(f"/api/contacts/{ids[0]}", json={"email": "contact1@example.com"}, headers=headers)
+    null = client.patch(f"/api/contacts/{ids[0]}", json={"first_name": None}, headers=headers)
+    missing = client.patch("/api/contacts/999", json={"phone_number": "000"}, headers=headers)
+
+    assert patched.status_code == 200, patched.text
+    assert patched.json() == {**CONTACT, "id": ids[0], "email": "contact0@example.com", "phone_number": "000",
+                              "extra_data": None}
+    assert conflict.status_code == 409
+    assert null.status_code == 422
+    assert missing.status_code == 404
+
+
+def test_patch_contact_birth_date(client, headers):
+    create_contacts(client, headers, 1)
+    contact_id = contact_ids(client, headers)[0]
+
+    # 2000 is a leap year, so any day of today's year exists in it.
+    birth_date = date.today().replace(year=2000).isoformat()
+    response = client.patch(f"/api/contacts/{contact_id}", json={"birth_date": birth_date}, headers=headers)
+    birthdays = client.get("/api/contacts/birthday/", params={"days": 0}, headers=headers).json()
+
+    assert response.status_code == 200, response.text
+    assert [c["id"] for c in birthdays] == [contact_id]
+
+
+def test_get_contact_etag_not_modified(client, headers):
+    create_contacts(client, headers, 1)
+    contact_id = client.get("/api/contacts/", headers=headers).json()[0]["id"]
+
+    response = client.get(f"/api/contacts/{contact_id}", headers=headers)
+    etag = response.headers["ETag"]
+    not_modified = client.get(f"/api/contacts/{contact_id}", headers={**headers, "If-None-Match": etag})
+    client.put(f"/api/contacts/{contact_id}", json={**CONTACT, "email": "new@example.com"}, headers=headers)
+    modified = client.get(f"/api/contacts/{contact_id}", headers={**headers, "If-None-Match": etag})
+
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert modified.status_code == 200
+    assert modified.json()["email"] == "new@example.com"
+
+
+@pytest.fixture(scope="function")
+def lagging_replica(client, tmp_path):
+    # The overridden get_db never marks writes, as if they were made on another worker.
+    replica_engine = create_engine(f"sqlite:///{tmp_path / 'replica.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=replica_engine)
+    router = ReplicaRouter(TestingSessionLocal, [sessionmaker(bind=replica_engine)])
+    app.dependency_overrides.pop(get_read_db)
+    with patch("database.db.replica_router", router), patch.object(contact_cache, "redis", FakeRedis()):
+        yield router, replica_engine
+    replica_engine.dispose()
+
+
+def test_stale_replica_read_not_cached(client, headers, lagging_replica):
+    router, replica_engine = lagging_replica
+    contact = client.post("/api/contacts/", json={**CONTACT, "email": "contact0@example.com"}, headers=headers).json()
+    with replica_engine.begin() as connection:
+        connection.execute(insert(Contact), {**contact, "birth_date": date(1990, 5, 17), "user_id": 1})
+    client.put(f"/api/contacts/{contact['id']}", json={**CONTACT, "email": "new@example.com"}, headers=headers)
+
+    stale = client.get(f"/api/contacts/{contact['id']}", headers=headers)
+    router.mark_down(0)
+    fresh = client.get(f"/api/contacts/{contact['id']}", headers={**headers, "If-None-Match": stale.headers["ETag"]})
+
+    assert stale.json()["email"] == "contact0@example.com"
+    assert fresh.status_code == 200
+    assert fresh.json()["email"] == "new@example.com"
+    assert fresh.headers["ETag"] != stale.headers["ETag"]
+
+
+def test_batch_get_leaves_user_unpinned(client, headers, lagging_replica):
+    router, _ = lagging_replica
+    app.dependency_overrides.pop(get_db)
+
+    with patch("database.db.SessionLocal", TestingSessionLocal):
+        batch_get = client.post("/api/contacts/batch-get", json={"ids": [1]}, headers=headers)
+        sticky_after_read = dict(router._sticky_until)
+        client.post("/api/contacts/", json=CONTACT, headers=headers)
+
+    assert batch_get.status_code == 200, batch_get.text
+    assert sticky_after_read == {}
+    assert list(router._sticky_until) == [1]
+
+
+def test_get_contact_server_timing(client, headers):
+    create_contacts(client, headers, 1)
+    contact_id = client.get("/api/contacts/", headers=headers).json()[0]["id"]
+
+    response = client.get(f"/api/contacts/{contact_id}", headers=headers)
+
+    assert response.status_code == 200, response.text
+    assert response.headers["Server-Timing"].endswith('desc="1 query"')
+
+def test_rate_limit_headers_and_429(client, user, session):
+    login_user_confirmed_true_and_hash_password(user, session)
+    token = asyncio.run(auth_service.create_access_token(data={"sub": user.email}))
+    auth = {"Authorization": f"Bearer {token}"}
+
+    with patch.object(rate_limiter, "capacity", 2):
+        first = client.get("/api/contacts/", headers=auth)
+        client.get("/api/contacts/", headers=auth)
+        limited = client.get("/api/contacts/", headers=auth)
+
+    assert first.status_code == 200
+    assert first.headers["RateLimit-Limit"] == "2"
+    assert first.headers["RateLimit-Remaining"] == "1"
+    assert limited.status_code == 429
+    assert limited.headers["RateLimit-Remaining"] == "0"
+    assert int(limited.headers["Retry-After"]) > 0
+
+
+def test_rate_limit_per_route(client, user, session):
+    login_user_confirmed_true_and_hash_password(user, session)
+    token = asyncio.run(auth_service.create_access_token(data={"sub": user.email}))
+    auth = {"Authorization": f"Bearer {token}"}
+
+    with patch.object(rate_limiter, "capacity", 1):
+        listed = client.get("/api/contacts/", headers=auth)
+        limited = client.get("/api/contacts/", headers=auth)
+        birthdays = client.get("/api/contacts/birthday/", headers=auth)
+
+    assert listed.status_code == 200
+    assert limited.status_code == 429
+    assert birthdays.status_code == 200
@@ -0,0 +1,53 @@
+import asyncio
+import tempfile
+from unittest.mock import patch
+
+import pytest
+
+from services.auth import auth_service
+from services.avatars import AvatarService, LocalAvatarStorage
+from tests.conftest import login_user_confirmed_true_and_hash_password
+from tests.test_unit_services_avatars import make_image
+
+
+@pytest.fixture(scope="function")
+def headers(user, session):
+    login_user_confirmed_true_and_hash_password(user, session)
+    token = asyncio.run(auth_service.create_access_token(data={"sub": user.email}))
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture(scope="function")
+def local_avatars():
+    service = AvatarService(LocalAvatarStorage(tempfile.mkdtemp(), "/api/users/avatars/"), workers=1)
+    with patch("routes.users.avatar_service", service):
+        yield service
+
+
+def test_upload_and_serve_avatar(client, headers, local_avatars):
+    response = client.patch("/api/users/avatar", files={"file": ("me.jpg", make_image(), "image/jpeg")},
+                            headers=headers)
+    assert response.status_code == 200, response.text
+    avatar = response.json()["avatar"]
+    assert avatar.startswith("/api/users/avatars/")
+
+    me = client.get("/api/users/me/", headers=headers)
+    image = client.get(avatar)
+
+    assert me.json()["avatar"] == avatar
+    assert image.status_code == 200
+    assert image.headers["content-type"] == "image/png"
+    assert image.headers["cache-control"] == "public, max-age=31536000, immutable"
+
+
+def test_upload_rejects_non_image(client, headers, local_avatars):
+    response = client.patch("/api/users/avatar", files={"file": ("me.txt", b"hello", "text/plain")},
+                            headers=headers)
+
+    assert response.status_code == 400, response.text
+
+
+def test_unknown_avatar_not_found(client, local_avatars):
+    response = client.get(f"/api/users/avatars/{'0' * 64}.png")
+
+    assert response.status_code == 404
@@ -0,0 +1,145 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from fastapi import Depends, FastAPI, Header, Request
+from fastapi.testclient import TestClient
+from sqlalchemy import column, table, text
+
+from database import db as database
+from database.db import ReplicaRouter, create_session_factory, get_db, get_read_db, served_by_replica
+
+
+def make_database(path: str, name: str):
+    session_factory = create_session_factory(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    with session_factory() as session:
+        session.execute(text("CREATE TABLE source (name TEXT)"))
+        session.execute(text("INSERT INTO source VALUES (:name)"), {"name": name})
+        session.commit()
+    return session_factory
+
+
+class TestReplicaRouter(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.primary = make_database(os.path.join(directory.name, "primary.db"), "primary")
+        self.replicas = [make_database(os.path.join(directory.name, f"replica{i}.db"), f"replica{i}")
+                         for i in range(2)]
+        self.router = ReplicaRouter(self.primary, self.replicas, sticky_seconds=5, retry_seconds=30)
+        self.clock = patch("database.db.time.monotonic", return_value=1000.0)
+        self.now = self.clock.start()
+        self.addCleanup(self.clock.stop)
+
+    def tearDown(self) -> None:
+        for session_factory in [self.primary, *self.replicas]:
+            session_factory.kw["bind"].dispose()
+
+    def test_without_replicas_reads_go_to_primary(self):
+        router = ReplicaRouter(self.primary, [])
+        router.mark_write("token")
+
+        self.assertEqual(router.reader("token"), (None, self.primary))
+
+    def test_reads_round_robin_over_replicas(self):
+        self.assertEqual([self.router.reader("token")[0] for _ in range(3)], [0, 1, 0])
+
+    def test_client_reads_its_writes_from_primary(self):
+        self.router.mark_write("writer")
+
+        self.assertEqual(self.router.reader("writer"), (None, self.primary))
+        self.assertIsNotNone(self.router.reader("other")[0])
+        self.now.return_value = 1006.0
+        self.assertIsNotNone(self.router.reader("writer")[0])
+
+    def test_failed_replica_left_out_until_retry(self):
+        self.router.mark_down(0)
+        self.assertEqual([self.router.reader()[0] for _ in range(2)], [1, 1])
+
+        self.router.mark_down(1)
+        self.assertEqual(self.router.reader(), (None, self.primary))
+        self.assertEqual(self.router.stats["fallback"], 1)
+
+        self.now.return_value = 1031.0
+        self.assertIsNotNone(self.router.reader()[0])
+
+    async def test_health_check(self):
+        unreachable = create_session_factory("sqlite:////nonexistent/replica.db")
+        router = ReplicaRouter(self.primary, [unreachable, self.replicas[0]])
+
+        with self.assertLogs("database.db", "WARNING") as logs:
+            await router.check()
+
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("Replica 0 is unavailable", logs.output[0])
+        self.assertEqual([router.reader()[0] for _ in range(2)], [1, 1])
+
+
+class TestReadSessions(unittest.TestCase):
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        primary = make_database(os.path.join(directory.name, "primary.db"), "primary")
+        replica = make_database(os.path.join(directory.name, "replica.db"), "replica")
+        router = ReplicaRouter(primary, [replica])
+        for name, value in (("SessionLocal", primary), ("replica_router", router)):
+            patcher = patch.object(database, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(primary.kw["bind"].dispose)
+        self.addCleanup(replica.kw["bind"].dispose)
+
+        app = FastAPI()
+
+        # Stands in for get_current_user: one user may hold several tokens.
+        def current_user(request: Request, authorization: str = Header()):
+            request.state.user_id = authorization.split("-")[0]
+
+        # The session is requested before the user is known, as in the routes.
+        @app.get("/source")
+        def read(db=Depends(get_read_db), user=Depends(current_user)):
+            return {"name": db.execute(text("SELECT name FROM source")).scalar(), "replica": served_by_replica(db)}
+
+        @app.post("/source")
+        def write(db=Depends(get_db), user=Depends(current_user)):
+            db.execute(table("source", column("name")).insert().values(name="written"))
+            db.commit()
+            return db.execute(text("SELECT name FROM source")).scalar()
+
+        # Reads on the primary through a POST, like /api/contacts/batch-get.
+        @app.post("/source/read")
+        def read_by_post(db=Depends(get_db), user=Depends(current_user)):
+            value = db.execute(text("SELECT name FROM source")).scalar()
+            db.commit()
+            return value
+
+        self.client = TestClient(app)
+
+    def read(self, token: str) -> str:
+        return self.client.get("/source", headers={"Authorization": token}).json()["name"]
+
+    def test_reads_after_own_write_go_to_primary(self):
+        self.assertEqual(self.read("writer-laptop"), "replica")
+        self.assertEqual(self.client.post("/source", headers={"Authorization": "writer-laptop"}).json(), "primary")
+        self.assertEqual(self.read("writer-laptop"), "primary")
+        self.assertEqual(self.read("writer-phone"), "primary")
+        self.assertEqual(self.read("reader-laptop"), "replica")
+
+    def test_read_only_post_does_not_pin_user(self):
+        self.assertEqual(self.client.post("/source/read", headers={"Authorization": "reader"}).json(), "primary")
+        self.assertEqual(self.read("reader"), "replica")
+
+    def test_served_by_replica(self):
+        response = self.client.get("/source", headers={"Authorization": "reader"}).json()
+
+        self.assertEqual(response, {"name": "replica", "replica": True})
+
+
+if __name__ == '__main__':
+    unittest.main()
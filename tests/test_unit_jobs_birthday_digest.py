@@ -0,0 +1,127 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import tempfile
+import unittest
+from datetime import date
+from unittest.mock import AsyncMock, patch
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from database.models import Base, Contact, User
+from jobs import birthday_digest
+from jobs.birthday_digest import DigestState, days_until, run, run_digest
+from repository import users as repository_users
+from services.email import MailDispatcher, conf
+
+
+class FixedDate(date):
+    @classmethod
+    def today(cls):
+        return cls(2024, 12, 30)
+
+
+class TestBirthdayDigest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=self.engine)
+        self.db = sessionmaker(bind=self.engine)()
+        self.today = date(2024, 12, 30)
+        for i in range(1, 6):
+            self.db.add(User(id=i, username=f"user{i}", email=f"user{i}@example.com", password="x",
+                             confirmed=i != 5))
+        births = {1: [date(1990, 12, 31), date(1985, 1, 2)], 2: [date(1990, 6, 1)], 3: [date(2000, 12, 30)],
+                  4: [], 5: [date(1990, 12, 31)]}
+        for user_id, dates in births.items():
+            for j, birth_date in enumerate(dates):
+                self.db.add(Contact(first_name=f"Name{user_id}{j}", last_name="Lastname",
+                                    email=f"contact{user_id}{j}@example.com", phone_number="123",
+                                    birth_date=birth_date, user_id=user_id))
+        self.db.commit()
+        self.state_file = os.path.join(tempfile.mkdtemp(), "state.json")
+        self.queries = []
+        event.listen(self.engine, "before_cursor_execute", lambda *args: self.queries.append(args[2]))
+
+    def tearDown(self) -> None:
+        self.db.close()
+
+    async def test_one_digest_per_user_with_two_queries_per_chunk(self):
+        send = AsyncMock()
+        state = DigestState(self.state_file, self.today)
+
+        report = await run_digest(self.db, state, days=7, chunk_size=2, send=send)
+
+        sent = {call.args[0]: call.args[2] for call in send.await_args_list}
+        self.assertEqual(sorted(sent), ["user1@example.com", "user3@example.com"])
+        self.assertEqual([b["in_days"] for b in sent["user1@example.com"]], [1, 3])
+        self.assertEqual(sent["user3@example.com"][0]["in_days"], 0)
+        self.assertEqual((report["users"], report["emails"], report["chunks"]), (4, 2, 2))
+        # Two queries per chunk, plus the read that finds no users after a full last chunk.
+        self.assertEqual(len(self.queries), 5)
+        self.assertTrue(DigestState.load(self.state_file, self.today).done)
+
+    async def test_resumes_after_last_finished_chunk(self):
+        state = DigestState(self.state_file, self.today)
+        state.last_user_id, state.users, state.emails = 2, 2, 1
+        state.save()
+        send = AsyncMock()
+
+        await run_digest(self.db, DigestState.load(self.state_file, self.today), days=7, chunk_size=2, send=send)
+
+        self.assertEqual([call.args[0] for call in send.await_args_list], ["user3@example.com"])
+        saved = DigestState.load(self.state_file, self.today)
+        self.assertEqual((saved.users, saved.emails, saved.done), (4, 2, True))
+
+    async def test_finished_run_sends_nothing_and_new_day_starts_over(self):
+        send = AsyncMock()
+        await run_digest(self.db, DigestState(self.state_file, self.today), send=send)
+        await run_digest(self.db, DigestState.load(self.state_file, self.today), send=send)
+        self.assertEqual(send.await_count, 2)
+
+        self.assertEqual(DigestState.load(self.state_file, date(2024, 12, 31)).last_user_id, 0)
+
+    async def test_run_resumes_from_checkpoint(self):
+        dispatcher = MailDispatcher(conf)
+        dispatcher._deliver = AsyncMock(return_value=None)
+        args = argparse.Namespace(days=7, chunk_size=2, state_file=self.state_file)
+        get_confirmed_users = repository_users.get_confirmed_users
+        calls = 0
+
+        async def crash_on_second_chunk(*args):
+            nonlocal calls
+            calls += 1
+            if calls == 2:
+                raise ConnectionError("database went away")
+            return await get_confirmed_users(*args)
+
+        with patch.object(birthday_digest, "date", FixedDate), \
+                patch.object(birthday_digest, "SessionLocal", sessionmaker(bind=self.engine)), \
+                patch.object(birthday_digest, "mail_dispatcher", dispatcher), \
+                patch("services.email.mail_dispatcher", dispatcher):
+            with patch.object(repository_users, "get_confirmed_users", crash_on_second_chunk), \
+                    self.assertRaises(ConnectionError):
+                await run(args)
+            saved = DigestState.load(self.state_file, self.today)
+            self.assertEqual((saved.last_user_id, saved.users, saved.emails, saved.done), (2, 2, 1, False))
+
+            with self.assertLogs("jobs.birthday_digest", "INFO"):
+                report = await run(args)
+            await run(args)
+
+        self.assertEqual((report["users"], report["emails"]), (2, 1))
+        self.assertEqual([call.args[1]["To"] for call in dispatcher._deliver.await_args_list],
+                         ["user1@example.com", "user3@example.com"])
+        self.assertTrue(DigestState.load(self.state_file, self.today).done)
+
+    def test_days_until(self):
+        self.assertEqual(days_until(date(1990, 1, 2), date(2024, 12, 30)), 3)
+        self.assertEqual(days_until(date(1992, 2, 29), date(2025, 2, 27)), 1)
+        self.assertEqual(days_until(date(1992, 2, 29), date(2024, 2, 28)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
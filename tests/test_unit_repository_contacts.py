@@ -6,6 +6,7 @@ import unittest
 from datetime import date, timedelta
 from unittest.mock import MagicMock
 
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.orm import Session
 
 from database.models import Contact, User
@@ -13,10 +14,14 @@ from database.models import Contact, User
 from repository.contacts import (
     get_contacts,
     get_contact,
+    get_contacts_by_ids,
     create_contact,
     update_contact,
     delete_contact,
+    patch_contact,
     get_upcoming_birthdays,
+    encode_cursor,
+    decode_cursor,
 )
 
 
@@ -49,41 +54,87 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
 
     async def test_get_contacts(self):
         contacts = [Contact(), Contact(), Contact()]
-        self.session.query().filter().offset().limit().all.return_value = contacts
+        self.session.execute().scalars().all.return_value = contacts
         result = await get_contacts(skip=0, limit=10, user=self.user, db=self.session)
 
         self.assertEqual(result, contacts)
 
+    async def test_get_contacts_after_cursor(self):
+        contacts = [Contact(id=11), Contact(id=12)]
+        self.session.execute().scalars().all.return_value = contacts
+        result = await get_contacts(skip=0, limit=2, user=self.user, db=self.session, after=10)
+
+        self.assertEqual(result, contacts)
+
+    async def test_get_contacts_fields(self):
+        rows = [{"id": 1, "first_name": "Name"}]
+        self.session.execute().mappings.return_value = rows
+        result = await get_contacts(skip=0, limit=10, user=self.user, db=self.session, fields=("id", "first_name"))
+
+        self.assertEqual(result, rows)
+        statement = self.session.execute.call_args.args[0]
+        self.assertEqual([column.name for column in statement.selected_columns], ["id", "first_name"])
+
+    def test_cursor_round_trip(self):
+        self.assertEqual(decode_cursor(encode_cursor(42)), 42)
+
+    def test_decode_invalid_cursor(self):
+        for cursor in ("not-a-cursor", encode_cursor("42"), ""):
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
     async def test_get_contact_found(self):
         contact = Contact()
-        self.session.query().filter().first.return_value = contact
+        self.session.execute().scalars().first.return_value = contact
         result = await get_contact(contact_id=1, user=self.user, db=self.session)
 
         self.assertEqual(result, contact)
 
     async def test_get_contact_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.session.execute().scalars().first.return_value = None
         result = await get_contact(contact_id=1, user=self.user, db=self.session)
 
         self.assertIsNone(result)
 
+    async def test_get_contacts_by_ids_in_requested_order(self):
+        contacts = [Contact(id=1), Contact(id=2), Contact(id=3)]
+        self.session.execute().scalars().all.return_value = contacts
+        result = await get_contacts_by_ids([3, 4, 1, 3], user=self.user, db=self.session)
+
+        self.assertEqual(result, [contacts[2], contacts[0]])
+
     async def test_remove_contact_found(self):
         contact = Contact()
-        self.session.query().filter().first.return_value = contact
+        self.session.execute().first.return_value = contact
         result = await delete_contact(contact_id=1, user=self.user, db=self.session)
 
         self.assertEqual(result, contact)
+        statement = self.session.execute.call_args.args[0]
+        self.assertIn("RETURNING", str(statement.compile(dialect=postgresql.dialect())))
 
     async def test_remove_contact_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.session.execute().first.return_value = None
         result = await delete_contact(contact_id=1, user=self.user, db=self.session)
 
         self.assertIsNone(result)
 
+    async def test_patch_contact_single_statement(self):
+        contact = Contact(id=1)
+        self.session.execute().first.return_value = contact
+        self.session.execute.reset_mock()
+        result = await patch_contact(contact_id=1, fields={"birth_date": date(1990, 2, 1)}, user=self.user,
+                                     db=self.session)
+
+        self.assertEqual(result, contact)
+        self.session.execute.assert_called_once()
+        sql = str(self.session.execute.call_args.args[0].compile(dialect=postgresql.dialect()))
+        self.assertRegex(sql, r"^UPDATE contacts SET birth_date=\S+, birth_month_day=\S+ WHERE")
+        self.assertIn("RETURNING", sql)
+
     async def test_update_contact_found(self):
         body = self.body
         contact = Contact()
-        self.session.query().filter().first.return_value = contact
+        self.session.execute().scalars().first.return_value = contact
         self.session.commit.return_value = None
         result = await update_contact(contact_id=1, body=body, user=self.user, db=self.session)
 
@@ -91,7 +142,7 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
 
     async def test_update_contact_not_found(self):
         body = self.body
-        self.session.query().filter().first.return_value = None
+        self.session.execute().scalars().first.return_value = None
         self.session.commit.return_value = None
         result = await update_contact(contact_id=1, body=body, user=self.user, db=self.session)
 
@@ -99,7 +150,7 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
 
     async def test_get_upcoming_birthdays(self):
         future_birthday = self.body
-        self.session.query().filter().all.return_value = [future_birthday]
+        self.session.execute().scalars().all.return_value = [future_birthday]
         result = await get_upcoming_birthdays(user=self.user, db=self.session)
 
         self.assertEqual(result[0].id, future_birthday.id)
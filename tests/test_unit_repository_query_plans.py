@@ -0,0 +1,130 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import re
+import unittest
+from datetime import date, timedelta
+from typing import Dict, List
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database.models import Base, Contact, User
+from repository import contacts as repository_contacts
+from repository import refresh_tokens as repository_tokens
+from repository import users as repository_users
+from schemas import ContactModel, CreateOperation, DeleteOperation, UpdateOperation
+
+
+class TestRepositoryQueryPlans(unittest.IsolatedAsyncioTestCase):
+    """
+    Every repository query must be answered with an index, never by reading a whole table.
+    """
+
+    def setUp(self) -> None:
+        self.engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        self.user = User(id=1, username="deadpool", email="deadpool@example.com", password="secret", confirmed=True)
+        self.session.add(self.user)
+        self.session.add_all(Contact(first_name="Name", last_name="Lastname", email=f"contact{i}@example.com",
+                                     birth_date=date(1990, 5, 17), user=self.user) for i in range(3))
+        self.session.commit()
+        self.statements = []
+        event.listen(self.engine, "before_cursor_execute", self.record)
+
+    def tearDown(self) -> None:
+        self.session.close()
+        self.engine.dispose()
+
+    def record(self, conn, cursor, statement, parameters, context, executemany):
+        if re.match(r"\s*(SELECT|UPDATE|DELETE)\b", statement) and not statement.startswith("EXPLAIN"):
+            self.statements.append((statement, parameters[0] if executemany else parameters))
+
+    def plans(self) -> Dict[str, List[str]]:
+        plans = {}
+        with self.engine.connect() as connection:
+            cursor = connection.connection.cursor()
+            for statement, parameters in self.statements:
+                cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+                plans[statement] = [row[-1] for row in cursor.fetchall()]
+        self.statements.clear()
+        return plans
+
+    def assertUsesIndexes(self, *indexes: str) -> None:
+        plans = self.plans()
+        self.assertTrue(plans)
+        for statement, plan in plans.items():
+            for step in plan:
+                self.assertNotRegex(step, r"^SCAN (contacts|users|refresh_tokens)$",
+                                    f"Full table scan in:\n{statement}\n{plan}")
+        used = " ".join(" ".join(plan) for plan in plans.values())
+        for index in indexes:
+            self.assertIn(index, used)
+
+    async def test_contact_pages(self):
+        await repository_contacts.get_contacts(0, 20, self.user, self.session)
+        await repository_contacts.get_contacts(0, 20, self.user, self.session, after=1)
+        self.assertUsesIndexes("ix_contacts_user_id_id")
+
+    async def test_contacts_by_ids(self):
+        await repository_contacts.get_contacts_by_ids([3, 1, 42], self.user, self.session)
+        self.assertUsesIndexes()
+
+    async def test_contact_stream(self):
+        async for _ in repository_contacts.stream_contacts(self.user, self.session, batch_size=2):
+            pass
+        self.assertUsesIndexes("ix_contacts_user_id_id")
+
+    async def test_single_contact(self):
+        body = ContactModel(first_name="New", last_name="Name", email="new@example.com", phone_number="123",
+                            birth_date=date(1990, 1, 1))
+        await repository_contacts.get_contact(1, self.user, self.session)
+        await repository_contacts.update_contact(1, body, self.user, self.session)
+        await repository_contacts.delete_contact(2, self.user, self.session)
+        self.assertUsesIndexes()
+
+    async def test_contact_batch(self):
+        body = ContactModel(first_name="New", last_name="Name", email="new@example.com", phone_number="123",
+                            birth_date=date(1990, 1, 1))
+        operations = [DeleteOperation(op="delete", id=1), UpdateOperation(op="update", id=2, data=body),
+                      CreateOperation(op="create", data=body.model_copy(update={"email": "other@example.com"}))]
+        report = await repository_contacts.apply_batch(operations, self.user, self.session)
+        self.assertTrue(report["committed"])
+        self.assertUsesIndexes("uq_contacts_user_id_email")
+
+    async def test_upcoming_birthdays(self):
+        await repository_contacts.get_upcoming_birthdays(self.user, self.session, days=30)
+        await repository_contacts.get_upcoming_birthdays_for_users([1, 2], self.session, 7, date(2024, 12, 28))
+        self.assertUsesIndexes("ix_contacts_user_id_birth_month_day")
+
+    async def test_users(self):
+        await repository_users.get_user_by_email("deadpool@example.com", self.session)
+        await repository_users.get_confirmed_users(0, 100, self.session)
+        self.assertUsesIndexes()
+
+    async def test_refresh_tokens(self):
+        token = await repository_tokens.create_refresh_token(1, "pytest", timedelta(days=1), self.session)
+        await repository_tokens.rotate_refresh_token(token.id, timedelta(days=1), self.session)
+        await repository_tokens.get_sessions(1, self.session)
+        await repository_tokens.purge_expired(1, self.session)
+        await repository_tokens.revoke_family(token.family_id, self.session, user_id=1)
+        await repository_tokens.revoke_family(token.family_id, self.session)
+        self.assertUsesIndexes("ix_refresh_tokens_family_id", "ix_refresh_tokens_user_id")
+
+    def test_contact_email_unique_per_user(self):
+        other = User(id=2, username="wolverine", email="wolverine@example.com", password="secret")
+        self.session.add(other)
+        self.session.add(Contact(first_name="Name", last_name="Lastname", email="contact0@example.com", user=other))
+        self.session.commit()
+
+        self.session.add(Contact(first_name="Name", last_name="Lastname", email="contact0@example.com", user=other))
+        with self.assertRaises(IntegrityError):
+            self.session.commit()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import io
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import httpx
+from PIL import Image
+
+from services.avatars import AvatarService, CloudinaryAvatarStorage, InvalidAvatar, LocalAvatarStorage, resize
+
+
+def make_image(size=(400, 300), color="red", format="JPEG") -> bytes:
+    output = io.BytesIO()
+    Image.new("RGB", size, color).save(output, format=format)
+    return output.getvalue()
+
+
+class TestAvatarService(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.root = tempfile.mkdtemp()
+        self.storage = LocalAvatarStorage(self.root, "/api/users/avatars/")
+        self.service = AvatarService(self.storage, workers=1)
+
+    def test_resize_to_square_png(self):
+        with Image.open(io.BytesIO(resize(make_image()))) as avatar:
+            self.assertEqual((avatar.format, avatar.size), ("PNG", (250, 250)))
+
+    def test_resize_rejects_non_images(self):
+        with self.assertRaises(InvalidAvatar):
+            resize(b"not an image")
+
+    def test_resize_rejects_too_many_pixels(self):
+        with self.assertRaisesRegex(InvalidAvatar, "must not exceed 100000 pixels"):
+            resize(make_image(size=(400, 300)), max_pixels=100000)
+
+    def test_resize_rejects_decompression_bombs(self):
+        # Pillow refuses to open images over twice MAX_IMAGE_PIXELS.
+        with patch.object(Image, "MAX_IMAGE_PIXELS", 50000), self.assertRaises(InvalidAvatar):
+            resize(make_image(size=(400, 300)))
+
+    async def test_store_writes_content_addressed_file(self):
+        data = make_image()
+
+        url = await self.service.store(data)
+
+        key = AvatarService.key(data)
+        self.assertEqual(url, f"/api/users/avatars/{key}.png")
+        self.assertTrue(os.path.exists(os.path.join(self.root, f"{key}.png")))
+
+    async def test_identical_upload_is_not_stored_again(self):
+        data = make_image()
+        first = await self.service.store(data)
+        self.storage.save = AsyncMock()
+
+        second = await self.service.store(data)
+        third = await self.service.store(data, current_url=first)
+
+        self.assertEqual(first, second)
+        self.assertEqual(first, third)
+        self.storage.save.assert_not_awaited()
+        self.assertEqual(self.service.stats, {"stored": 1, "deduplicated": 2})
+
+    async def test_current_url_matched_on_its_file_name(self):
+        data = make_image()
+        key = AvatarService.key(data)
+        self.storage.save = AsyncMock(return_value="/api/users/avatars/new.png")
+
+        cloudinary_url = f"https://res.cloudinary.com/demo/image/upload/v1/contact_book/{key}.png"
+        self.assertEqual(await self.service.store(data, current_url=cloudinary_url), cloudinary_url)
+        # A URL merely containing the key is another avatar.
+        await self.service.store(data, current_url=f"https://example.com/avatars/x{key}.png?k={key}")
+
+        self.storage.save.assert_awaited_once()
+        self.assertEqual(self.service.stats, {"stored": 1, "deduplicated": 1})
+
+    async def test_different_uploads_get_different_keys(self):
+        first = await self.service.store(make_image(color="red"))
+        second = await self.service.store(make_image(color="blue"))
+
+        self.assertNotEqual(first, second)
+
+
+class TestCloudinaryAvatarStorage(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.storage = CloudinaryAvatarStorage("demo", "key", "secret")
+        self.stored = set()
+        self.requests = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            self.requests.append((request.method, str(request.url)))
+            return httpx.Response(200 if str(request.url) in self.stored else 404)
+
+        self.storage.http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    async def test_existence_checked_on_delivery_url(self):
+        url = "https://res.cloudinary.com/demo/image/upload/v1/contact_book/abc.png"
+
+        with patch("cloudinary.uploader.upload") as upload, patch("cloudinary.api.resource") as resource:
+            self.assertIsNone(await self.storage.url("abc"))
+            self.assertEqual(await self.storage.save("abc", b"png"), url)
+            self.stored.add(url)
+            self.assertEqual(await self.storage.url("abc"), url)
+
+        self.assertEqual(self.requests, [("HEAD", url), ("HEAD", url)])
+        upload.assert_called_once_with(b"png", public_id="contact_book/abc", format="png", overwrite=False)
+        resource.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+import unittest
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+
+from redis.exceptions import ConnectionError
+
+from database.models import User
+from services.cache import ContactCache, UserCache
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+    async def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, 0)) + 1)
+        return int(self.data[key])
+
+
+class TestUserCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.cache = UserCache(ttl=60, maxsize=2)
+        self.user = User(id=1, username="deadpool", email="deadpool@example.com", password="hash",
+                         created_at=datetime(2024, 2, 21, 16, 5), confirmed=True)
+
+    async def test_miss_then_local_hit(self):
+        self.assertIsNone(await self.cache.get(self.user.email))
+        stored = await self.cache.set(self.user)
+        self.assertIsNot(stored, self.user)
+        self.assertIsNone(stored.password)
+        cached = await self.cache.get(self.user.email)
+
+        self.assertEqual((cached.id, cached.email, cached.created_at), (1, self.user.email, self.user.created_at))
+        self.assertIsNone(cached.password)
+        self.assertEqual(self.cache.stats["misses"], 1)
+        self.assertEqual(self.cache.stats["local_hits"], 1)
+
+    async def test_entry_expires(self):
+        await self.cache.set(self.user)
+        with patch("services.cache.time.monotonic", return_value=10 ** 9):
+            self.assertIsNone(await self.cache.get(self.user.email))
+
+    async def test_least_recently_used_entry_is_evicted(self):
+        for i in range(3):
+            await self.cache.set(User(id=i, email=f"user{i}@example.com"))
+
+        self.assertIsNone(await self.cache.get("user0@example.com"))
+        self.assertIsNotNone(await self.cache.get("user2@example.com"))
+
+    async def test_redis_tier_and_invalidation(self):
+        redis = FakeRedis()
+        self.cache.init(redis)
+        await self.cache.set(self.user)
+        self.cache.clear()
+
+        cached = await self.cache.get(self.user.email)
+        self.assertEqual(cached.created_at, self.user.created_at)
+        self.assertEqual(self.cache.stats["redis_hits"], 1)
+
+        await self.cache.invalidate(self.user.email)
+        self.assertIsNone(await self.cache.get(self.user.email))
+        self.assertEqual(redis.data, {})
+
+
+class TestContactCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.cache = ContactCache(ttl=60)
+        self.loader = AsyncMock(return_value=b'[{"id":1,"first_name":"Name"}]')
+
+    async def test_disabled_without_redis(self):
+        await self.cache.read_through(1, "list", self.loader)
+        await self.cache.read_through(1, "list", self.loader)
+
+        self.assertEqual(self.loader.await_count, 2)
+        self.assertIsNone(await self.cache.version(1))
+
+    async def test_read_through_and_version_bump(self):
+        self.cache.init(FakeRedis())
+
+        first = await self.cache.read_through(1, "list", self.loader)
+        second = await self.cache.read_through(1, "list", self.loader)
+        self.assertEqual(first, second)
+        self.assertEqual(self.loader.await_count, 1)
+
+        await self.cache.bump(1)
+        await self.cache.read_through(1, "list", self.loader)
+        self.assertEqual(self.loader.await_count, 2)
+        self.assertEqual(await self.cache.version(1), 1)
+
+    async def test_versions_are_per_user(self):
+        self.cache.init(FakeRedis())
+        await self.cache.read_through(1, "list", self.loader)
+        await self.cache.bump(2)
+        await self.cache.read_through(1, "list", self.loader)
+
+        self.assertEqual(self.loader.await_count, 1)
+
+    async def test_failed_bump_bypasses_stale_entries(self):
+        redis = FakeRedis()
+        self.cache.init(redis)
+        await self.cache.read_through(1, "list", self.loader)
+
+        with patch.object(redis, "incr", AsyncMock(side_effect=ConnectionError("down"))), \
+                self.assertLogs("services.cache", "WARNING"):
+            await self.cache.bump(1)
+        await self.cache.read_through(1, "list", self.loader)
+        self.assertIsNone(await self.cache.version(1))
+        self.assertEqual(self.loader.await_count, 2)
+
+        with patch("services.cache.time.monotonic", return_value=time.monotonic() + 60):
+            self.assertEqual(await self.cache.version(1), 0)
+        self.assertEqual(self.cache.stats["failed_invalidations"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
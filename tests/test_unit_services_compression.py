@@ -0,0 +1,131 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import gzip
+import unittest
+import zlib
+
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from services.compression import CompressionMiddleware, brotli, negotiate, zstandard
+
+ROWS = [f'{{"id": {i}, "first_name": "Name{i}", "last_name": "Lastname{i}"}}\n'.encode() for i in range(200)]
+
+
+class TestNegotiate(unittest.TestCase):
+
+    def test_server_preference_breaks_ties(self):
+        self.assertEqual(negotiate("gzip, br, zstd", ("zstd", "br", "gzip")), "zstd")
+        self.assertEqual(negotiate("gzip, br", ("zstd", "br", "gzip")), "br")
+
+    def test_quality_values(self):
+        self.assertEqual(negotiate("zstd;q=0.5, gzip", ("zstd", "br", "gzip")), "gzip")
+        self.assertEqual(negotiate("*;q=0.1, gzip;q=0", ("zstd", "gzip")), "zstd")
+        self.assertIsNone(negotiate("gzip;q=0, identity", ("zstd", "br", "gzip")))
+        self.assertIsNone(negotiate("", ("gzip",)))
+
+
+class TestCompressionMiddleware(unittest.TestCase):
+
+    def setUp(self) -> None:
+        app = FastAPI()
+        app.add_middleware(CompressionMiddleware, minimum_size=100, encodings=("gzip",))
+
+        @app.get("/large")
+        def large():
+            return Response(b"".join(ROWS), media_type="application/x-ndjson", headers={"ETag": '"v1"'})
+
+        @app.get("/small")
+        def small():
+            return {"id": 1}
+
+        @app.get("/stream")
+        def stream():
+            return StreamingResponse(iter(ROWS), media_type="application/x-ndjson")
+
+        @app.get("/avatar.png")
+        def avatar():
+            return Response(b"\x89PNG" + bytes(1000), media_type="image/png")
+
+        self.client = TestClient(app)
+
+    def get_raw(self, path: str, encoding: str = "gzip"):
+        with self.client.stream("GET", path, headers={"Accept-Encoding": encoding}) as response:
+            return response, list(response.iter_raw())
+
+    def test_large_body_compressed(self):
+        response, chunks = self.get_raw("/large")
+
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+        self.assertEqual(response.headers["ETag"], 'W/"v1"')
+        self.assertEqual(gzip.decompress(b"".join(chunks)), b"".join(ROWS))
+        self.assertEqual(int(response.headers["Content-Length"]), len(b"".join(chunks)))
+
+    def test_small_body_and_identity_not_compressed(self):
+        small = self.client.get("/small", headers={"Accept-Encoding": "gzip"})
+        identity = self.client.get("/large", headers={"Accept-Encoding": "identity"})
+
+        self.assertNotIn("Content-Encoding", small.headers)
+        self.assertEqual(small.json(), {"id": 1})
+        self.assertNotIn("Content-Encoding", identity.headers)
+        self.assertEqual(identity.headers["ETag"], '"v1"')
+
+    def test_stream_compressed_chunk_by_chunk(self):
+        response, chunks = self.get_raw("/stream")
+
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertNotIn("Content-Length", response.headers)
+        self.assertEqual(gzip.decompress(b"".join(chunks)), b"".join(ROWS))
+
+    def test_stream_chunks_flushed_as_sent(self):
+        async def app(scope, receive, send):
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": [(b"content-type", b"application/x-ndjson")]})
+            for row in ROWS[:3]:
+                await send({"type": "http.response.body", "body": row, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": "GET", "headers": [(b"accept-encoding", b"gzip")]}
+        asyncio.run(CompressionMiddleware(app, minimum_size=100, encodings=("gzip",))(scope, None, send))
+
+        chunks = [message["body"] for message in sent[1:]]
+        self.assertEqual(len(chunks), 4)
+        # Every chunk is flushed, so the rows received so far can already be decoded.
+        decoder = zlib.decompressobj(31)
+        self.assertEqual([decoder.decompress(chunk) for chunk in chunks], ROWS[:3] + [b""])
+        self.assertTrue(decoder.eof)
+
+    def test_compressed_media_passed_through(self):
+        response, chunks = self.get_raw("/avatar.png")
+
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(len(b"".join(chunks)), 1004)
+
+    @unittest.skipIf(brotli is None or zstandard is None, "brotli and zstandard are not installed")
+    def test_brotli_and_zstd(self):
+        app = FastAPI()
+        app.add_middleware(CompressionMiddleware, minimum_size=100)
+        app.get("/stream")(lambda: StreamingResponse(iter(ROWS), media_type="application/x-ndjson"))
+        client = TestClient(app)
+
+        for encoding, decompress in (("br", brotli.decompress),
+                                     ("zstd", lambda data: zstandard.ZstdDecompressor().decompressobj()
+                                      .decompress(data))):
+            with client.stream("GET", "/stream", headers={"Accept-Encoding": f"gzip, {encoding}"}) as response:
+                body = b"".join(response.iter_raw())
+            self.assertEqual(response.headers["Content-Encoding"], encoding)
+            self.assertEqual(decompress(body), b"".join(ROWS))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+from datetime import date
+from unittest.mock import AsyncMock, patch
+
+from database.models import Contact, User
+from services.contacts_io import iter_csv, iter_ndjson, import_contacts, export_contacts
+
+
+async def chunked(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+async def collect(rows):
+    return [row async for row in rows]
+
+
+class TestContactsImport(unittest.IsolatedAsyncioTestCase):
+
+    async def test_iter_csv_across_chunks(self):
+        body = 'first_name,last_name,extra_data\nAnna,Nowak,"two\nlines"\nJan,,\n'.encode()
+        rows = await collect(iter_csv(chunked(body, 5)))
+
+        self.assertEqual(rows, [
+            (1, {"first_name": "Anna", "last_name": "Nowak", "extra_data": "two\nlines"}, None),
+            (2, {"first_name": "Jan"}, None),
+        ])
+
+    async def test_iter_csv_too_many_columns(self):
+        rows = await collect(iter_csv(chunked(b"a,b\n1,2,3\n", 4)))
+
+        self.assertEqual(rows, [(1, None, "Expected 2 columns, got 3")])
+
+    async def test_iter_csv_record_too_long(self):
+        body = ('a,b\n1,"' + "x\n" * 20 + '"\n2,' + "y" * 50 + '\n3,"z"\n').encode()
+        rows = await collect(iter_csv(chunked(body, 7), max_length=30))
+
+        self.assertEqual(rows, [
+            (1, None, "Record longer than 30 characters"),
+            (2, None, "Record longer than 30 characters"),
+            (3, {"a": "3", "b": "z"}, None),
+        ])
+
+    async def test_iter_ndjson_line_too_long(self):
+        body = ('{"first_name": "' + "x" * 50 + '"}\n{"first_name": "Jan"}\n' + "y" * 40).encode()
+        rows = await collect(iter_ndjson(chunked(body, 8), max_length=30))
+
+        self.assertEqual(rows, [
+            (1, None, "Line longer than 30 characters"),
+            (2, {"first_name": "Jan"}, None),
+            (3, None, "Line longer than 30 characters"),
+        ])
+
+    async def test_iter_ndjson_reports_bad_lines(self):
+        body = '{"first_name": "Zoë"}\n\nnot json\n[1]'.encode()
+        rows = await collect(iter_ndjson(chunked(body, 3)))
+
+        self.assertEqual(rows[0], (1, {"first_name": "Zoë"}, None))
+        self.assertTrue(rows[1][2].startswith("Invalid JSON"))
+        self.assertEqual(rows[2], (3, None, "Expected a JSON object"))
+
+    async def test_import_contacts_batches_and_reports(self):
+        body = b"\n".join(
+            b'{"first_name":"A","last_name":"B","email":"%d@x.com","phone_number":"1","birth_date":"1990-01-01"}' % i
+            for i in range(5)
+        ) + b'\n{"first_name":"A"}\n'
+        create_bulk = AsyncMock(side_effect=lambda bodies, user, db: [None] * len(bodies))
+
+        with patch("services.contacts_io.repository_contacts.create_contacts_bulk", create_bulk):
+            report = await import_contacts(chunked(body, 64), "ndjson", User(id=1), db=None, batch_size=2)
+
+        self.assertEqual([len(call.args[0]) for call in create_bulk.await_args_list], [2, 2, 1])
+        self.assertEqual(report.imported, 5)
+        self.assertEqual(report.failed, 1)
+        self.assertEqual(report.errors[0].row, 6)
+
+    async def test_export_contacts_formats(self):
+        async def batches():
+            yield [Contact(id=1, first_name="Anna", last_name="Nowak; Jr", email="a@x.com",
+                           phone_number="123", birth_date=date(1990, 2, 1), extra_data="a,b")]
+            yield [Contact(id=2, first_name="Jan", last_name="Kos")]
+
+        ndjson = b"".join(await collect(export_contacts(batches(), "ndjson"))).decode()
+        csv_text = b"".join(await collect(export_contacts(batches(), "csv"))).decode()
+        vcf = b"".join(await collect(export_contacts(batches(), "vcf"))).decode()
+
+        self.assertEqual(len(ndjson.splitlines()), 2)
+        self.assertIn('"birth_date": "1990-02-01"', ndjson)
+        self.assertEqual(csv_text.splitlines()[1], '1,Anna,Nowak; Jr,a@x.com,123,1990-02-01,"a,b"')
+        self.assertIn("N:Nowak\\; Jr;Anna;;;\r\n", vcf)
+        self.assertIn("NOTE:a\\,b\r\n", vcf)
+        self.assertEqual(vcf.count("BEGIN:VCARD"), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
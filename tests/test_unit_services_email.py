@@ -0,0 +1,151 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import socket
+import unittest
+from email.message import EmailMessage
+from unittest.mock import AsyncMock, patch
+
+import aiosmtplib
+
+from fastapi_mail import ConnectionConfig
+
+from services.email import MailDispatcher, send_email
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:
+    Controller = None
+
+
+class RecordingHandler:
+    def __init__(self, replies=()):
+        self.replies = list(replies)
+        self.messages = []
+        self.peers = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.replies:
+            return self.replies.pop(0)
+        self.messages.append(envelope)
+        self.peers.add(session.peer)
+        return "250 OK"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_message(i: int) -> EmailMessage:
+    message = EmailMessage()
+    message["Subject"] = f"Message {i}"
+    message["To"] = f"user{i}@example.com"
+    message.set_content("Hello")
+    return message
+
+
+@unittest.skipIf(Controller is None, "aiosmtpd is not installed")
+class TestMailDispatcher(unittest.IsolatedAsyncioTestCase):
+
+    def start_server(self, replies=()):
+        self.handler = RecordingHandler(replies)
+        port = free_port()
+        controller = Controller(self.handler, hostname="127.0.0.1", port=port)
+        controller.start()
+        self.addCleanup(controller.stop)
+        config = ConnectionConfig(MAIL_USERNAME="", MAIL_PASSWORD="", MAIL_FROM="noreply@example.com",
+                                  MAIL_FROM_NAME="Contact Book", MAIL_PORT=port, MAIL_SERVER="127.0.0.1",
+                                  MAIL_STARTTLS=False, MAIL_SSL_TLS=False, USE_CREDENTIALS=False,
+                                  VALIDATE_CERTS=False)
+        self.dispatcher = MailDispatcher(config, queue_size=100, pool_size=1, batch_size=5, max_retries=2,
+                                         retry_backoff=0.01)
+
+    async def asyncTearDown(self):
+        await self.dispatcher.stop()
+
+    async def test_messages_share_one_connection(self):
+        self.start_server()
+        self.dispatcher.start()
+        for i in range(12):
+            await self.dispatcher.enqueue(make_message(i))
+        await self.dispatcher.queue.join()
+
+        self.assertEqual(len(self.handler.messages), 12)
+        self.assertEqual(len(self.handler.peers), 1)
+        self.assertEqual(self.handler.messages[0].mail_from, "noreply@example.com")
+        metrics = self.dispatcher.metrics()
+        self.assertEqual((metrics["sent"], metrics["connections"], metrics["queue_depth"]), (12, 1, 0))
+        self.assertGreaterEqual(metrics["batches"], 3)
+
+    async def test_transient_failure_is_retried(self):
+        self.start_server(replies=["451 Try again later"])
+        self.dispatcher.start()
+        await self.dispatcher.enqueue(make_message(1))
+        await self.dispatcher.queue.join()
+
+        self.assertEqual(len(self.handler.messages), 1)
+        self.assertEqual(self.dispatcher.stats["retries"], 1)
+        self.assertEqual(self.dispatcher.stats["connections"], 2)
+
+    async def test_permanent_failure_is_not_retried(self):
+        self.start_server(replies=["550 Mailbox unavailable"])
+        self.dispatcher.start()
+        with self.assertLogs("services.email", "ERROR") as logs:
+            await self.dispatcher.enqueue(make_message(1))
+            await self.dispatcher.enqueue(make_message(2))
+            await self.dispatcher.queue.join()
+
+        self.assertEqual([m.rcpt_tos for m in self.handler.messages], [["user2@example.com"]])
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("Email to user1@example.com not delivered", logs.output[0])
+        self.assertEqual((self.dispatcher.stats["failed"], self.dispatcher.stats["retries"]), (1, 0))
+
+    async def test_unexpected_error_does_not_stop_worker(self):
+        self.start_server()
+        send_message = aiosmtplib.SMTP.send_message
+
+        async def failing_send(smtp, message, *args, **kwargs):
+            if message["To"] == "user1@example.com":
+                raise ValueError("malformed message")
+            return await send_message(smtp, message, *args, **kwargs)
+
+        self.dispatcher.start()
+        with patch.object(aiosmtplib.SMTP, "send_message", failing_send), \
+                self.assertLogs("services.email", "ERROR") as logs:
+            for i in range(1, 4):
+                await self.dispatcher.enqueue(make_message(i))
+            await self.dispatcher.queue.join()
+            # The worker is still alive and takes new messages.
+            await self.dispatcher.enqueue(make_message(4))
+            await self.dispatcher.queue.join()
+
+        self.assertEqual([m.rcpt_tos for m in self.handler.messages],
+                         [["user2@example.com"], ["user3@example.com"], ["user4@example.com"]])
+        self.assertEqual(self.dispatcher.stats["failed"], 1)
+        self.assertIn("Email to user1@example.com not delivered", logs.output[0])
+
+    async def test_stop_delivers_queued_messages(self):
+        self.start_server()
+        await self.dispatcher.enqueue(make_message(1))
+        self.dispatcher.start()
+        await self.dispatcher.stop()
+
+        self.assertEqual(len(self.handler.messages), 1)
+
+
+class TestSendEmail(unittest.IsolatedAsyncioTestCase):
+
+    async def test_send_email_queues_confirmation(self):
+        with patch("services.email.mail_dispatcher.enqueue", new_callable=AsyncMock) as enqueue:
+            await send_email("user@example.com", "deadpool", "http://testserver/")
+
+        message = enqueue.await_args.args[0]
+        self.assertEqual(message["To"], "user@example.com")
+        self.assertIn("http://testserver/api/auth/confirmed_email/", message.get_content())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import QueuePool
+
+from services import metrics
+from services.metrics import MetricsMiddleware
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_instrument_engine(self):
+        engine = create_engine("sqlite://", poolclass=QueuePool, pool_size=2)
+        metrics.instrument_engine(engine, "test")
+        connects = sample("db_pool_connects_total", pool="test")
+        usages = sample("db_pool_connection_usage_seconds_count", pool="test")
+
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+            self.assertEqual(sample("db_pool_checked_out", pool="test"), 1)
+
+        with engine.connect():
+            pass
+
+        self.assertEqual(sample("db_pool_size", pool="test"), 2)
+        self.assertEqual(sample("db_pool_checked_out", pool="test"), 0)
+        self.assertEqual(sample("db_pool_connects_total", pool="test"), connects + 1)
+        self.assertEqual(sample("db_pool_connection_usage_seconds_count", pool="test"), usages + 2)
+
+    def test_render(self):
+        metrics.rate_limit_redis.labels("ok").observe(0.002)
+
+        self.assertIn(b'rate_limit_redis_seconds_bucket{le="0.0025",outcome="ok"}', metrics.render())
+
+
+class TestMetricsMiddleware(unittest.TestCase):
+
+    def setUp(self) -> None:
+        app = FastAPI()
+        app.add_middleware(MetricsMiddleware)
+
+        @app.get("/items/{item_id}")
+        def read_item(item_id: int):
+            if item_id == 0:
+                raise HTTPException(status_code=404)
+            return {"id": item_id}
+
+        self.client = TestClient(app)
+
+    def test_requests_labelled_by_route_template(self):
+        before = sample("http_requests_total", method="GET", route="/items/{item_id}", status="200")
+
+        self.client.get("/items/1")
+        self.client.get("/items/2")
+        self.client.get("/items/0")
+        self.client.get("/missing")
+
+        self.assertEqual(sample("http_requests_total", method="GET", route="/items/{item_id}", status="200"),
+                         before + 2)
+        self.assertGreaterEqual(sample("http_requests_total", method="GET", route="/items/{item_id}", status="404"), 1)
+        self.assertGreaterEqual(sample("http_requests_total", method="GET", route="unmatched", status="404"), 1)
+        self.assertGreaterEqual(sample("http_request_duration_seconds_count", method="GET", route="/items/{item_id}"),
+                                3)
+        self.assertEqual(sample("http_requests_in_flight"), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from services.query_stats import (QueryBudget, QueryBudgetExceeded, QueryMonitor, QueryMonitorMiddleware,
+                                  QueryStats, current_stats)
+
+
+class TestQueryMonitor(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.engine = create_engine("sqlite://")
+        self.monitor = QueryMonitor(slow_query_ms=0, n_plus_one_threshold=3)
+        self.monitor.instrument(self.engine)
+        with self.engine.begin() as connection:
+            connection.execute(text("CREATE TABLE contacts (id INTEGER PRIMARY KEY, user_id INTEGER)"))
+
+    def run_queries(self, count: int) -> QueryStats:
+        stats = QueryStats()
+        token = current_stats.set(stats)
+        try:
+            with self.engine.connect() as connection:
+                for user_id in range(count):
+                    connection.execute(text("SELECT id FROM contacts WHERE user_id = :user_id"), {"user_id": user_id})
+        finally:
+            current_stats.reset(token)
+        return stats
+
+    def test_counts_queries_of_current_request(self):
+        stats = self.run_queries(2)
+
+        self.assertEqual(stats.count, 2)
+        self.assertGreater(stats.duration, 0)
+        self.assertEqual(stats.server_timing().split(";")[-1], 'desc="2 queries"')
+        self.assertEqual(self.run_queries(0).count, 0)
+
+    def test_repeated_statements_reported_as_n_plus_one(self):
+        self.assertEqual(self.run_queries(2).repeated(3), {})
+        stats = self.run_queries(3)
+
+        self.assertEqual(list(stats.repeated(3).values()), [3])
+        with self.assertLogs("services.query_stats", "WARNING") as logs:
+            self.monitor.check(stats, "GET", "/api/contacts/")
+        self.assertIn("Likely N+1 in GET /api/contacts/: 3 executions of SELECT id FROM contacts", logs.output[0])
+
+    def test_slow_query_logged_with_parameters_and_plan(self):
+        self.monitor.slow_query_ms = 1e-9
+        with self.assertLogs("services.query_stats", "WARNING") as logs:
+            self.run_queries(1)
+
+        self.assertIn("Slow query", logs.output[0])
+        self.assertIn("parameters: (0,)", logs.output[0])
+        self.assertIn("SCAN contacts", logs.output[0])
+
+    def test_budget(self):
+        stats = self.run_queries(3)
+        stats.budget = 2
+
+        with self.assertLogs("services.query_stats", "WARNING") as logs:
+            self.monitor.check(stats, "GET", "/api/contacts/")
+        self.assertEqual(logs.output[-1], "WARNING:services.query_stats:GET /api/contacts/ ran 3 queries, its budget is 2")
+
+        self.monitor.strict = True
+        with self.assertRaises(QueryBudgetExceeded):
+            self.monitor.check(stats, "GET", "/api/contacts/")
+
+
+class TestQueryMonitorMiddleware(unittest.TestCase):
+
+    def setUp(self) -> None:
+        engine = create_engine("sqlite://")
+        monitor = QueryMonitor(slow_query_ms=0, strict=True)
+        monitor.instrument(engine)
+        app = FastAPI()
+        app.add_middleware(QueryMonitorMiddleware, monitor=monitor)
+
+        @app.get("/queries/{count}", dependencies=[Depends(QueryBudget(2))])
+        def run_queries(count: int):
+            with engine.connect() as connection:
+                for _ in range(count):
+                    connection.execute(text("SELECT 1"))
+            return {}
+
+        self.client = TestClient(app)
+
+    def test_server_timing_header(self):
+        response = self.client.get("/queries/2")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response.headers["Server-Timing"], r'^db;dur=\d+\.\d\d;desc="2 queries"$')
+
+    def test_strict_mode_fails_over_budget(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get("/queries/3")
+
+
+if __name__ == '__main__':
+    unittest.main()
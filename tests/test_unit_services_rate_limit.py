@@ -0,0 +1,88 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from redis.exceptions import RedisError
+
+from services.rate_limit import TokenBucketLimiter
+
+
+class TestTokenBucketLimiter(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.limiter = TokenBucketLimiter(times=3, seconds=60, sync_interval=1)
+        self.clock = patch("services.rate_limit.time.monotonic", return_value=1000.0)
+        self.now = self.clock.start()
+        self.addCleanup(self.clock.stop)
+
+    def test_bucket_empties_and_refills(self):
+        states = [self.limiter.hit("user:1") for _ in range(4)]
+
+        self.assertEqual([s.allowed for s in states], [True, True, True, False])
+        self.assertEqual(states[0].remaining, 2)
+        self.assertEqual(states[-1].retry_after, 20)
+        self.assertEqual(states[-1].reset, 60)
+
+        self.now.return_value = 1020.0
+        self.assertTrue(self.limiter.hit("user:1").allowed)
+        self.assertFalse(self.limiter.hit("user:1").allowed)
+
+    def test_cost_and_per_key_buckets(self):
+        self.assertTrue(self.limiter.hit("user:1", cost=3).allowed)
+        self.assertFalse(self.limiter.hit("user:1").allowed)
+        self.assertTrue(self.limiter.hit("user:2").allowed)
+
+    def test_headers(self):
+        headers = self.limiter.hit("user:1").headers()
+
+        self.assertEqual(headers, {"RateLimit-Limit": "3", "RateLimit-Remaining": "2",
+                                   "RateLimit-Reset": "20", "RateLimit-Policy": "3;w=60"})
+
+    def test_prune_drops_full_buckets(self):
+        self.limiter.hit("user:1")
+        self.now.return_value = 1020.0
+        self.limiter.prune()
+
+        self.assertEqual(self.limiter._buckets, {})
+
+    async def test_sync_batches_consumption_and_adopts_global_level(self):
+        redis = AsyncMock()
+        redis.eval.return_value = ["0.5", "1"]
+        self.limiter.redis = redis
+        self.limiter.hit("user:1")
+        self.limiter.hit("user:1")
+        self.limiter.hit("user:2")
+
+        await self.limiter.sync()
+
+        args = redis.eval.await_args.args
+        self.assertEqual(args[1:], (2, "rate_limit:user:1", "rate_limit:user:2", 3, 0.05, 60, 2, 1))
+        self.assertFalse(self.limiter.hit("user:1").allowed)
+        self.assertTrue(self.limiter.hit("user:2").allowed)
+        self.assertEqual(self.limiter.stats["syncs"], 1)
+
+    async def test_sync_without_pending_does_not_call_redis(self):
+        redis = AsyncMock()
+        self.limiter.redis = redis
+
+        await self.limiter.sync()
+
+        redis.eval.assert_not_awaited()
+
+    async def test_sync_error_keeps_local_buckets(self):
+        redis = AsyncMock()
+        redis.eval.side_effect = RedisError()
+        self.limiter.redis = redis
+        self.limiter.hit("user:1")
+
+        await self.limiter.sync()
+
+        self.assertEqual(self.limiter.stats["sync_errors"], 1)
+        self.assertEqual(self.limiter.hit("user:1").remaining, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import unittest
+from datetime import date
+from unittest.mock import patch
+
+from fastapi import Response
+
+from database.models import Contact
+from schemas import ContactResponse
+from services import serialization
+
+
+class TestSerialization(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.contacts = [Contact(id=i, first_name="Name", last_name="Lastname", email=f"contact{i}@example.com",
+                                 phone_number="123 456 789", birth_date=date(1990, 5, 17), extra_data=None)
+                         for i in range(3)]
+
+    def test_dump_matches_model_dump(self):
+        expected = [ContactResponse.model_validate(c).model_dump(mode="json") for c in self.contacts]
+
+        self.assertEqual(json.loads(serialization.dump(serialization.contact_list_adapter, self.contacts)), expected)
+
+    def test_render_passes_payload_through_when_disabled(self):
+        with patch.object(serialization, "FAST_JSON", False):
+            self.assertIs(serialization.render(self.contacts[0], adapter=serialization.contact_adapter),
+                          self.contacts[0])
+
+    def test_render_orm_objects_to_bytes(self):
+        with patch.object(serialization, "FAST_JSON", True):
+            rendered = serialization.render(self.contacts, adapter=serialization.contact_list_adapter)
+
+        self.assertEqual(rendered.media_type, "application/json")
+        self.assertEqual(rendered.body, serialization.dump(serialization.contact_list_adapter, self.contacts))
+
+    def test_render_keeps_response_headers(self):
+        response = Response()
+        del response.headers["content-length"]  # as FastAPI prepares the injected response
+        response.headers["ETag"] = '"abc"'
+        with patch.object(serialization, "FAST_JSON", True):
+            rendered = serialization.render(b'[{"id":1}]', response)
+
+        self.assertEqual(rendered.headers["etag"], '"abc"')
+        self.assertEqual(rendered.media_type, "application/json")
+        self.assertEqual(rendered.body, b'[{"id":1}]')
+
+    def test_render_parses_body_when_disabled(self):
+        with patch.object(serialization, "FAST_JSON", False):
+            self.assertEqual(serialization.render(b'[{"id":1}]'), [{"id": 1}])
+
+    def test_render_sends_partial_body_when_disabled(self):
+        with patch.object(serialization, "FAST_JSON", False):
+            rendered = serialization.render(b'[{"id":1}]', partial=True)
+
+        self.assertEqual(rendered.body, b'[{"id":1}]')
+
+
+if __name__ == '__main__':
+    unittest.main()